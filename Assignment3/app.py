@@ -1,284 +1,44 @@
 """
 Simple 2d world where the player can interact with the items in the world.
 """
-import random
 
 __author__ = "ZILIANG WANG"
 __date__ = "18/10/2019"
 __version__ = "1.1.0"
 __copyright__ = "The University of Queensland, 2019"
 
+import cProfile
 import math
+import time
 import tkinter as tk
 
 from typing import Tuple, List
 
 import pymunk
 
-from game.block import Block, MysteryBlock
-from game.entity import Entity, BoundaryWall
-from game.mob import Mob, CloudMob, Fireball
-from game.item import DroppedItem, Coin
+from game.atlas import SpriteAtlas
+from game.block import MysteryBlock
 from game.view import GameView, ViewRenderer
-from game.world import World
-from game.util import get_collision_direction
+from game.timing import FixedTimestep, FrameTimer, PhaseTimer
 
-from level import load_world, WorldBuilder
+from mario import Mushroom, Tunnel, Flagblock, Switch, MarioGame
 from player import Player
+from highscore import HighScoreStore
+from config import Config, ConfigError, DEFAULT_CONFIG, load_config
 
-import json
-
-BLOCK_SIZE = 2 ** 4
 MAX_WINDOW_SIZE = (1080, math.inf)
 
-GOAL_SIZES = {
-    "flag": (0.2, 9),
-    "tunnel": (2, 2)
-}
-
-BLOCKS = {
-    '#': 'brick',
-    '%': 'brick_base',
-    '?': 'mystery_empty',
-    '$': 'mystery_coin',
-    '^': 'cube',
-    'b': 'bounce',
-    'I': 'tunnel',
-    '=': 'flag_block',
-    "S": 'switch'
-}
-
-ITEMS = {
-    'C': 'coin',
-    "*": "star"
-}
-
-MOBS = {
-    '&': "cloud",
-    '@': 'mushroom'
-}
-
-
-class myFireball(Mob):
-    """The fireball mob is a moving entity that moves straight in a direction.
-
-    When colliding with the player it will damage the player and explode.
-    """
-    _id = "myfireball"
-
-    def __init__(self):
-        super().__init__(self._id, size=(16, 16), weight=0, tempo=80)
-
-    def on_hit(self, event: pymunk.Arbiter, data):
-        world, player = data
-        world.remove_mob(self)
-
-
-class Mushroom(Mob):
-    """
-    """
-    _id = "mushroom"
-    _active = True
-
-    def __init__(self, fire_range=10):
-        super().__init__(self._id, size=(16, 16), weight=300, tempo=40)
-
-    def is_active(self):
-        return self._active
-
-    def on_hit(self, event, block):
-        direct = get_collision_direction(block, self)
-        if direct == "L":
-            self.set_tempo(40)
-        elif direct == "R":
-            self.set_tempo(-40)
-
-    def on_hit_player(self, event, player):
-        direct = get_collision_direction(player, self)
-        if direct == "L":
-            self.set_tempo(40)
-            player.damage()
-        elif direct == "R":
-            self.set_tempo(-40)
-            player.damage()
-        elif direct == "A":
-            self._active = False
-            self.set_tempo(0)
-
-    def step(self, time_delta, game_data):
-        vx, vy = self.get_velocity()
-        self.set_velocity((self.get_tempo(), vy))
-
-
-class Star(DroppedItem):
-    _id = "star"
-
-    def __init__(self, duration=10):
-        super().__init__()
-        self._duration = duration
-
-    def collect(self, player):
-        player.invincible(self._duration * 1000)
-
-
-class Bounce(Block):
-    _id = "bounce"
-
-    def __init__(self, drop: str = None, drop_range=(1, 1)):
-        super().__init__()
-        self._drop = drop
-        self._drop_range = drop_range
-        self._active = False
-
-    def get_drops(self) -> Tuple[str, ...]:
-        """Get the drops of the mystery block
-
-        Returns:
-            tuple<str, ...>: The item identifiers of the dropped items.
-        """
-        return (self._drop,) * random.randint(*self._drop_range)
-
-    def _drop_items(self, world, drops: Tuple[str]):
-        """Drop each of the dropped items into the world.
-
-        Parameters:
-            world (World): The world to place dropped items within.
-            drops (tuple<str>): A tuple of item identifiers to place.
-        """
-        x, y = self.get_position()
-        for drop in drops:
-            if drop is not None:
-                # world.add_item(create_item(drop), TODO: Make this non-hardcoded
-                world.add_item(Coin(), x + random.randint(-10, 10), y - 25)
-
-    def on_hit(self, event, data):
-        """Callback collision with player event handler."""
-        world, player = data
-        # Ensure the bottom of the block is being hit
-        if get_collision_direction(player, self) == "A":
-            pos_x = player.get_velocity()[0]
-            player.set_velocity((pos_x, -280))
-
-    def is_active(self) -> bool:
-        """(bool): Returns true if the block has not yet dropped items."""
-        return self._active
-
-
-class Tunnel(Block):
-    _id = "tunnel"
-
-    def __init__(self, drop: str = None, drop_range=(1, 1)):
-        super().__init__()
-        self._drop = drop
-        self._drop_range = drop_range
-        self._active = False
-
-
-class Flagblock(Block):
-    _id = "flag_block"
-
-    def __init__(self, drop: str = None, drop_range=(1, 1)):
-        super().__init__()
-        self._drop = drop
-        self._drop_range = drop_range
-        self._active = False
-
-
-class Switch(Block):
-    _id = "switch"
-
-    _press_stamp = 0
-
-    def __init__(self):
-        super().__init__()
-
-    def press(self, n):
-        self._press_stamp = 1000 * n
-
-    def step(self, time_delta, game_data):
-        self._press_stamp -= 1
-
-    def isPressed(self):
-        return self._press_stamp > 0
-
-
-def create_block(world: World, block_id: str, x: int, y: int, *args):
-    """Create a new block instance and add it to the world based on the block_id.
-
-    Parameters:
-        world (World): The world where the block should be added to.
-        block_id (str): The block identifier of the block to create.
-        x (int): The x coordinate of the block.
-        y (int): The y coordinate of the block.
-    """
-    block_id = BLOCKS[block_id]
-    if block_id == "mystery_empty":
-        block = MysteryBlock()
-    elif block_id == "mystery_coin":
-        block = MysteryBlock(drop="coin", drop_range=(3, 6))
-    elif block_id == "bounce":
-        block = Bounce()
-    elif block_id == "tunnel":
-        block = Tunnel()
-    elif block_id == "flag_block":
-        block = Flagblock()
-    elif block_id == "switch":
-        block = Switch()
-    else:
-        block = Block(block_id)
-
-    world.add_block(block, x * BLOCK_SIZE, y * BLOCK_SIZE)
-
-
-def create_item(world: World, item_id: str, x: int, y: int, *args):
-    """Create a new item instance and add it to the world based on the item_id.
-
-    Parameters:
-        world (World): The world where the item should be added to.
-        item_id (str): The item identifier of the item to create.
-        x (int): The x coordinate of the item.
-        y (int): The y coordinate of the item.
-    """
-    item_id = ITEMS[item_id]
-    if item_id == "coin":
-        item = Coin()
-    elif item_id == "star":
-        item = Star(10)
-    else:
-        item = DroppedItem(item_id)
-
-    world.add_item(item, x * BLOCK_SIZE, y * BLOCK_SIZE)
-
-
-def create_mob(world: World, mob_id: str, x: int, y: int, *args):
-    """Create a new mob instance and add it to the world based on the mob_id.
-
-    Parameters:
-        world (World): The world where the mob should be added to.
-        mob_id (str): The mob identifier of the mob to create.
-        x (int): The x coordinate of the mob.
-        y (int): The y coordinate of the mob.
-    """
-    mob_id = MOBS[mob_id]
-    if mob_id == "cloud":
-        mob = CloudMob()
-    elif mob_id == "fireball":
-        mob = Fireball()
-    elif mob_id == "mushroom":
-        mob = Mushroom()
-    elif mob_id == "myfireball":
-        mob = myFireball()
-    else:
-        mob = Mob(mob_id, size=(1, 1))
-
-    world.add_mob(mob, x * BLOCK_SIZE, y * BLOCK_SIZE)
-
-
-def create_unknown(world: World, entity_id: str, x: int, y: int, *args):
-    """Create an unknown entity."""
-    world.add_thing(Entity(), x * BLOCK_SIZE, y * BLOCK_SIZE,
-                    size=(BLOCK_SIZE, BLOCK_SIZE))
-
+# Key which toggles an overlay of frame timings & world statistics
+OVERLAY_KEY = "<F3>"
+# Key which profiles the next PROFILE_FRAMES frames, saving the profile to PROFILE_FILENAME
+PROFILE_KEY = "<F4>"
+PROFILE_FRAMES = 300
+PROFILE_FILENAME = "mario.prof"
+# Key which starts & stops recording input to RECORDING_FILENAME, for replaying with headless.py
+RECORD_KEY = "<F5>"
+RECORDING_FILENAME = "session.replay"
+# File the high scores are kept in (see highscore.py)
+SCORE_FILENAME = "score"
 
 BLOCK_IMAGES = {
     "brick": "brick",
@@ -303,6 +63,25 @@ MOB_IMAGES = {
     "myfireball": "fireball_down"
 }
 
+# Images drawn for particular entity states, rather than by entity id
+STATE_IMAGES = ("mario_right", "mario_left", "coin", "coin_used", "mushroom",
+                "mushroom_squished", "switch", "switch_pressed")
+
+# The (sheet, x, y, width, height) of images found in the sprite sheets
+SPRITE_FRAMES = {
+    "brick": ("blocks", 272, 112, 16, 16),
+    "coin": ("blocks", 80, 112, 16, 16),
+    "coin_used": ("blocks", 128, 112, 16, 16),
+    "bounce_block": ("items", 112, 16, 16, 16),
+    "flag_block": ("items", 128, 0, 16, 16),
+    "star": ("items", 0, 48, 16, 16),
+    "mario_right": ("characters", 80, 34, 16, 16),
+    "floaty": ("enemies", 416, 8, 17, 24),
+    "mushroom": ("enemies", 0, 16, 16, 16),
+    "mushroom_squished": ("enemies", 32, 16, 16, 16),
+    "tunnel": ("tiles", 0, 128, 32, 32),
+}
+
 
 class MarioViewRenderer(ViewRenderer):
     """A customised view renderer for a game of mario."""
@@ -316,8 +95,8 @@ class MarioViewRenderer(ViewRenderer):
         else:
             image = self.load_image("mario_left")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="player")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="player")]
 
     @ViewRenderer.draw.register(MysteryBlock)
     def _draw_mystery_block(self, instance: MysteryBlock, shape: pymunk.Shape,
@@ -327,24 +106,24 @@ class MarioViewRenderer(ViewRenderer):
         else:
             image = self.load_image("coin_used")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="block")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="block")]
 
     @ViewRenderer.draw.register(Tunnel)
     def _draw_mystery_block(self, instance: MysteryBlock, shape: pymunk.Shape,
                             view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
         image = self.load_image("tunnel")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="block")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="block")]
 
     @ViewRenderer.draw.register(Flagblock)
     def _draw_mystery_block(self, instance: MysteryBlock, shape: pymunk.Shape,
                             view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
         image = self.load_image("flag_block")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="block")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="block")]
 
     @ViewRenderer.draw.register(Mushroom)
     def _draw_mystery_block(self, instance: MysteryBlock, shape: pymunk.Shape,
@@ -354,8 +133,8 @@ class MarioViewRenderer(ViewRenderer):
         else:
             image = self.load_image("mushroom_squished")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="mob")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="mob")]
 
     @ViewRenderer.draw.register(Switch)
     def _draw_mystery_block(self, instance: Switch, shape: pymunk.Shape,
@@ -365,8 +144,21 @@ class MarioViewRenderer(ViewRenderer):
         else:
             image = self.load_image("switch")
 
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="mob")]
+        x, y = shape.bb.center()
+        return [view.create_image(x + offset[0], y, image=image, tags="mob")]
+
+    @ViewRenderer.get_state.register(Player)
+    def _player_state(self, instance: Player, shape: pymunk.Shape):
+        return shape.body.velocity.x >= 0
+
+    @ViewRenderer.get_state.register(MysteryBlock)
+    @ViewRenderer.get_state.register(Mushroom)
+    def _active_state(self, instance, shape: pymunk.Shape):
+        return instance.is_active()
+
+    @ViewRenderer.get_state.register(Switch)
+    def _switch_state(self, instance: Switch, shape: pymunk.Shape):
+        return instance.isPressed()
 
 
 class WorldState:
@@ -485,13 +277,17 @@ class Dialog(tk.Toplevel):
 
 
 class ScoreDialog(Dialog):
+    def __init__(self, parent, high_scores: HighScoreStore, title="High Scores"):
+        self._high_scores = high_scores
+        super().__init__(parent, title)
+
     def body(self, master):
-        f = open("score", "rt")
-        content = f.readline()
-        if content == "":
+        # read from memory, as the score file may still be being written
+        scores = self._high_scores.get_scores()
+        if not scores:
             tk.Label(master, text="empty").grid(row=0)
-        else:
-            tk.Label(master, text=content).grid(row=0)
+        for rank, (score, name) in enumerate(scores):
+            tk.Label(master, text=f"{rank + 1}. {name or '-'}: {score}").grid(row=rank)
 
         self.e1 = tk.Entry(master)
         return self.e1
@@ -600,8 +396,11 @@ class UI:
         frame.bind("<Leave>", self._leaveCallback)
         frame.bind("<Enter>", self._enterCallback)
 
+    def setHighScores(self, high_scores):
+        self._highScores = high_scores
+
     def showHighScores(self):
-        ScoreDialog(self._frame)
+        ScoreDialog(self._frame, self._highScores)
 
     def initStatusBar(self):
         if hasattr(self, "_statusBar"):
@@ -642,80 +441,150 @@ class UI:
         self.__enterCallback = f
 
 
-class MarioApp:
+class MarioApp(MarioGame):
     """High-level app class for Mario, a 2d platformer"""
 
-    _world: World
     _state: WorldState
     _view: GameView
     _ui: UI
 
-    def __init__(self, master: tk.Tk, ui: UI, config):
+    def __init__(self, master: tk.Tk, ui: UI, config_filename: str = None):
         """Construct a new game of a MarioApp game.
 
         Parameters:
             master (tk.Tk): tkinter root widget
+            ui (UI): The menus & status bar of the game
+            config_filename (str): The name of the configuration file (see config.py),
+                                   or None to use the default configuration
         """
 
         self._master = master
+        self._config_filename = config_filename
+        self._config = DEFAULT_CONFIG
+        self._config_error = None
+        config = self._reload_config()
         self._state = WorldState()
         self._ui = ui
+        self._high_scores = HighScoreStore(SCORE_FILENAME)
+        self._ui.setHighScores(self._high_scores)
+
+        player, performance = config.player, config.performance
+        super().__init__(gravity=config.world.gravity, merge_static=performance.merge_static,
+                         chunk_size=performance.chunk_size,
+                         activity_radius=performance.activity_radius,
+                         step_size=performance.step_size, start_position=(player.x, player.y),
+                         speeds=(player.speed, player.jump_speed, player.duck_speed))
+
+        self._renderer = MarioViewRenderer(BLOCK_IMAGES, ITEM_IMAGES, MOB_IMAGES,
+                                           atlas=SpriteAtlas(SPRITE_FRAMES))
+        self._renderer.preload(STATE_IMAGES)
+
+        self._timestep = FixedTimestep(performance.step_size,
+                                       max_steps=performance.max_catch_up_steps)
+        self._step_timer = FrameTimer()
+        self._render_timer = FrameTimer()
+        # time spent in the "step", "scroll" & "redraw" phases of each frame
+        self._phase_timer = PhaseTimer()
+        # time between the starts of consecutive frames
+        self._frame_timer = FrameTimer()
+        self._last_frame = None
+
+        self._show_overlay = False
+        self._overlay = None
+        self._profiler = None
+        self._profile_frames = 0
+        self._profile_filename = None
+
+        self.bind()
+        self.start(config.world.start)
 
-        world_config, player_config = config
+        master.update_idletasks()
 
-        world_builder = WorldBuilder(BLOCK_SIZE, gravity=(0, int(world_config[0])), fallback=create_unknown)
-        world_builder.register_builders(BLOCKS.keys(), create_block)
-        world_builder.register_builders(ITEMS.keys(), create_item)
-        world_builder.register_builders(MOBS.keys(), create_mob)
-        self._builder = world_builder
+    def load_level(self, level: str, seed: int = None):
+        self._reload_config()
+        super().load_level(level, seed=seed)
+        self._world.set_profiling(self._show_overlay)
 
-        self._renderer = MarioViewRenderer(BLOCK_IMAGES, ITEM_IMAGES, MOB_IMAGES)
+        # build the levels which may be played next while this one is played
+        for next_level in set(self._get_next_levels()):
+            if next_level is not None:
+                self.preload_level(next_level)
 
-        self.bind()
-        self.start(world_config[1])
+    def get_config(self) -> Config:
+        """(Config) Returns the game's configuration, as of when the current level was loaded"""
+        return self._config
 
-        master.update_idletasks()
+    def _reload_config(self) -> Config:
+        """(Config) Reloads the game's configuration if its file has changed.
 
-    def reset_world(self, new_level):
-        self._builder.clear()
-        self._world = load_world(self._builder, new_level)
-        self._world.add_player(self._player, BLOCK_SIZE, BLOCK_SIZE)
-        self._setup_collision_handlers()
+        If the file can no longer be loaded, the last configuration loaded is kept.
+        The file is only parsed again once it has changed (see config.load_config),
+        but is checked on disk, so this is only called when a level is loaded
+        rather than every frame.
+        """
+        if self._config_filename is not None:
+            try:
+                self._config = load_config(self._config_filename)
+                self._config_error = None
+            except (ConfigError, OSError) as error:
+                # only report each problem once, rather than every level
+                if str(error) != self._config_error:
+                    print(f"Keeping the previous configuration, as {self._config_filename} "
+                          f"couldn't be loaded: {error}")
+                self._config_error = str(error)
+        return self._config
+
+    def _get_next_levels(self):
+        """(tuple<str, str>) Returns the file names of the levels played after the current
+        level, by going down a tunnel & by reaching the goal; None finishes the game"""
+        level = self.get_config().levels.get(self.get_level())
+        if level is None:
+            return None, None
+        return level
+
+    def _create_player(self) -> Player:
+        """(Player) Returns a new player, as configured"""
+        player = self.get_config().player
+        return Player(name=player.character, max_health=player.health)
+
+    def _create_view(self):
+        """Replace the game view with one sized for the current world."""
         size = tuple(map(min, zip(MAX_WINDOW_SIZE, self._world.get_pixel_size())))
         if hasattr(self, '_view'):
             self._view.destroy()
-        self._view = GameView(self._master, size, self._renderer)
+        self._view = GameView(self._master, size, self._renderer,
+                              retained=self.get_config().render.retained)
         self._view.pack()
-        self._ui.initStatusBar()
-        self._player.connectUI(self._ui)
+        self._overlay = None
 
-    def next_level(self):
-        f = open("score", "w+")
-        content = f.read()
-        if content == "":
-            content = []
-            content.append(self._player.get_realscore())
-            f.write(json.dumps(content))
+    def reset_world(self, new_level):
+        if new_level == self.get_level() and hasattr(self, '_view'):
+            # restarting the current level keeps its world & the view
+            self.reset_level()
+            self._view.clear()
+            self._overlay = None
         else:
-            content = json.load(f)
-            content.append(self._player.get_realscore())
-            content.sort()
-            if content.len() > 10:
-                content.remove(content.len() - 1)
-        f.write(json.dumps(content))
-
-        if self._preMapName == "level2.txt":
-            ScoreDialog()
+            self.load_level(new_level)
+            self._create_view()
+            self._ui.initStatusBar()
+        self._player.connectUI(self._ui)
+
+    def get_high_scores(self) -> HighScoreStore:
+        """(HighScoreStore) Returns the store of high scores"""
+        return self._high_scores
+
+    def next_level(self, goal: str = "flag_block"):
+        # written in the background, so the frame loop doesn't wait on the disk
+        self._high_scores.add(self._player.get_realscore(), self._player.get_name())
+
+        tunnel, next_level = self._get_next_levels()
+        if goal == "tunnel" and tunnel is not None:
+            next_level = tunnel
+        if next_level is None:
+            ScoreDialog(self._master, self._high_scores)
             return
-        self._builder.clear()
-        self._world = load_world(self._builder, "level2.txt")
-        self._world.add_player(self._player, BLOCK_SIZE, BLOCK_SIZE)
-        self._setup_collision_handlers()
-        size = tuple(map(min, zip(MAX_WINDOW_SIZE, self._world.get_pixel_size())))
-        if hasattr(self, '_view'):
-            self._view.destroy()
-        self._view = GameView(self._master, size, self._renderer)
-        self._view.pack()
+        self.load_level(next_level)
+        self._create_view()
 
     def bind(self):
         """Bind all the keyboard events to their event handlers."""
@@ -736,6 +605,10 @@ class MarioApp:
         self._master.bind("<Down>", self._duck)
         self._master.bind("<x>", self._attack)
 
+        self._master.bind(OVERLAY_KEY, lambda e: self.toggle_overlay())
+        self._master.bind(PROFILE_KEY, lambda e: self.start_profile(PROFILE_FRAMES, PROFILE_FILENAME))
+        self._master.bind(RECORD_KEY, lambda e: self.toggle_recording(RECORDING_FILENAME))
+
         self._ui.bindLoadLeven(lambda: self.start(MyDialog(self._master).result))
         self._ui.bindResetLevel(lambda: self.start())
         self._ui.bindLeave(lambda e: self.pendding())
@@ -743,14 +616,24 @@ class MarioApp:
 
     def redraw(self):
         """Redraw all the entities in the game canvas."""
-        self._view.delete(tk.ALL)
-        self._view.draw_entities(self._world.get_all_things())
+        if not self._view.is_retained():
+            self._view.delete(tk.ALL)
+
+        render = self.get_config().render
+        if render.cull_viewport:
+            margin = render.cull_margin
+            things = self._world.get_things_in_rect(*self._view.get_viewport(margin))
+        else:
+            things = self._world.get_all_things()
+
+        alpha = self._timestep.get_alpha()
+        self._view.draw_entities(things, lambda thing: self._world.get_interpolated_position(thing, alpha))
 
     def scroll(self):
         """Scroll the view along with the player in the center unless
         they are near the left or right boundaries
         """
-        x_position = self._player.get_position()[0]
+        x_position = self._world.get_interpolated_position(self._player, self._timestep.get_alpha())[0]
         half_screen = self._master.winfo_width() / 2
         world_size = self._world.get_pixel_size()[0] - half_screen
 
@@ -767,27 +650,143 @@ class MarioApp:
             self._view.set_offset((half_screen - world_size, 0))
 
     def step(self):
-        """Step the world physics and redraw the canvas."""
+        """Step the world physics as many times as real time requires and redraw the canvas."""
         if self._state.isRunning():
-            data = (self._world, self._player)
-            self._world.step(data)
-
+            now = time.perf_counter()
+            if self._last_frame is not None:
+                self._frame_timer.record(now - self._last_frame)
+            self._last_frame = now
+
+            self._step_timer.start()
+            for _ in range(self._timestep.advance()):
+                self.step_world()
+            self._phase_timer.record("step", self._step_timer.stop())
+
+            self._render_timer.start()
+            start = time.perf_counter()
             self.scroll()
+            scrolled = time.perf_counter()
             self.redraw()
+            self._phase_timer.record("scroll", scrolled - start)
+            self._phase_timer.record("redraw", time.perf_counter() - scrolled)
+            self._render_timer.stop()
 
-            self._master.after(10, self.step)
+            if self._show_overlay:
+                self._draw_overlay()
+            if self._profiler is not None:
+                self._profile_frame()
+
+            self._master.after(self.get_config().render.frame_delay, self.step)
+        else:
+            self._last_frame = None
+
+    def get_step_timer(self) -> FrameTimer:
+        """(FrameTimer) Returns the timer recording the time spent stepping physics each frame"""
+        return self._step_timer
+
+    def get_render_timer(self) -> FrameTimer:
+        """(FrameTimer) Returns the timer recording the time spent scrolling & redrawing each frame"""
+        return self._render_timer
+
+    def get_phase_timer(self) -> PhaseTimer:
+        """(PhaseTimer) Returns the timer of the "step", "scroll" & "redraw" phases of each frame"""
+        return self._phase_timer
+
+    def get_frame_timer(self) -> FrameTimer:
+        """(FrameTimer) Returns the timer recording the time between the starts of frames"""
+        return self._frame_timer
+
+    def toggle_overlay(self):
+        """Show or hide the overlay of frame timings & world statistics.
+
+        The world's steps are only profiled while the overlay is shown.
+        """
+        self._show_overlay = not self._show_overlay
+        self._world.set_profiling(self._show_overlay)
+
+        if not self._show_overlay and self._overlay is not None:
+            self._view.delete(self._overlay)
+            self._overlay = None
+
+    def _draw_overlay(self):
+        """Draw the overlay of frame timings & world statistics in the top-left corner."""
+        phases = self._phase_timer.get_averages()
+        world_phases = self._world.get_phase_timer().get_averages()
+        classes = self._world.get_class_timer().get_averages()
+        stats = self._world.get_step_stats()
+
+        def ms(seconds):
+            return f"{seconds * 1000:.2f}ms"
+
+        lines = [
+            f"{self._frame_timer.get_rate():.0f} fps",
+            "step {} (entities {}, physics {}) scroll {} redraw {}".format(
+                ms(phases.get("step", 0)), ms(world_phases.get("entities", 0)),
+                ms(world_phases.get("physics", 0)), ms(phases.get("scroll", 0)),
+                ms(phases.get("redraw", 0))),
+            "shapes {shapes} bodies {bodies} collisions {collisions} "
+            "active {active} sleeping {sleeping}".format(**stats),
+        ]
+        slowest = sorted(classes.items(), key=lambda item: item[1], reverse=True)[:3]
+        if slowest:
+            lines.append(" ".join(f"{name} {ms(duration)}" for name, duration in slowest))
+        load = self.get_last_load()
+        if load is not None:
+            lines.append("loaded {} in {} ({}, waited {})".format(
+                load["level"], ms(load["seconds"]),
+                "preloaded" if load["preloaded"] else "not preloaded", ms(load["wait"])))
+        text = "\n".join(lines)
+
+        # the canvas is cleared every frame unless rendering is retained
+        if self._overlay is None or not self._view.type(self._overlay):
+            self._overlay = self._view.create_text(4, 4, anchor=tk.NW, text=text,
+                                                   font=("Courier", 9), fill="black")
+        else:
+            self._view.itemconfigure(self._overlay, text=text)
+            self._view.tag_raise(self._overlay)
+
+    def start_profile(self, frames: int, filename: str):
+        """Profile the next 'frames' frames with cProfile, saving the profile to a file.
+
+        The profile can be read with the pstats module, e.g.
+            python -m pstats mario.prof
+
+        Parameters:
+            frames (int): The number of frames to profile
+            filename (str): The file to save the profile to
+        """
+        if self._profiler is not None:
+            return
+
+        self._profiler = cProfile.Profile()
+        self._profile_frames = frames
+        self._profile_filename = filename
+        self._profiler.enable()
+
+    def _profile_frame(self):
+        """Count a profiled frame, saving the profile once enough frames were profiled."""
+        self._profile_frames -= 1
+        if self._profile_frames > 0:
+            return
+
+        self._profiler.disable()
+        self._profiler.dump_stats(self._profile_filename)
+        print(f"Saved profile to {self._profile_filename}")
+        self._profiler = None
 
     def start(self, mapName=None):
         if mapName == None and self._preMapName:
-            self._player = Player(max_health=5)
+            self._player = self._create_player()
             self.reset_world(self._preMapName)
             self._state.setRunning(True)
+            self._timestep.reset()
             self.step()
         else:
             self._preMapName = mapName
-            self._player = Player(max_health=5)
+            self._player = self._create_player()
             self.reset_world(mapName)
             self._state.setRunning(True)
+            self._timestep.reset()
             self.step()
 
     def pendding(self):
@@ -796,150 +795,54 @@ class MarioApp:
     def conti(self):
         if self._state.isPendding():
             self._state.setRunning(True)
+            self._timestep.reset()
             self.step()
 
+    def toggle_recording(self, filename: str):
+        """Start or stop recording input to a file.
+
+        Starting a recording restarts the current level, so that the recording
+        can be replayed from the start of the level (see headless.py).
+
+        Parameters:
+            filename (str): The name of the file to record to
+        """
+        if self.is_recording():
+            self.stop_recording()
+            print(f"Saved recording to {filename}")
+        else:
+            self.start_recording(filename)
+            self.start()
+
     def _move(self, event):
         move_pos = repr(event.char)
         move_pos = move_pos.replace("'", "")
 
-        pos_y = self._player.get_velocity()[1]
         if move_pos == 'd' or (event.keysym == "Right") or move_pos == 'D':
-            self._player.set_velocity((80, pos_y))
+            self.queue_action("right")
         elif move_pos == 'a' or (event.keysym == "Left") or move_pos == "A":
-            self._player.set_velocity((-80, pos_y))
+            self.queue_action("left")
 
     def _jump(self, event):
-        pos_x = self._player.get_velocity()[0]
-        if not self._player.is_jumping():
-            self._player.set_velocity((pos_x, -200))
-            self._player.set_jumping(True)
+        self.queue_action("jump")
 
     def _duck(self, event):
-        if not self._player.is_jumping():
-            pos_x = self._player.get_velocity()[0]
-            self._player.set_velocity((pos_x, 100))
+        self.queue_action("duck")
 
     def _attack(self, e):
-        self._player.attack(self._world, myFireball())
-
-    def _setup_collision_handlers(self):
-        self._world.add_collision_handler("player", "item", on_begin=self._handle_player_collide_item)
-        self._world.add_collision_handler("player", "block", on_begin=self._handle_player_collide_block,
-                                          on_separate=self._handle_player_separate_block)
-        self._world.add_collision_handler("player", "mob", on_begin=self._handle_player_collide_mob)
-        self._world.add_collision_handler("mob", "block", on_begin=self._handle_mob_collide_block)
-        self._world.add_collision_handler("mob", "mob", on_begin=self._handle_mob_collide_mob)
-        self._world.add_collision_handler("mob", "item", on_begin=self._handle_mob_collide_item)
-
-    def _handle_mob_collide_block(self, mob: Mob, block: Block, data,
-                                  arbiter: pymunk.Arbiter) -> bool:
-        mob_id = mob.get_id()
-        block_id = block.get_id()
-        if mob_id == "fireball" or mob_id == "myfireball":
-            if block_id == "brick":
-                self._world.remove_block(block)
-            self._world.remove_mob(mob)
-        if mob_id == "mushroom":
-            mob.on_hit(arbiter, block)
-        return True
-
-    def _handle_mob_collide_item(self, mob: Mob, block: Block, data,
-                                 arbiter: pymunk.Arbiter) -> bool:
-        return False
-
-    def _handle_mob_collide_mob(self, mob1: Mob, mob2: Mob, data,
-                                arbiter: pymunk.Arbiter) -> bool:
-        id1 = mob1.get_id()
-        id2 = mob2.get_id()
-        if id1 == "fireball" or id2 == "fireball" or id1 == "myfireball" or id2 == "myfireball":
-            self._world.remove_mob(mob1)
-            self._world.remove_mob(mob2)
-
-        return False
-
-    def _handle_player_collide_item(self, player: Player, dropped_item: DroppedItem,
-                                    data, arbiter: pymunk.Arbiter) -> bool:
-        """Callback to handle collision between the player and a (dropped) item. If the player has sufficient space in
-        their to pick up the item, the item will be removed from the game world.
-
-        Parameters:
-            player (Player): The player that was involved in the collision
-            dropped_item (DroppedItem): The (dropped) item that the player collided with
-            data (dict): data that was added with this collision handler (see data parameter in
-                         World.add_collision_handler)
-            arbiter (pymunk.Arbiter): Data about a collision
-                                      (see http://www.pymunk.org/en/latest/pymunk.html#pymunk.Arbiter)
-                                      NOTE: you probably won't need this
-        Return:
-             bool: False (always ignore this type of collision)
-                   (more generally, collision callbacks return True iff the collision should be considered valid; i.e.
-                   returning False makes the world ignore the collision)
-        """
-
-        item_id = dropped_item.get_id()
-        if item_id == "coin":
-            self._player.change_realscore(1)
-        elif item_id == "star":
-            dropped_item.collect(player)
-        self._world.remove_item(dropped_item)
-        return True
-
-    def _handle_player_collide_block(self, player: Player, block: Block, data,
-                                     arbiter: pymunk.Arbiter) -> bool:
-        block_id = block.get_id()
-        if block_id == "flag_block" or block_id == "tunnel":
-            self.next_level()
-        elif block_id == "switch":
-            block.press(0.3)
-        elif block_id == "bounce":
-            block.on_hit(arbiter, (self._world, player))
-        else:
-            block.on_hit(arbiter, (self._world, player))
-
-        player.set_jumping(False)
-        return True
-
-    def _handle_player_collide_mob(self, player: Player, mob: Mob, data,
-                                   arbiter: pymunk.Arbiter) -> bool:
-        if mob.get_id() == "fireball":
-            mob.on_hit(arbiter, (self._world, player))
-            player.damage()
-        if mob.get_id() == "mushroom":
-            mob.on_hit_player(arbiter, player)
-        return True
-
-    def _handle_player_separate_block(self, player: Player, block: Block, data,
-                                      arbiter: pymunk.Arbiter) -> bool:
-        return True
-
-
-def parse(path):
-    f = open(path, 'rt')
-    sreadlines = f.readlines()
-    ret = ([], [])
-    world = False
-    player = False
-    for i in range(len(sreadlines)):
-        l = sreadlines[i]
-        if l.find("World") > 0:
-            world = True
-            player = False
-            continue
-        elif l.find("Player") > 0:
-            world = False
-            player = True
-            continue
-        if world:
-            ret[0].append(l.split(":")[1].strip())
-        else:
-            ret[1].append(l.split(":")[1].strip())
-    return ret
+        self.queue_action("attack")
 
 
 if __name__ == '__main__':
     frame = tk.Tk()
     ui = UI(frame)
-    path = pathDialog(frame).result
-    config = parse(path)
-    app = MarioApp(frame, ui, config)
+    path = pathDialog(frame).result or None
+    if path is not None:
+        try:
+            load_config(path)
+        except (ConfigError, OSError) as error:
+            print(f"Using the default configuration, as {path} couldn't be loaded: {error}")
+            path = None
+    app = MarioApp(frame, ui, path)
     frame.mainloop()
+    app.get_high_scores().close()
@@ -0,0 +1,463 @@
+"""
+Benchmarks for the hot paths of the game engine, on synthetic levels.
+
+Usage:
+    python benchmark.py run --widths 100,1000,5000 --output report.json
+    python benchmark.py compare before.json after.json --threshold 0.1
+
+Each benchmark reports the best time per operation, in seconds, for each
+level width, except memory benchmarks, which report bytes. Comparing two
+reports flags every benchmark that became slower (or larger) by more than
+the threshold, and exits with a non-zero status if any did.
+
+Must be run from the Assignment3 directory, as the renderer loads its images
+from a relative path.
+"""
+
+__version__ = "1.1.0"
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, List
+
+import pymunk
+
+from game.mob import Mob
+from game.util import get_collision_direction
+from game.world import CollisionRule
+from game.block import Block
+from level import WorldBuilder, load_world, read_entities
+from mario import BLOCK_SIZE, BLOCKS, TERRAIN_BLOCKS, create_builder
+from headless import HeadlessMario
+
+# Stand-in for the pymunk.Arbiter given to collision callbacks, which can only
+# be created by pymunk during a step
+Contact = namedtuple("Contact", ["shapes", "contact_point_set", "normal"])
+
+# Benchmark functions, by name, which take a level file name and return the
+# best time per operation in seconds, or None if the benchmark was skipped
+BENCHMARKS = {}
+# Unit of the results of each benchmark, by name: "s" for seconds or "B" for bytes
+UNITS = {}
+
+
+def benchmark(name: str, unit: str = "s"):
+    """Register a benchmark function under the given name, whose results are in 'unit'."""
+    def register(func: Callable):
+        BENCHMARKS[name] = func
+        UNITS[name] = unit
+        return func
+    return register
+
+
+def measure(func: Callable, number: int, repeat: int = 3) -> float:
+    """Time a function, returning the best time per call over several repeats.
+
+    Parameters:
+        func (Callable): The function to time, called without arguments.
+        number (int): The number of calls per repeat.
+        repeat (int): The number of repeats.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def generate_level(width: int, height: int = 18, density: float = 0.05,
+                   mobs: int = 10, seed: int = 0) -> str:
+    """Generate a random level string in the format of the level files.
+
+    Parameters:
+        width (int): The number of columns in the level.
+        height (int): The number of rows in the level.
+        density (float): The chance of each cell above the ground being a block.
+        mobs (int): The number of mobs in the level.
+        seed (int): The seed of the random generator, so levels are repeatable.
+    """
+    rng = random.Random(seed)
+    rows = [[' '] * width for _ in range(height)]
+
+    # two rows of solid ground
+    rows[-2] = ['#'] * width
+    rows[-1] = ['%'] * width
+
+    # floating platforms, mystery blocks and coins
+    for y in range(height // 3, height - 4):
+        for x in range(4, width):
+            if rng.random() < density:
+                rows[y][x] = rng.choice("###^?$")
+            elif rng.random() < density / 4:
+                rows[y][x] = 'C'
+
+    for _ in range(mobs):
+        x = rng.randrange(4, width)
+        if rng.random() < 0.8:
+            rows[height - 3][x] = '@'
+        else:
+            rows[1][x] = '&'
+
+    return "\n".join("".join(row) for row in rows)
+
+
+def write_level(level: str) -> str:
+    """Write a level string to a temporary file, returning the file's name."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        file.write(level)
+    return file.name
+
+
+@benchmark("load_world")
+def bench_load_world(filename: str) -> float:
+    builder = create_builder()
+
+    def load():
+        builder.clear()
+        load_world(builder, filename)
+
+    return measure(load, number=5)
+
+
+@benchmark("block_memory", unit="B")
+def bench_block_memory(filename: str) -> float:
+    return _bench_block_memory(filename, create_builder())
+
+
+class _UnslottedBlock(Block):
+    """A plain block with an instance __dict__, as every block had before blocks
+    declared __slots__, and which is never shared"""
+
+
+@benchmark("block_memory_unslotted", unit="B")
+def bench_block_memory_unslotted(filename: str) -> float:
+    builder = create_builder()
+    builder.register_terrain(TERRAIN_BLOCKS, lambda block_id, *args: _UnslottedBlock(BLOCKS[block_id]))
+    return _bench_block_memory(filename, builder)
+
+
+def _bench_block_memory(filename: str, builder: WorldBuilder) -> float:
+    """Measure the memory allocated by Python for a level's world, in bytes per block.
+
+    Memory allocated by pymunk's C library isn't traced, so this is the memory of the
+    entities, the Python side of their shapes & bodies, and the world's grid & indices.
+    """
+    plan = builder.plan([(entity_id, x, y, ()) for entity_id, x, y in read_entities(filename)])
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        world = builder.build_plan(plan)
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    columns, rows = world.get_grid_size()
+    blocks = sum(world.get_grid_block(column, row) is not None
+                 for column in range(columns) for row in range(rows))
+    return allocated / blocks
+
+
+@benchmark("world_step")
+def bench_world_step(filename: str) -> float:
+    game = HeadlessMario(filename)
+    return measure(game.step_world, number=100)
+
+
+@benchmark("step_mobs")
+def bench_step_mobs(filename: str) -> float:
+    return _bench_step_mobs(filename, batched=False)
+
+
+@benchmark("step_mobs_batched")
+def bench_step_mobs_batched(filename: str) -> float:
+    return _bench_step_mobs(filename, batched=True)
+
+
+def _bench_step_mobs(filename: str, batched: bool) -> float:
+    """Time stepping every mob in a level, one at a time or in a batch per class.
+
+    The number of mobs grows with the width of the level (see the --mobs option).
+    """
+    game = HeadlessMario(filename, activity_radius=None)
+    world = game.get_world()
+    game_data = (world, game.get_player())
+    step_size = world.get_step_size()
+    mobs = [thing for thing in world.get_steppable_things() if isinstance(thing, Mob)]
+
+    batches = {}
+    for mob in mobs:
+        batches.setdefault(type(mob), []).append(mob)
+
+    def step_batches():
+        for cls, batch in batches.items():
+            cls.step_batch(batch, step_size, game_data)
+
+    def step_each():
+        for mob in mobs:
+            mob.step(step_size, game_data)
+
+    return measure(step_batches if batched else step_each, number=100)
+
+
+@benchmark("get_things_in_range")
+def bench_get_things_in_range(filename: str) -> float:
+    world = HeadlessMario(filename).get_world()
+    width, height = world.get_pixel_size()
+    points = [(x, height - 3 * BLOCK_SIZE) for x in range(0, int(width), BLOCK_SIZE)]
+    points = iter(points * 1000)
+
+    return measure(lambda: world.get_things_in_range(*next(points), 3 * BLOCK_SIZE), number=1000)
+
+
+def _find_mobs_on_blocks(world) -> List[Contact]:
+    """Find each mob standing on a block, as the contact between the mob & the block."""
+    mobs = [thing for thing in world.get_all_things() if hasattr(thing, "get_tempo")]
+
+    contacts = []
+    for mob in mobs:
+        x, y = mob.get_position()
+        block = world.get_block(x, y + 1.5 * BLOCK_SIZE)
+        if block is not None:
+            shapes = mob.get_shape(), block.get_shape()
+            contacts.append((mob, block, Contact(shapes, None, (0, 1))))
+    return contacts
+
+
+@benchmark("get_collision_direction")
+def bench_get_collision_direction(filename: str) -> float:
+    contacts = _find_mobs_on_blocks(HeadlessMario(filename).get_world())
+    if not contacts:
+        return None
+
+    return measure(lambda: [get_collision_direction(mob, block) for mob, block, _ in contacts],
+                   number=100) / len(contacts)
+
+
+@benchmark("get_collision_direction_normal")
+def bench_get_collision_direction_normal(filename: str) -> float:
+    contacts = _find_mobs_on_blocks(HeadlessMario(filename).get_world())
+    if not contacts:
+        return None
+
+    return measure(lambda: [get_collision_direction(mob, block, contact)
+                            for mob, block, contact in contacts],
+                   number=100) / len(contacts)
+
+
+def _create_contacts(world) -> List[Contact]:
+    """Create a contact between each consecutive pair of things in the world."""
+    shapes = [thing.get_shape() for thing in world.get_all_things()]
+
+    contacts = []
+    for shape_a, shape_b in zip(shapes, shapes[1:]):
+        point = pymunk.ContactPoint(shape_a.bb.center(), shape_b.bb.center(), 0)
+        contacts.append(Contact((shape_a, shape_b), pymunk.ContactPointSet((0, 1), [point]), (0, 1)))
+    return contacts
+
+
+@benchmark("collision_dispatch")
+def bench_collision_dispatch(filename: str) -> float:
+    world = HeadlessMario(filename).get_world()
+    contacts = _create_contacts(world)
+
+    callback = world._wrap_callback(lambda thing_a, thing_b, data, arbiter: True)
+    data = {'data': None}
+
+    return measure(lambda: [callback(contact, None, data) for contact in contacts],
+                   number=20) / len(contacts)
+
+
+@benchmark("collision_rule_dispatch")
+def bench_collision_rule_dispatch(filename: str) -> float:
+    world = HeadlessMario(filename).get_world()
+    contacts = _create_contacts(world)
+
+    # a specific rule for a common pair of ids, & a fallback for every other pair
+    rules = {
+        ("brick", "brick"): CollisionRule(lambda thing_a, thing_b, data, arbiter: True, "brick", "brick"),
+        (None, None): CollisionRule(lambda thing_a, thing_b, data, arbiter: True),
+    }
+    callback = world._create_rule_dispatcher(world._build_rule_table(rules))
+    data = {'data': None}
+
+    return measure(lambda: [callback(contact, None, data) for contact in contacts],
+                   number=20) / len(contacts)
+
+
+@benchmark("draw_entities")
+def bench_draw_entities(filename: str) -> float:
+    return _bench_draw(filename, retained=False)
+
+
+@benchmark("draw_entities_retained")
+def bench_draw_entities_retained(filename: str) -> float:
+    return _bench_draw(filename, retained=True)
+
+
+def _bench_draw(filename: str, retained: bool) -> float:
+    """Time drawing every thing in a level, or return None without a display."""
+    try:
+        import tkinter as tk
+    except ImportError as error:
+        print(f"  skipping draw benchmark: {error}", file=sys.stderr)
+        return None
+
+    from app import MarioViewRenderer, BLOCK_IMAGES, ITEM_IMAGES, MOB_IMAGES
+    from game.view import GameView
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        # there is no display
+        print(f"  skipping draw benchmark: {error}", file=sys.stderr)
+        return None
+
+    try:
+        game = HeadlessMario(filename)
+        world = game.get_world()
+        renderer = MarioViewRenderer(BLOCK_IMAGES, ITEM_IMAGES, MOB_IMAGES)
+        view = GameView(root, world.get_pixel_size(), renderer, retained=retained)
+
+        def draw():
+            game.step_world()
+            if not retained:
+                view.delete(tk.ALL)
+            view.draw_entities(world.get_all_things())
+
+        return measure(draw, number=10)
+    finally:
+        root.destroy()
+
+
+def run(widths: List[int], density: float, mobs: int, names: List[str] = None) -> Dict:
+    """Run the benchmarks across synthetic levels of each width.
+
+    Parameters:
+        widths (list<int>): The widths of the levels to benchmark.
+        density (float): The density of blocks in each level.
+        mobs (int): The number of mobs per 100 columns of level.
+        names (list<str>): The benchmarks to run, defaults to all of them.
+
+    Returns:
+        (dict): The benchmark report, with "meta" & "results" keys. Results map
+                each benchmark name to its result per width (see UNITS).
+    """
+    results = {}
+    for width in widths:
+        filename = write_level(generate_level(width, density=density,
+                                              mobs=max(1, width * mobs // 100)))
+        try:
+            for name in names or BENCHMARKS:
+                print(f"{name} (width={width})", file=sys.stderr)
+                result = BENCHMARKS[name](filename)
+                if result is not None:
+                    results.setdefault(name, {})[str(width)] = result
+        finally:
+            os.remove(filename)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pymunk": pymunk.version,
+            "density": density,
+            "mobs": mobs,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> List[str]:
+    """Compare two benchmark reports, printing the relative change of each result.
+
+    Parameters:
+        before (dict): The baseline report.
+        after (dict): The report to compare against the baseline.
+        threshold (float): The relative slowdown above which a result is a regression.
+
+    Returns:
+        (list<str>): A description of each regression.
+    """
+    regressions = []
+    for name, sizes in after["results"].items():
+        for size, result in sizes.items():
+            baseline = before["results"].get(name, {}).get(size)
+            if baseline is None:
+                continue
+
+            change = result / baseline - 1
+            line = (f"{name:<28} {size:>8} {_format(baseline, UNITS.get(name, 's'))} "
+                    f"{_format(result, UNITS.get(name, 's'))} {change:>+8.1%}")
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(f"{name} (width={size}) {change:+.1%}")
+            print(line)
+
+    return regressions
+
+
+def _format(result: float, unit: str) -> str:
+    """(str) Returns a benchmark result formatted for comparison"""
+    if unit == "s":
+        return f"{result * 1e6:>12.2f}us"
+    return f"{result:>12.1f}{unit} "
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--widths", default="100,1000,5000",
+                            help="comma separated level widths, in columns")
+    run_parser.add_argument("--density", type=float, default=0.05,
+                            help="chance of each cell above the ground being a block")
+    run_parser.add_argument("--mobs", type=int, default=5, help="mobs per 100 columns")
+    run_parser.add_argument("--only", help="comma separated names of benchmarks to run")
+    run_parser.add_argument("--output", help="file to write the JSON report to (default: stdout)")
+
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("before", help="the baseline report")
+    compare_parser.add_argument("after", help="the report to compare")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative slowdown considered a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        widths = [int(width) for width in args.widths.split(",")]
+        names = args.only.split(",") if args.only else None
+        report = run(widths, args.density, args.mobs, names)
+
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+    else:
+        with open(args.before) as file:
+            before = json.load(file)
+        with open(args.after) as file:
+            after = json.load(file)
+
+        regressions = compare(before, after, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
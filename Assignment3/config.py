@@ -0,0 +1,251 @@
+"""
+Loads the configuration of games of Mario into typed, validated settings.
+
+A configuration file is divided into sections, each of "key : value" lines,
+    ==World==
+    gravity : 300
+    start : level1.txt
+    ==Player==
+    character : Mario
+    health : 5
+    ==level1.txt==
+    tunnel : bonus.txt
+    goal : level2.txt
+    ==level2.txt==
+    goal : END
+    ==Performance==
+    activity_radius : none
+Sections other than World, Player, Render & Performance configure the level
+of the same name: the level played after the player goes down a tunnel, and
+after they reach the goal, where END finishes the game. Blank lines & lines
+starting with '#' are ignored, and anything not configured keeps its default.
+Unknown settings, such as those only used by other versions of the game, are
+ignored with a warning.
+
+Parsed configurations are cached until their file is modified, so loading a
+configuration again, e.g. between levels, is cheap.
+"""
+
+__version__ = "1.1.0"
+
+import os
+import warnings
+from collections import namedtuple
+from typing import Callable, Dict
+
+from game.world import STEP_SIZE
+from mario import (BLOCK_SIZE, PLAYER_SPEED, JUMP_SPEED, DUCK_SPEED, MERGE_STATIC_TERRAIN,
+                   CHUNK_SIZE, ACTIVITY_RADIUS)
+
+# Settings of each level's world
+WorldConfig = namedtuple("WorldConfig", ["gravity", "start"])
+# Settings of the player: their name, starting position & health, and speeds
+PlayerConfig = namedtuple("PlayerConfig",
+                          ["character", "x", "y", "health", "speed", "jump_speed", "duck_speed"])
+# The levels played after a level, by going down a tunnel or reaching the goal; None finishes the game
+LevelConfig = namedtuple("LevelConfig", ["tunnel", "goal"])
+# Settings of how the game is drawn
+RenderConfig = namedtuple("RenderConfig", ["retained", "cull_viewport", "cull_margin", "frame_delay"])
+# Settings trading simulation accuracy & memory for speed
+PerformanceConfig = namedtuple("PerformanceConfig",
+                               ["step_size", "max_catch_up_steps", "activity_radius",
+                                "chunk_size", "merge_static"])
+# A whole configuration; levels maps the file names of levels to their LevelConfig
+Config = namedtuple("Config", ["world", "player", "levels", "render", "performance"])
+
+DEFAULT_CONFIG = Config(
+    world=WorldConfig(gravity=300, start="level1.txt"),
+    player=PlayerConfig(character="Mario", x=BLOCK_SIZE, y=BLOCK_SIZE, health=5,
+                        speed=PLAYER_SPEED, jump_speed=JUMP_SPEED, duck_speed=DUCK_SPEED),
+    levels={
+        "level1.txt": LevelConfig(tunnel=None, goal="level2.txt"),
+        "level2.txt": LevelConfig(tunnel=None, goal=None),
+    },
+    render=RenderConfig(
+        # Keep canvas elements between frames, only updating those that changed
+        retained=True,
+        # Only draw the things within the visible area of the world
+        cull_viewport=True,
+        # Pixels around the visible area that are drawn anyway, to hide pop-in
+        cull_margin=2 * BLOCK_SIZE,
+        # Milliseconds between frames requested from tkinter
+        frame_delay=10,
+    ),
+    performance=PerformanceConfig(
+        step_size=STEP_SIZE,
+        # Most physics steps run in a single frame before the game slows down instead
+        max_catch_up_steps=5,
+        activity_radius=ACTIVITY_RADIUS,
+        chunk_size=CHUNK_SIZE,
+        merge_static=MERGE_STATIC_TERRAIN,
+    ),
+)
+
+# Value of a level's goal or tunnel which finishes the game
+END = "END"
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration file is invalid."""
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in ("true", "yes", "on", "1"):
+        return True
+    if lowered in ("false", "no", "off", "0"):
+        return False
+    raise ValueError(f"expected true or false, not {value!r}")
+
+
+def _positive(convert: Callable) -> Callable:
+    """Returns a converter which only accepts values above 0"""
+    def parse(value: str):
+        result = convert(value)
+        if result <= 0:
+            raise ValueError(f"expected a value above 0, not {value!r}")
+        return result
+    return parse
+
+
+def _optional(convert: Callable) -> Callable:
+    """Returns a converter which reads "none" as None"""
+    def parse(value: str):
+        return None if value.lower() == "none" else convert(value)
+    return parse
+
+
+def _level(value: str) -> str:
+    return None if value == END else value
+
+
+# Converters of the values of each key, by section
+SCHEMAS = {
+    "world": {
+        "gravity": int,
+        "start": str,
+    },
+    "player": {
+        "character": str,
+        "x": float,
+        "y": float,
+        "health": _positive(float),
+        "speed": float,
+        "jump_speed": float,
+        "duck_speed": float,
+    },
+    "level": {
+        "tunnel": _level,
+        "goal": _level,
+    },
+    "render": {
+        "retained": _parse_bool,
+        "cull_viewport": _parse_bool,
+        "cull_margin": float,
+        "frame_delay": _positive(int),
+    },
+    "performance": {
+        "step_size": _positive(float),
+        "max_catch_up_steps": _positive(int),
+        "activity_radius": _optional(_positive(float)),
+        "chunk_size": _optional(_positive(int)),
+        "merge_static": _parse_bool,
+    },
+}
+
+# (modified time, size, config) of each loaded configuration file, by absolute path
+_cache = {}
+
+
+def parse_config(text: str, filename: str = "<config>") -> Config:
+    """Parse the text of a configuration file.
+
+    Parameters:
+        text (str): The contents of the configuration file
+        filename (str): The name of the file, used in error messages
+
+    Returns:
+        (Config): The configuration, with defaults for anything not configured.
+
+    Unknown keys are ignored, with a warning.
+
+    Raises:
+        ConfigError: If a line isn't a section or setting, or a value can't be
+                     converted to the key's type.
+    """
+    sections = {}
+    levels = {}
+    section = schema = None
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("==") and line.endswith("==") and len(line) > 4:
+            name = line[2:-2].strip()
+            if name.lower() in SCHEMAS and name.lower() != "level":
+                section = sections.setdefault(name.lower(), {})
+                schema = SCHEMAS[name.lower()]
+            else:
+                section = levels.setdefault(name, {})
+                schema = SCHEMAS["level"]
+            continue
+
+        if section is None:
+            raise ConfigError(f"{filename}:{number}: setting outside of a section: {line!r}")
+
+        key, separator, value = line.partition(":")
+        if not separator:
+            raise ConfigError(f"{filename}:{number}: expected 'key : value', not {line!r}")
+        key, value = key.strip().lower(), value.strip()
+
+        if key not in schema:
+            warnings.warn(f"{filename}:{number}: ignoring unknown setting {key!r}")
+            continue
+        try:
+            section[key] = schema[key](value)
+        except ValueError as error:
+            raise ConfigError(f"{filename}:{number}: invalid {key}: {error}") from None
+
+    default = DEFAULT_CONFIG
+    return Config(
+        world=default.world._replace(**sections.get("world", {})),
+        player=default.player._replace(**sections.get("player", {})),
+        levels=_parse_levels(levels) if levels else dict(default.levels),
+        render=default.render._replace(**sections.get("render", {})),
+        performance=default.performance._replace(**sections.get("performance", {})),
+    )
+
+
+def _parse_levels(levels: Dict[str, dict]) -> Dict[str, LevelConfig]:
+    """Returns the LevelConfig of each configured level"""
+    return {level: LevelConfig(settings.get("tunnel"), settings.get("goal"))
+            for level, settings in levels.items()}
+
+
+def load_config(filename: str) -> Config:
+    """Load a configuration file, reusing the previous result if the file is unchanged.
+
+    Parameters:
+        filename (str): The name of the configuration file
+
+    Returns:
+        (Config): The configuration, which must not be modified as it is shared.
+
+    Raises:
+        ConfigError: If the file is invalid (see parse_config)
+        OSError: If the file can't be read
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+
+    cached = _cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(path, 'r') as file:
+        config = parse_config(file.read(), filename)
+
+    _cache[path] = (stat.st_mtime_ns, stat.st_size, config)
+    return config
@@ -19,4 +19,4 @@ __version__ = "1.0.1"
 __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
-__all__ = ["block", "item", "entity", "mob", "util", "view", "world"]
+__all__ = ["atlas", "block", "chunk", "item", "entity", "mob", "pool", "timing", "util", "view", "world"]
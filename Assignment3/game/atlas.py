@@ -0,0 +1,76 @@
+"""
+Sprite atlas which slices images out of sprite sheets for the view renderer
+"""
+
+__version__ = "1.0.1"
+__author__ = "Benjamin Martin"
+__copyright__ = "The University of Queensland, 2019"
+
+import tkinter as tk
+from typing import Dict, Tuple, Iterable
+
+
+class SpriteAtlas:
+    """A collection of sprites sliced out of sprite sheets.
+
+    Each sprite sheet is loaded once, the first time one of its sprites is
+    requested, and each sprite is cached once it has been sliced.
+
+    Frames are declared as a mapping of sprite keys to the
+    (sheet, x, y, width, height) area of the sprite within its sheet, where the
+    sheet is the name of an image in the atlas directory, without extension.
+    """
+
+    def __init__(self, frames: Dict[str, Tuple[str, int, int, int, int]],
+                 directory: str = "spritesheets"):
+        """Construct a new atlas.
+
+        Parameters:
+            frames (dict<str: tuple<str, int, int, int, int>>):
+                    The (sheet, x, y, width, height) area of each sprite key
+            directory (str): The directory containing the sprite sheets
+        """
+        self._frames = frames
+        self._directory = directory
+
+        self._sheets = {}
+        self._sprites = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._frames
+
+    def get_sheet(self, sheet: str) -> tk.PhotoImage:
+        """(tk.PhotoImage) Returns a sprite sheet, loading it if it has not been loaded yet"""
+        image = self._sheets.get(sheet)
+        if image is None:
+            image = self._sheets[sheet] = tk.PhotoImage(file=f"{self._directory}/{sheet}.png")
+        return image
+
+    def get(self, key: str) -> tk.PhotoImage:
+        """Return the sprite for a sprite key, slicing it out of its sheet if needed.
+
+        Raises:
+            KeyError: If there is no frame declared for the sprite key.
+        """
+        image = self._sprites.get(key)
+        if image is not None:
+            return image
+
+        sheet, x, y, width, height = self._frames[key]
+
+        image = tk.PhotoImage(width=width, height=height)
+        image.tk.call(image, "copy", self.get_sheet(sheet),
+                      "-from", x, y, x + width, y + height, "-to", 0, 0)
+
+        self._sprites[key] = image
+        return image
+
+    def preload(self, keys: Iterable[str] = None):
+        """Slice sprites ahead of time, so they are not loaded while drawing.
+
+        Parameters:
+            keys (iterable<str>): The sprite keys to load, defaults to every declared frame
+        """
+        for key in self._frames if keys is None else keys:
+            if key in self._frames:
+                self.get(key)
@@ -7,7 +7,7 @@ __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
 import random
-from typing import Tuple
+from typing import Tuple, List
 
 from game.entity import Entity
 from game.item import Coin
@@ -16,8 +16,8 @@ from game.util import get_collision_direction
 
 class Block(Entity):
     """One of the blocks in the sandbox game"""
-    # The unique identifier for this block
-    _id = None
+    # The unique identifier for this block, which subclasses give as a class attribute
+    __slots__ = ("_id",)
     _type = 2
     _cell_size = (1, 1)
 
@@ -28,9 +28,7 @@ class Block(Entity):
             block_id (str): The unique id of this block
         """
         super().__init__()
-
-        if block_id is not None:
-            self._id = block_id
+        self._set_id(block_id)
 
     def get_id(self) -> str:
         """(str) Returns the unique id of this block"""
@@ -52,11 +50,114 @@ class Block(Entity):
         return f"{self.__class__.__name__}({self._id})"
 
 
+class SharedBlock(Block):
+    """A plain block which is never removed from the world, so a single instance
+    can stand for every block with its id in a run of terrain (a flyweight).
+
+    Shared blocks must not be removed, as removing one would remove every cell
+    it stands for. get_shared returns a prototype for each id, to be given to
+    add_terrain, which replaces it with an instance of the run's own.
+    """
+    __slots__ = ()
+
+    # The prototype for each id, by id
+    _prototypes = {}
+
+    @classmethod
+    def get_shared(cls, block_id: str) -> "SharedBlock":
+        """(SharedBlock) Returns the prototype of the shared blocks with an id"""
+        block = cls._prototypes.get(block_id)
+        if block is None:
+            block = cls._prototypes[block_id] = cls(block_id)
+        return block
+
+
+class Terrain(Entity):
+    """A horizontal run of plain blocks that share a single physical shape.
+
+    Merging static blocks reduces the number of shapes the physics engine has
+    to consider. Each block in the run remains a separate Block, resolved from
+    its column within the run, except for shared blocks, of which the run keeps
+    one instance for each id (see SharedBlock).
+    """
+    __slots__ = ("_blocks", "_column", "_row")
+    _type = 2
+
+    def __init__(self, blocks: List[Block], column: int, row: int):
+        """Construct a run of blocks.
+
+        Parameters:
+            blocks (list<Block>): The blocks in the run, from left to right
+            column (int): The grid column of the leftmost block
+            row (int): The grid row of the run
+        """
+        super().__init__()
+
+        # each run has its own shared blocks, as they are given the run's shape
+        shared = {}
+        self._blocks = []
+        for block in blocks:
+            if isinstance(block, SharedBlock):
+                block_id = block.get_id()
+                block = shared.get(block_id)
+                if block is None:
+                    block = shared[block_id] = SharedBlock(block_id)
+            self._blocks.append(block)
+        self._column = column
+        self._row = row
+
+    def get_blocks(self) -> List[Block]:
+        """(list<Block>) Returns the blocks in this run, from left to right"""
+        return self._blocks
+
+    def get_column(self) -> int:
+        """(int) Returns the grid column of the leftmost block"""
+        return self._column
+
+    def get_row(self) -> int:
+        """(int) Returns the grid row of this run"""
+        return self._row
+
+    def get_block(self, column: int) -> Block:
+        """(Block) Returns the block in the given grid 'column', or None if it is outside this run"""
+        index = column - self._column
+        if 0 <= index < len(self._blocks):
+            return self._blocks[index]
+
+    def split(self, block: Block) -> List[Tuple[int, List[Block]]]:
+        """Remove a block from this run, leaving the runs of blocks on either side.
+
+        This run is emptied, as its shape no longer matches its blocks.
+
+        Parameters:
+            block (Block): The block to remove.
+
+        Returns:
+            (list<tuple<int, list<Block>>>): The (column, blocks) of each non-empty
+                                             run left after removing the block.
+        """
+        index = self._blocks.index(block)
+        left, right = self._blocks[:index], self._blocks[index + 1:]
+        self._blocks = []
+
+        runs = [(self._column, left), (self._column + index + 1, right)]
+        return [(column, blocks) for column, blocks in runs if blocks]
+
+    def get_position(self) -> Tuple[float, float]:
+        """(float, float) Returns the (x, y) position of the run's centre"""
+        x, y = self.get_shape().bb.center()
+        return x, y
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._column}, {self._row}, {len(self._blocks)})"
+
+
 class MysteryBlock(Block):
     """A mystery block drops items when the player hits its underside.
 
     The active state of a mystery block is whether it has dropped items or not.
     """
+    __slots__ = ("_drop", "_drop_range", "_active")
     _id = "mystery"
 
     def __init__(self, drop: str = None, drop_range: Tuple[int, int] = (1, 1)):
@@ -74,13 +175,17 @@ class MysteryBlock(Block):
         self._drop_range = drop_range
         self._active = True
 
-    def get_drops(self) -> Tuple[str, ...]:
+    def get_drops(self, rng: random.Random = random) -> Tuple[str, ...]:
         """Get the drops of the mystery block
 
+        Parameters:
+            rng (random.Random): The random number generator which decides
+                                 the number of drops, e.g. the world's.
+
         Returns:
             tuple<str, ...>: The item identifiers of the dropped items.
         """
-        return (self._drop,) * random.randint(*self._drop_range)
+        return (self._drop,) * rng.randint(*self._drop_range)
 
     def _drop_items(self, world, drops: Tuple[str]):
         """Drop each of the dropped items into the world.
@@ -93,21 +198,21 @@ class MysteryBlock(Block):
         for drop in drops:
             if drop is not None:
                 # world.add_item(create_item(drop), TODO: Make this non-hardcoded
-                world.add_item(Coin(), x + random.randint(-10, 10), y - 25)
+                world.add_item(world.acquire(Coin), x + world.get_random().randint(-10, 10), y - 25)
 
     def on_hit(self, event, data):
         """Callback collision with player event handler."""
         world, player = data
         # Ensure the bottom of the block is being hit
-        if get_collision_direction(player, self) != "B":
+        if get_collision_direction(player, self, event) != "B":
             return
 
         if self._active:
             self._active = False
 
             # Drop items into the game world
-            drops = self.get_drops()
-            self._drop_items(data[0], drops)
+            drops = self.get_drops(world.get_random())
+            self._drop_items(world, drops)
 
     def is_active(self) -> bool:
         """(bool): Returns true if the block has not yet dropped items."""
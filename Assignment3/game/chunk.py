@@ -0,0 +1,197 @@
+"""
+A world which only simulates the part of a level that is near the player
+"""
+
+__version__ = "1.0.1"
+__author__ = "Benjamin Martin"
+__copyright__ = "The University of Queensland, 2019"
+
+import math
+from typing import Callable, Dict, List, Tuple
+
+from game.block import Terrain
+from game.entity import Entity
+from game.world import World
+
+
+class ChunkedWorld(World):
+    """Game world which is divided into chunks of columns, where only the chunks
+    near the player are materialised in the physical space.
+
+    Entities of a chunk are built the first time the chunk is loaded. When a chunk
+    is evicted, the shapes & bodies of its things are removed from the space but
+    the things themselves are kept, so they come back in the same state when the
+    chunk is loaded again. Things removed from the world, such as destroyed bricks
+    or collected coins, are forgotten and never come back.
+
+    Things belong to the chunk containing the centre of their shape, so mobs
+    that wander between chunks are evicted along with the chunk they are in.
+    """
+
+    def __init__(self, grid_size, cell_expanse, chunk_size: int = 32, load_distance: int = 2, **kwargs):
+        """Creates a new chunked world
+
+        Parameters:
+            grid_size (tuple<int, int>): The (column, row) size of the grid
+            cell_expanse (int): The size (i.e. width/height) of each grid cell
+            chunk_size (int): The number of columns in each chunk
+            load_distance (int): The number of chunks either side of the player's
+                                 chunk to load. Chunks are evicted once they are
+                                 more than one chunk further away than this.
+
+            - See World for other parameters
+        """
+        super().__init__(grid_size, cell_expanse, **kwargs)
+
+        self._chunk_size = chunk_size
+        self._load_distance = load_distance
+
+        # the loader builds a list of entities into this world
+        self._loader = None
+        # the entities of each chunk which has never been loaded
+        self._pending = {}
+        # the things of each evicted chunk
+        self._stored = {}
+        self._loaded = set()
+        # things currently in the space, excluding the player & boundary walls
+        self._resident = set()
+        self._centre_chunk = None
+
+    def set_chunk_loader(self, chunks: Dict[int, List[Tuple]], loader: Callable):
+        """Sets the entities of each chunk, to be built when each chunk is first loaded
+
+        Parameters:
+            chunks (dict<int: list<tuple>>): The entities of each chunk, by chunk index
+            loader (Callable<World, list<tuple>> -> None): Builds a list of entities into a world
+        """
+        self._pending = chunks
+        self._loader = loader
+
+    def get_chunk_size(self) -> int:
+        """(int) Returns the number of columns in each chunk"""
+        return self._chunk_size
+
+    def get_chunk(self, x: float) -> int:
+        """(int) Returns the index of the chunk containing the x-coordinate 'x'"""
+        return int(x // (self._chunk_size * self._cell_expanse))
+
+    def get_loaded_chunks(self) -> List[int]:
+        """(list<int>) Returns the indices of the chunks currently in the space, in order"""
+        return sorted(self._loaded)
+
+    def update_chunks(self, x: float):
+        """Loads the chunks near the x-coordinate 'x', & evicts those that are far away
+
+        Does nothing unless 'x' is in a different chunk than the last time this was called.
+        """
+        centre = self.get_chunk(x)
+        if centre == self._centre_chunk:
+            return
+        self._centre_chunk = centre
+
+        for chunk in range(centre - self._load_distance, centre + self._load_distance + 1):
+            if chunk not in self._loaded:
+                self._load_chunk(chunk)
+
+        keep_distance = self._load_distance + 1
+        self._loaded = {chunk for chunk in self._loaded if abs(chunk - centre) <= keep_distance}
+
+        for thing in list(self._resident):
+            chunk = self._get_thing_chunk(thing)
+            if chunk is not None and chunk not in self._loaded:
+                self._evict(thing, chunk)
+
+    def _get_thing_chunk(self, thing: Entity) -> int:
+        """(int) Returns the index of the chunk a thing currently belongs to, or None
+        if the thing has no valid position (e.g. massless bodies after a step)"""
+        # shapes added during a step have no bounding box until the step ends
+        x = thing.get_shape().cache_bb().center().x
+        if math.isfinite(x):
+            return self.get_chunk(x)
+
+    def _load_chunk(self, chunk: int):
+        """Adds the things of a chunk to the space, building them if the chunk has not been loaded before"""
+        self._loaded.add(chunk)
+
+        entities = self._pending.pop(chunk, None)
+        if entities:
+            self._loader(self, entities)
+
+        for thing in self._stored.pop(chunk, ()):
+            self._restore(thing)
+
+    def _evict(self, thing: Entity, chunk: int):
+        """Removes a thing from the space, storing it in 'chunk' until the chunk is loaded again"""
+        shape = thing.get_shape()
+        if shape.body is self._space.static_body:
+            self._space.remove(shape)
+            self._index_block(thing, None)
+        else:
+            self._space.remove(shape.body, shape)
+            self._sleeping.pop(shape.body, None)
+
+        self._resident.discard(thing)
+        self._unregister_steppable(thing)
+        self._stored.setdefault(chunk, []).append(thing)
+
+    def _restore(self, thing: Entity):
+        """Returns a previously evicted thing to the space"""
+        shape = thing.get_shape()
+        if shape.body is self._space.static_body:
+            self._space.add(shape)
+            self._index_block(thing, thing)
+        else:
+            self._space.add(shape.body, shape)
+            self._track_activity(shape.body)
+
+        self._resident.add(thing)
+        self._register_steppable(thing)
+
+    def _index_block(self, thing: Entity, block):
+        """Sets the grid cells covered by a static thing to 'block'; None clears them"""
+        if isinstance(thing, Terrain):
+            column, row = thing.get_column(), thing.get_row()
+            if block is None:
+                self._set_grid_cells(None, column, row, len(thing.get_blocks()), 1)
+            else:
+                for i, terrain_block in enumerate(thing.get_blocks()):
+                    self._set_grid_cells(terrain_block, column + i, row, 1, 1)
+        else:
+            self._set_grid_cells(block, *self._get_shape_cells(thing.get_shape()))
+
+    def step(self, game_data):
+        """Loads & evicts chunks around the player, then steps the world
+
+        See World.step
+        """
+        _, player = game_data
+        self.update_chunks(player.get_position()[0])
+        super().step(game_data)
+
+    def add_thing(self, thing: Entity, *args, **kwargs):
+        super().add_thing(thing, *args, **kwargs)
+        self._resident.add(thing)
+
+    def add_block_to_grid(self, entity, *args, **kwargs):
+        super().add_block_to_grid(entity, *args, **kwargs)
+        self._resident.add(entity)
+
+    def _remove_thing(self, thing: Entity):
+        super()._remove_thing(thing)
+        self._resident.discard(thing)
+
+    def snapshot(self):
+        """Chunked worlds cannot be restored, as most of their things are only built
+        once their chunk is first loaded, so returns None
+
+        See World.snapshot
+        """
+        return None
+
+    def add_player(self, player, x: float, y: float, *args, **kwargs):
+        """Adds a player to game world at the position ('x', 'y'), loading the chunks around them
+
+        See World.add_player
+        """
+        super().add_player(player, x, y, *args, **kwargs)
+        self.update_chunks(x)
@@ -15,13 +15,32 @@ class Entity:
     """The highest-level abstract representation of an entity in the game world
 
     Should not be instantiated directly.
+
+    Entities declare their attributes in __slots__, as levels can contain a great
+    many of them. Subclasses which don't are given an instance __dict__ as usual.
     """
+    __slots__ = ("_shape",)
 
     _type = 0
+    # The unique identifier for this kind of entity, if any
+    _id = None
 
     def __init__(self):
         self._shape: pymunk.Shape = None
 
+    def get_id(self) -> str:
+        """(str) Returns the unique id of this entity, or None if it has none"""
+        return self._id
+
+    def _set_id(self, entity_id: str):
+        """Sets the id of this entity, unless its class gives the id of all of its instances
+
+        A class attribute '_id' hides the '_id' slot of a base class, so the ids of
+        such instances can't be set, and are always the id of their class.
+        """
+        if not isinstance(type(self)._id, str):
+            self._id = entity_id
+
     @classmethod
     def get_type(cls) -> int:
         """Get the unique group type of the entity, used for querying for groups
@@ -84,6 +103,7 @@ class DynamicEntity(Entity):
 
     Should not be instantiated directly.
     """
+    __slots__ = ("_health", "_max_health", "_jumping")
 
     def __init__(self, max_health=20):
         super().__init__()
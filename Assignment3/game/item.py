@@ -17,6 +17,7 @@ class DroppedItem(DynamicEntity):
     Dropped items must implement the collect(Player) method to handle players
     picking up the items.
     """
+    __slots__ = ()
     _id = None
     _type = 4
 
@@ -39,6 +40,7 @@ class DroppedItem(DynamicEntity):
 class Coin(DroppedItem):
     """A dropped coin item that can be picked up to increment the players score.
     """
+    __slots__ = ("_value",)
     _id = "coin"
 
     def __init__(self, value: int = 1):
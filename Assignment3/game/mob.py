@@ -6,9 +6,15 @@ __version__ = "1.0.1"
 __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
-import random
+from typing import List
+
 import pymunk
-import time
+
+try:
+    import numpy as np
+except ImportError:
+    # batches are stepped one mob at a time instead
+    np = None
 
 from game.entity import DynamicEntity
 from game.util import get_collision_direction
@@ -17,6 +23,10 @@ from game.item import Coin
 MOB_DEFAULT_TEMPO = 30
 MOB_DEFAULT_WEIGHT = 100
 
+# The fewest mobs in a batch for which computing with numpy arrays is worth
+# the cost of gathering the mobs' state into them
+NUMPY_BATCH_SIZE = 16
+
 
 class Mob(DynamicEntity):
     """An abstract representation of a creature in the sandbox game
@@ -24,6 +34,8 @@ class Mob(DynamicEntity):
     Can be friend, foe, or neither
 
     Should not be instantiated directly"""
+    # The unique id for this type of mob, which subclasses give as a class attribute
+    __slots__ = ("_id", "_size", "_weight", "_tempo", "_steps")
     _type = 5
 
     def __init__(self, mob_id, size, weight=MOB_DEFAULT_TEMPO,
@@ -44,7 +56,7 @@ class Mob(DynamicEntity):
         """
         super().__init__(max_health=max_health)
 
-        self._id = mob_id
+        self._set_id(mob_id)
         self._size = size
         self._weight = weight
         self._tempo = tempo
@@ -89,6 +101,35 @@ class Mob(DynamicEntity):
         vx = self.get_tempo()
         self.set_velocity((vx, self.get_velocity()[1]))
 
+    @classmethod
+    def step_batch(cls, mobs: List["Mob"], time_delta: float, game_data):
+        """Advance a batch of mobs of this class by one time step
+
+        Has the same effect as calling step on each mob in turn. The world steps
+        the mobs of a class in a single batch when the class defines step_batch
+        alongside (or below) step, so subclasses overriding step must override
+        step_batch too, or they are stepped one at a time.
+
+        Parameters:
+            mobs (list<Mob>): The mobs to step, all of exactly this class
+            time_delta (float): The amount of time that has passed since the last step, in seconds
+            game_data (tuple<World, Player>): Arbitrary data supplied by the app class
+        """
+        for mob in mobs:
+            mob._steps += 1
+        cls.walk_batch(mobs)
+
+    @staticmethod
+    def walk_batch(mobs: List["Mob"]):
+        """Sets the horizontal velocity of each mob to its tempo, keeping its vertical velocity
+
+        Walking needs no arithmetic, so there is nothing to vectorise; the cost is
+        all in reading & writing each body's velocity.
+        """
+        for mob in mobs:
+            body = mob._shape.body
+            body.velocity = (mob._tempo, body.velocity.y)
+
     def __repr__(self):
         return f"{self.__class__.__name__}({self._id!r})"
 
@@ -98,6 +139,7 @@ class Fireball(Mob):
 
     When colliding with the player it will damage the player and explode.
     """
+    __slots__ = ()
     _id = "fireball"
 
     def __init__(self):
@@ -113,6 +155,7 @@ class CloudMob(Mob):
     """Flying cloud which seeks out the player and when above the player
     will fire a fireball at them.
     """
+    __slots__ = ("_last_drop", "_fire_range")
     _id = "cloud"
     MAX_DISTANCE = 20
 
@@ -124,7 +167,8 @@ class CloudMob(Mob):
                               the cloud will start firing.
         """
         super().__init__(self._id, size=(16, 24), weight=0, tempo=80)
-        self._last_drop = time.time()
+        # the world time of the last drop, set when the cloud is first stepped
+        self._last_drop = None
         self._fire_range = fire_range
 
     def step(self, time_delta, game_data):
@@ -135,22 +179,14 @@ class CloudMob(Mob):
         mob_x, mob_y = self.get_position()
         player_x, player_y = player.get_position()
 
+        now = world.get_time()
+        if self._last_drop is None:
+            self._last_drop = now
+
         # only fire within range
         if abs(player_x - mob_x) < self._fire_range:
             vx = 0
-            # only fire after a delay
-            if time.time() - self._last_drop >= 2:
-                x, y = self.get_position()
-
-                rand_val = random.randint(1, 10)
-                # occasionally drop a coin instead
-                if rand_val == 1:
-                    drop = Coin()
-                    world.add_item(drop, x, y + 22)
-                else:
-                    drop = Fireball()
-                    world.add_mob(drop, x, y + 22)
-                self._last_drop = time.time()
+            self._fire(world, now)
 
         # move towards the player
         elif player_x < mob_x:
@@ -159,3 +195,65 @@ class CloudMob(Mob):
             vx = self.get_tempo()
 
         self.set_velocity((vx, 0))
+
+    @classmethod
+    def step_batch(cls, clouds: List["CloudMob"], time_delta: float, game_data):
+        """Move a batch of clouds towards the player, firing from those within range
+
+        The distances, ranges & velocities of all the clouds are computed at once
+        with numpy, if it is installed & the batch is large enough.
+
+        See Mob.step_batch
+        """
+        if np is None or len(clouds) < NUMPY_BATCH_SIZE:
+            for cloud in clouds:
+                cloud.step(time_delta, game_data)
+            return
+
+        world, player = game_data
+        player_x = player.get_position()[0]
+        now = world.get_time()
+        for cloud in clouds:
+            if cloud._last_drop is None:
+                cloud._last_drop = now
+
+        bodies = [cloud._shape.body for cloud in clouds]
+        count = len(clouds)
+        xs = np.fromiter((body.position.x for body in bodies), float, count)
+        tempos = np.fromiter((cloud._tempo for cloud in clouds), float, count)
+        ranges = np.fromiter((cloud._fire_range for cloud in clouds), float, count)
+
+        offsets = player_x - xs
+        in_range = np.abs(offsets) < ranges
+        # stop within range, otherwise move towards the player
+        velocities = np.where(in_range, 0., np.sign(offsets) * tempos)
+
+        # clouds fire in order, so they draw from the world's random numbers as if stepped one at a time
+        for index in np.flatnonzero(in_range).tolist():
+            clouds[index]._fire(world, now)
+
+        for body, vx in zip(bodies, velocities.tolist()):
+            body.velocity = (vx, 0)
+
+    def _fire(self, world, now: float):
+        """Drop a fireball, or occasionally a coin, if it has been long enough since the last drop
+
+        Parameters:
+            world (World): The world to drop into
+            now (float): The current time of the world
+        """
+        # only fire after a delay
+        if now - self._last_drop < 2:
+            return
+
+        x, y = self.get_position()
+
+        rand_val = world.get_random().randint(1, 10)
+        # occasionally drop a coin instead
+        if rand_val == 1:
+            drop = world.acquire(Coin)
+            world.add_item(drop, x, y + 22)
+        else:
+            drop = world.acquire(Fireball)
+            world.add_mob(drop, x, y + 22)
+        self._last_drop = now
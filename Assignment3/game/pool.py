@@ -0,0 +1,74 @@
+"""
+Pools which recycle short-lived entities, along with their physical bodies & shapes
+"""
+
+__version__ = "1.0.1"
+__author__ = "Benjamin Martin"
+__copyright__ = "The University of Queensland, 2019"
+
+from typing import Callable
+
+from game.entity import Entity
+
+
+class EntityPool:
+    """A pool of released entities of a single class, which are reset & reused
+    rather than constructed again.
+
+    A released entity keeps its shape (and the shape's body), so the world can
+    reuse them when the entity is added again. Entities are reset by calling
+    their constructor again, so pooled classes must be constructible without
+    arguments & must always have the same size.
+    """
+
+    def __init__(self, entity_class: Callable[[], Entity], capacity: int = 64):
+        """Construct a new, empty pool.
+
+        Parameters:
+            entity_class (Callable<> -> Entity): The class of the pooled entities
+            capacity (int): The maximum number of released entities to keep
+        """
+        self._entity_class = entity_class
+        self._capacity = capacity
+
+        self._free = []
+        self._hits = 0
+        self._misses = 0
+
+    def acquire(self) -> Entity:
+        """(Entity) Returns a reset entity from the pool, or a new entity if the pool is empty"""
+        if not self._free:
+            self._misses += 1
+            return self._entity_class()
+
+        self._hits += 1
+        entity = self._free.pop()
+
+        shape = entity.get_shape()
+        entity.__init__()
+        entity.set_shape(shape)
+        return entity
+
+    def release(self, entity: Entity):
+        """Return an entity which has been removed from the world to the pool
+
+        The entity is dropped if the pool is full or it was already released.
+        """
+        if len(self._free) < self._capacity and entity not in self._free:
+            self._free.append(entity)
+
+    def get_hits(self) -> int:
+        """(int) Returns the number of entities acquired by recycling a released entity"""
+        return self._hits
+
+    def get_misses(self) -> int:
+        """(int) Returns the number of entities acquired by constructing a new entity"""
+        return self._misses
+
+    def clear(self):
+        """Drop all released entities & reset the statistics."""
+        self._free.clear()
+        self._hits = self._misses = 0
+
+    def __len__(self):
+        return len(self._free)
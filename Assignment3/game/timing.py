@@ -0,0 +1,174 @@
+"""
+Lightweight timing utilities used to measure the cost of game loop phases
+"""
+
+__version__ = "1.0.1"
+__author__ = "Benjamin Martin"
+__copyright__ = "The University of Queensland, 2019"
+
+import time
+from collections import deque
+
+
+class FrameTimer:
+    """Keeps a rolling record of how long the most recent frames took.
+
+    Durations are measured in seconds.
+    """
+
+    def __init__(self, window: int = 60):
+        """Construct a new frame timer.
+
+        Parameters:
+            window (int): The number of recent frames to average over.
+        """
+        self._durations = deque(maxlen=window)
+        self._start = None
+
+    def start(self):
+        """Mark the start of a frame."""
+        self._start = time.perf_counter()
+
+    def stop(self) -> float:
+        """Mark the end of the frame started by the last call to start.
+
+        Returns:
+            (float): The duration of the frame, in seconds.
+        """
+        duration = time.perf_counter() - self._start
+        self.record(duration)
+        return duration
+
+    def record(self, duration: float):
+        """Record the duration of a single frame, in seconds."""
+        self._durations.append(duration)
+
+    def get_last(self) -> float:
+        """(float) Returns the duration of the most recent frame, or 0 if none were recorded"""
+        return self._durations[-1] if self._durations else 0.
+
+    def get_average(self) -> float:
+        """(float) Returns the average duration of the recorded frames, or 0 if none were recorded"""
+        if not self._durations:
+            return 0.
+        return sum(self._durations) / len(self._durations)
+
+    def get_rate(self) -> float:
+        """(float) Returns the number of frames per second at the average frame duration"""
+        average = self.get_average()
+        return 1 / average if average else 0.
+
+    def clear(self):
+        """Forget all recorded frames."""
+        self._durations.clear()
+
+    def __len__(self):
+        return len(self._durations)
+
+
+class FixedTimestep:
+    """Accumulates real elapsed time and converts it into a whole number of
+    fixed-size simulation steps.
+
+    Running the simulation in fixed steps keeps its speed independent of how
+    often, and how promptly, the game loop is serviced.
+    """
+
+    def __init__(self, step_size: float, max_steps: int = 5):
+        """Construct a new fixed timestep.
+
+        Parameters:
+            step_size (float): The duration of a single simulation step, in seconds.
+            max_steps (int): The maximum number of steps to run per frame. Any
+                             time beyond this is dropped, so that the simulation
+                             slows down rather than spiralling when it cannot
+                             keep up with real time.
+        """
+        self._step_size = step_size
+        self._max_steps = max_steps
+        self._accumulator = 0.
+        self._last_time = None
+        self._dropped = 0.
+
+    def reset(self):
+        """Forget any accumulated time, e.g. after the game was paused."""
+        self._accumulator = 0.
+        self._last_time = None
+
+    def advance(self) -> int:
+        """Accumulate the time elapsed since the last call.
+
+        Returns:
+            (int): The number of simulation steps that should be run.
+        """
+        now = time.perf_counter()
+        if self._last_time is None:
+            self._last_time = now
+        self._accumulator += now - self._last_time
+        self._last_time = now
+
+        steps = int(self._accumulator // self._step_size)
+        if steps > self._max_steps:
+            self._dropped += self._accumulator - self._max_steps * self._step_size
+            self._accumulator = 0.
+            return self._max_steps
+
+        self._accumulator -= steps * self._step_size
+        return steps
+
+    def get_alpha(self) -> float:
+        """(float) Returns how far between the last & next step real time is, from 0 to 1
+
+        Used to interpolate the positions of things when rendering.
+        """
+        return min(self._accumulator / self._step_size, 1.)
+
+    def get_step_size(self) -> float:
+        """(float) Returns the duration of a single simulation step, in seconds"""
+        return self._step_size
+
+    def get_dropped_time(self) -> float:
+        """(float) Returns the total real time, in seconds, that was not simulated
+        because the simulation could not keep up"""
+        return self._dropped
+
+
+class PhaseTimer:
+    """Keeps a rolling record of how long each named phase of the most recent
+    frames took, e.g. the time spent in physics & in rendering.
+
+    Durations are measured in seconds.
+    """
+
+    def __init__(self, window: int = 60):
+        """Construct a new phase timer.
+
+        Parameters:
+            window (int): The number of recent frames to average each phase over.
+        """
+        self._window = window
+        self._timers = {}
+
+    def record(self, phase: str, duration: float):
+        """Record the duration of a phase in a single frame, in seconds."""
+        timer = self._timers.get(phase)
+        if timer is None:
+            timer = self._timers[phase] = FrameTimer(self._window)
+        timer.record(duration)
+
+    def get_timer(self, phase: str) -> FrameTimer:
+        """(FrameTimer) Returns the timer of a phase, or None if it was never recorded"""
+        return self._timers.get(phase)
+
+    def get_average(self, phase: str) -> float:
+        """(float) Returns the average duration of a phase, or 0 if it was never recorded"""
+        timer = self._timers.get(phase)
+        return timer.get_average() if timer is not None else 0.
+
+    def get_averages(self) -> dict:
+        """(dict<str: float>) Returns the average duration of each recorded phase, by name"""
+        return {phase: timer.get_average() for phase, timer in self._timers.items()}
+
+    def clear(self):
+        """Forget all recorded phases."""
+        self._timers.clear()
@@ -6,6 +6,8 @@ __version__ = "1.0.1"
 __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
+import pymunk
+
 from game.entity import DynamicEntity, Entity
 
 ABOVE = "A"
@@ -14,12 +16,16 @@ RIGHT = "R"
 LEFT = "L"
 
 
-def get_collision_direction(entity: DynamicEntity, other: Entity):
+def get_collision_direction(entity: DynamicEntity, other: Entity, arbiter: pymunk.Arbiter = None):
     """Get the direction where from which a collision event occurred.
 
+    If the arbiter of the collision is given, the direction is derived from its
+    contact normal, otherwise it is found by probing the edges of the entity's shape.
+
     Parameters:
         entity (DynamicEntity): Colliding entity.
         other (Entity): The entity with which the colliding entity collided.
+        arbiter (pymunk.Arbiter): The arbiter of the collision between the entities.
 
     Returns:
         (str): The direction the collision occurred in.
@@ -29,6 +35,61 @@ def get_collision_direction(entity: DynamicEntity, other: Entity):
         "R" for Right
         "L" for Left
     """
+    if arbiter is not None:
+        direction = get_normal_direction(entity, other, arbiter)
+        if direction is not None:
+            return direction
+
+    return get_geometric_direction(entity, other)
+
+
+def get_normal_direction(entity: Entity, other: Entity, arbiter: pymunk.Arbiter):
+    """Get the direction of a collision from the contact normal of its arbiter.
+
+    The normal points from the arbiter's first shape towards its second shape.
+
+    Parameters:
+        entity (Entity): Colliding entity.
+        other (Entity): The entity with which the colliding entity collided.
+        arbiter (pymunk.Arbiter): The arbiter of the collision between the entities.
+
+    Returns:
+        (str): The direction the collision occurred in (see get_collision_direction),
+               or None if the arbiter is not between the entities or has no normal.
+    """
+    shape_a, shape_b = arbiter.shapes
+    shape = entity.get_shape()
+    if shape_a is shape and shape_b is other.get_shape():
+        nx, ny = arbiter.normal
+    elif shape_b is shape and shape_a is other.get_shape():
+        nx, ny = arbiter.normal
+        nx, ny = -nx, -ny
+    else:
+        return None
+
+    # the normal points from the entity towards the other entity, where y increases downwards
+    if abs(ny) >= abs(nx):
+        if ny > 0:
+            return ABOVE
+        if ny < 0:
+            return BELOW
+        # there is no normal
+        return None
+    return LEFT if nx > 0 else RIGHT
+
+
+def get_geometric_direction(entity: DynamicEntity, other: Entity):
+    """Get the direction of a collision by probing which edges of the entity's
+    shape lie within the other entity's shape.
+
+    Parameters:
+        entity (DynamicEntity): Colliding entity.
+        other (Entity): The entity with which the colliding entity collided.
+
+    Returns:
+        (str): The direction the collision occurred in (see get_collision_direction),
+               or None if the shapes do not overlap.
+    """
     bb = entity.get_shape().bb
     cx, cy = bb.center()
     lx = cx - (cx - bb.left)/2
@@ -6,16 +6,24 @@ __version__ = "1.0.1"
 __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
+import math
 import tkinter as tk
-from typing import Iterable, Tuple, List
+from itertools import chain
+from typing import Iterable, Tuple, List, Callable
 from functools import singledispatch, update_wrapper
 
 import pymunk
 
+from game.atlas import SpriteAtlas
 from game.entity import Entity
-from game.block import Block
+from game.block import Block, Terrain
 from game.item import DroppedItem
 from game.mob import Mob
+from game.timing import FrameTimer
+
+# Tag of the canvas elements of things in the world, which move as the view scrolls,
+# unlike elements drawn over the view (e.g. an overlay)
+WORLD_TAG = "world"
 
 
 # Warning: You do not need to understand how this function works
@@ -26,13 +34,29 @@ def singledispatchmethod(func):
     This is useful for methods where the first parameter is always self.
 
     Note: this is a built-in feature of Python 3.8
+
+    The implementation for each class is resolved once and stored in a table,
+    which is cleared whenever a new implementation is registered.
     """
     dispatcher = singledispatch(func)
+    table = {}
 
     def wrapper(*args, **kw):
-        return dispatcher.dispatch(args[1].__class__)(*args, **kw)
+        cls = args[1].__class__
+        try:
+            method = table[cls]
+        except KeyError:
+            method = table[cls] = dispatcher.dispatch(cls)
+        return method(*args, **kw)
 
-    wrapper.register = dispatcher.register
+    def register(cls, method=None):
+        if method is None:
+            return lambda method: register(cls, method)
+
+        table.clear()
+        return dispatcher.register(cls, method)
+
+    wrapper.register = register
     update_wrapper(wrapper, func)
     return wrapper
 
@@ -54,9 +78,13 @@ class ViewRenderer:
     To implement a new view method, add a decorator to the draw method of the form:
         @ViewRenderer.draw.register(Type)
     Where Type would be the class of the entity you wish to render.
+
+    Entities whose appearance depends on their state should also register a
+    get_state method, so that retained views know when to redraw them:
+        @ViewRenderer.get_state.register(Type)
     """
 
-    def __init__(self, block_images, item_images, mob_images):
+    def __init__(self, block_images, item_images, mob_images, atlas: SpriteAtlas = None):
         """
         Construct a new ViewRouter with appropriate entity id to image file mappings.
 
@@ -64,23 +92,35 @@ class ViewRenderer:
              block_images (dict<str: str>): A mapping of block ids to their respective images
              item_images (dict<str: str>): A mapping of item ids to their respective images
              mob_images (dict<str: str>): A mapping of mob ids to their respective images
+             atlas (SpriteAtlas): Sprite sheets to take images from, in preference to
+                                  loading them from individual image files
         """
         super().__init__()
 
         self._images = {}
+        self._atlas = atlas
 
         self._block_images = block_images
         self._item_images = item_images
         self._mob_images = mob_images
 
+        # loaded images for each entity id, per image mapping
+        self._sprites = {id(images): {} for images in (block_images, item_images, mob_images)}
+
     def load_image(self, file: str) -> tk.PhotoImage:
         """Load an image in the file location of images/{file}.png or images/{file}.gif
 
+        If the renderer has an atlas containing the image, it is taken from the atlas instead.
+
         Caches the image within the class so it can be drawn within the canvas.
         """
         if file in self._images:
             return self._images[file]
 
+        if self._atlas is not None and file in self._atlas:
+            image = self._images[file] = self._atlas.get(file)
+            return image
+
         try:
             image = tk.PhotoImage(file="images/" + file + ".png")
         except tk.TclError:
@@ -89,6 +129,34 @@ class ViewRenderer:
 
         return image
 
+    def preload(self, extra_images: Iterable[str] = ()):
+        """Load every image referenced by the renderer's image mappings ahead of time,
+        so that entities appearing for the first time do not stall drawing.
+
+        Parameters:
+            extra_images (iterable<str>): Other images to load, e.g. those drawn for
+                                          entity states
+        """
+        files = chain(self._block_images.values(), self._item_images.values(),
+                      self._mob_images.values(), extra_images)
+        for file in files:
+            self.load_image(file)
+
+    def get_sprite(self, images: dict, entity_id: str) -> tk.PhotoImage:
+        """Return the image for an entity id from one of the renderer's image mappings.
+
+        The image for each entity id is cached, so later lookups are a single dictionary access.
+
+        Parameters:
+            images (dict<str: str>): The block, item or mob image mapping of this renderer
+            entity_id (str): The id of the entity
+        """
+        sprites = self._sprites[id(images)]
+        image = sprites.get(entity_id)
+        if image is None:
+            image = sprites[entity_id] = self.load_image(images[entity_id])
+        return image
+
     @singledispatchmethod
     def draw(self, instance: Entity, shape: pymunk.Shape,
              view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
@@ -109,32 +177,75 @@ class ViewRenderer:
                                       shape.bb.right + offset[0], shape.bb.bottom,
                                       fill='black', tag='undefined')]
 
+    @singledispatchmethod
+    def get_state(self, instance: Entity, shape: pymunk.Shape):
+        """Method to describe the visual state of the given entity.
+
+        Retained views only redraw an entity when the value returned by this
+        method changes; otherwise the entity's canvas elements are moved.
+        Entities that always look the same do not need to register a method.
+
+        Parameters:
+            instance (Entity): The entity being drawn
+            shape (pymunk.Shape): The entities shape in the world
+
+        Returns:
+            (hashable): A value that is equal between two calls iff the entity
+                        would be drawn with the same canvas elements.
+        """
+        return None
+
     @draw.register(Block)
     def _draw_block(self, instance: Block, shape: pymunk.Shape,
                     view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
-        image = self.load_image(self._block_images[instance.get_id()])
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="block")]
+        x, y = shape.bb.center()
+        image = self.get_sprite(self._block_images, instance.get_id())
+        return [view.create_image(x + offset[0], y, image=image, tags="block")]
+
+    @draw.register(Terrain)
+    def _draw_terrain(self, instance: Terrain, shape: pymunk.Shape,
+                      view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
+        blocks = instance.get_blocks()
+        cell_width = (shape.bb.right - shape.bb.left) / len(blocks)
+        left = shape.bb.left + offset[0]
+        y = shape.bb.center().y
+
+        # retained elements are moved as the view scrolls, so must be drawn in full,
+        # but otherwise only the blocks within the visible area need images
+        first, last = 0, len(blocks)
+        if isinstance(view, GameView) and not view.is_retained():
+            (view_left, _), (view_right, _) = view.get_viewport()
+            first = max(first, math.floor((view_left - shape.bb.left) / cell_width))
+            last = min(last, math.ceil((view_right - shape.bb.left) / cell_width))
+
+        items = []
+        for i in range(first, last):
+            block = blocks[i]
+            image = self.get_sprite(self._block_images, block.get_id())
+            items.append(view.create_image(left + (i + .5) * cell_width, y,
+                                           image=image, tags="block"))
+        return items
 
     @draw.register(DroppedItem)
     def _draw_physical_item(self, instance: DroppedItem, shape: pymunk.Shape,
                             view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
-        image = self.load_image(self._item_images[instance.get_id()])
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="item")]
+        x, y = shape.bb.center()
+        image = self.get_sprite(self._item_images, instance.get_id())
+        return [view.create_image(x + offset[0], y, image=image, tags="item")]
 
     @draw.register(Mob)
     def _draw_mob(self, instance: Mob, shape: pymunk.Shape,
                         view: tk.Canvas, offset: Tuple[int, int]) -> List[int]:
-        image = self.load_image(self._mob_images[instance.get_id()])
-        return [view.create_image(shape.bb.center().x + offset[0], shape.bb.center().y,
-                                  image=image, tags="mob")]
+        x, y = shape.bb.center()
+        image = self.get_sprite(self._mob_images, instance.get_id())
+        return [view.create_image(x + offset[0], y, image=image, tags="mob")]
 
 
 class GameView(tk.Canvas):
     """A view class for the sandbox game, with convenience methods to draw various parts of the UI"""
 
-    def __init__(self, master, size, physical_view_router: ViewRenderer):
+    def __init__(self, master, size, physical_view_router: ViewRenderer,
+                 retained: bool = False):
         """Constructor
 
         Parameters:
@@ -144,12 +255,25 @@ class GameView(tk.Canvas):
                     View router that facilitates drawing of physical items through
                     calling draw method with:
                         (entity, entities shape, self (canvas), offset)
+            retained (bool): If True, canvas elements are kept between calls to
+                             draw_entities and only updated when entities move,
+                             change state, or leave the world. Otherwise the caller
+                             is expected to clear the canvas before every draw.
         """
         width, height = size
         super().__init__(master, width=width, height=height, bg="#6080ff")
 
         self._world_view_router = physical_view_router
         self._offset = (0, 0)
+        self._size = size
+
+        self._retained = retained
+        # mapping of entities to their (canvas items, position, visual state)
+        self._drawn = {}
+        # the offset at which the retained canvas items are currently drawn
+        self._drawn_offset = self._offset
+
+        self._frame_timer = FrameTimer()
 
     def shift(self, offset: Tuple[int, int]):
         """Shift the view offset by the given offset.
@@ -168,13 +292,106 @@ class GameView(tk.Canvas):
         """(tuple<int, int>): Return the X and Y pixel offsets of the view."""
         return self._offset
 
-    def draw_entities(self, things: Iterable[Entity]):
+    def get_viewport(self, margin: int = 0) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Return the area of the world that is currently visible in the view.
+
+        Parameters:
+            margin (int): Number of pixels to extend the area by on each side.
+
+        Returns:
+            (tuple<tuple<int, int>, tuple<int, int>>): The (x, y) world positions of the
+                                                       top-left & bottom-right corners.
+        """
+        width, height = self._size
+        left, top = -self._offset[0] - margin, -self._offset[1] - margin
+
+        return (left, top), (left + width + 2 * margin, top + height + 2 * margin)
+
+    def is_retained(self) -> bool:
+        """(bool) Returns True iff canvas elements are retained between draws"""
+        return self._retained
+
+    def get_frame_timer(self) -> FrameTimer:
+        """(FrameTimer) Returns the timer recording the duration of each draw_entities call"""
+        return self._frame_timer
+
+    def clear(self):
+        """Removes every element from the canvas, including retained entities."""
+        self.delete(tk.ALL)
+        self._drawn = {}
+        self._drawn_offset = self._offset
+
+    def draw_entities(self, things: Iterable[Entity], locate: Callable = None):
         """Draws all entities, according to their draw method (on the view renderer)
 
+        In retained mode, entities drawn by a previous call are updated rather
+        than redrawn, and entities that are no longer given are removed.
+
         Parameters:
             things (iterable<Entity>): The entities to draw.
+            locate (Callable<Entity> -> tuple<float, float>):
+                    Returns the (x, y) position at which to centre an entity, e.g.
+                    to interpolate its movement. Defaults to the centre of its shape.
         """
+        self._frame_timer.start()
+
+        if self._retained:
+            self._draw_retained(things, locate)
+        else:
+            for thing in things:
+                shape = thing.get_shape()
+
+                items = self._world_view_router.draw(thing, shape, self, self._offset)
+                if locate is not None:
+                    self._relocate(items, shape, locate(thing))
+
+        self._frame_timer.stop()
+
+    def _relocate(self, items: List[int], shape: pymunk.Shape, position: Tuple[float, float]):
+        """Moves canvas items drawn at the centre of a shape to be centred at 'position'"""
+        x, y = position
+        centre_x, centre_y = shape.bb.center()
+        if x != centre_x or y != centre_y:
+            for item in items:
+                self.move(item, x - centre_x, y - centre_y)
+
+    def _draw_retained(self, things: Iterable[Entity], locate: Callable = None):
+        """Updates the retained canvas elements to match the given entities"""
+        renderer = self._world_view_router
+
+        # renderers only apply the horizontal offset
+        shift = self._offset[0] - self._drawn_offset[0]
+        if shift:
+            self.move(WORLD_TAG, shift, 0)
+            self._drawn_offset = self._offset
+
+        previous = self._drawn
+        drawn = {}
+
         for thing in things:
             shape = thing.get_shape()
-
-            self._world_view_router.draw(thing, shape, self, self._offset)
+            x, y = shape.bb.center() if locate is None else locate(thing)
+            state = renderer.get_state(thing, shape)
+
+            entry = previous.pop(thing, None)
+            if entry is None or entry[2] != state:
+                if entry is not None:
+                    self.delete(*entry[0])
+                items = renderer.draw(thing, shape, self, self._offset)
+                for item in items:
+                    self.addtag_withtag(WORLD_TAG, item)
+                if locate is not None:
+                    self._relocate(items, shape, (x, y))
+            else:
+                items, (old_x, old_y), _ = entry
+                if x != old_x or y != old_y:
+                    for item in items:
+                        self.move(item, x - old_x, y - old_y)
+
+            drawn[thing] = items, (x, y), state
+
+        # anything not drawn this frame has left the world
+        for items, _, _ in previous.values():
+            self.delete(*items)
+
+        self._drawn = drawn
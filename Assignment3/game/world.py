@@ -6,15 +6,22 @@ __version__ = "1.0.1"
 __author__ = "Benjamin Martin"
 __copyright__ = "The University of Queensland, 2019"
 
-import pymunk
+import math
+import random
 import time
-from typing import Tuple, Iterable
+from itertools import chain
+from collections import namedtuple
+
+import pymunk
+from typing import Tuple, Iterable, List
 
 from game.entity import BoundaryWall, Entity
 from player import Player
 from game.item import DroppedItem
-from game.block import Block
+from game.block import Block, SharedBlock, Terrain
 from game.mob import Mob
+from game.pool import EntityPool
+from game.timing import PhaseTimer
 
 # The intention with the following constants is to express a finite range of values that
 # can effectively be treated as their own type in this code. We have used collections of
@@ -49,6 +56,117 @@ COLLISION_HANDLER_CALLBACKS = {'begin', 'separate', 'pre_solve', 'post_solve'}
 # The size of a time delta between steps
 STEP_SIZE = 0.02
 
+# Time, in seconds, a body must be idle for before pymunk puts it to sleep by itself.
+# Sleeping must be enabled to put distant bodies to sleep, but bodies near the player
+# should never fall asleep on their own, so this is effectively forever.
+SLEEP_TIME_THRESHOLD = 1e9
+
+# The state of a world's things at one moment (see World.snapshot)
+#   - things: (shape, thing, thing state, body state) of each shape in the space
+#   - grid: the block in each grid cell
+#   - steppable: the things which were stepped, in order
+WorldSnapshot = namedtuple("WorldSnapshot", ["things", "grid", "steppable"])
+
+
+# The (name, descriptor) of each slot of each class of thing, by class
+_slots = {}
+
+
+def _copy_state(state: dict) -> dict:
+    """(dict) Returns a copy of the attributes of a thing, copying any mutable containers"""
+    return {name: value.copy() if isinstance(value, (list, dict, set)) else value
+            for name, value in state.items()}
+
+
+def _get_slots(cls) -> List[Tuple[str, object]]:
+    """(list<tuple<str, *>>) Returns the (name, descriptor) of each slot of a class & its bases
+
+    Slots are accessed through their descriptors, as a class attribute of a
+    subclass can hide a slot of the same name.
+    """
+    slots = _slots.get(cls)
+    if slots is None:
+        slots = _slots[cls] = []
+        for owner in cls.__mro__:
+            names = vars(owner).get("__slots__", ())
+            for name in (names,) if isinstance(names, str) else names:
+                if name not in ("__dict__", "__weakref__"):
+                    slots.append((name, vars(owner)[name]))
+    return slots
+
+
+def _get_state(thing: Entity) -> dict:
+    """(dict) Returns a copy of the attributes of a thing, kept in its slots or its __dict__"""
+    state = {}
+    for name, slot in _get_slots(type(thing)):
+        try:
+            state[name] = slot.__get__(thing)
+        except AttributeError:
+            # the slot isn't set
+            pass
+    state.update(getattr(thing, "__dict__", ()))
+    return _copy_state(state)
+
+
+def _set_state(thing: Entity, state: dict):
+    """Replaces the attributes of a thing with a copy of those recorded by _get_state"""
+    state = _copy_state(state)
+    for name, slot in _get_slots(type(thing)):
+        if name in state:
+            slot.__set__(thing, state.pop(name))
+        else:
+            try:
+                slot.__delete__(thing)
+            except AttributeError:
+                pass
+
+    attributes = getattr(thing, "__dict__", None)
+    if attributes is not None:
+        attributes.clear()
+        attributes.update(state)
+
+
+def _is_valid(body: pymunk.Body) -> bool:
+    """(bool) Returns True iff a body's position & velocity are finite"""
+    x, y = body.position
+    vx, vy = body.velocity
+    return math.isfinite(x + y + vx + vy)
+
+
+class CollisionRule:
+    """A behaviour for the collisions between things of two collision types,
+    optionally restricted to things with particular entity ids
+    """
+
+    def __init__(self, callback, id_a: str = None, id_b: str = None, data=None):
+        """Construct a new collision rule
+
+        Parameters:
+            callback (Callable<Entity, Entity, *, pymunk.Arbiter> -> bool):
+                    Called with the two things, the rule's data & the arbiter when they
+                    begin to collide. Returns True iff the collision should be resolved.
+            id_a (str): The entity id of the first thing, or None to match any id
+            id_b (str): The entity id of the second thing, or None to match any id
+            data (*): Arbitrary data passed to the callback
+        """
+        self._callback = callback
+        self._ids = id_a, id_b
+        self._data = data
+        self._hits = 0
+
+    def get_ids(self) -> Tuple[str, str]:
+        """(tuple<str, str>) Returns the entity ids matched by this rule, where None matches any id"""
+        return self._ids
+
+    def get_hits(self) -> int:
+        """(int) Returns the number of collisions handled by this rule"""
+        return self._hits
+
+    def apply(self, thing_a: Entity, thing_b: Entity, arbiter: pymunk.Arbiter) -> bool:
+        """(bool) Handles a collision, returning True iff the collision should be resolved"""
+        self._hits += 1
+        return self._callback(thing_a, thing_b, self._data, arbiter)
+
 
 class World:
     """Game world that contains things in physical space.
@@ -68,7 +186,8 @@ class World:
     """
 
     def __init__(self, grid_size, cell_expanse, gravity=(0, 300), boundary_thickness=50,
-                 collision_types=None, thing_categories=None):
+                 collision_types=None, thing_categories=None, step_size=STEP_SIZE,
+                 activity_radius=None, seed=None):
         """Creates a new world with four boundary walls
 
         Parameters:
@@ -82,7 +201,12 @@ class World:
             thing_categories (dict<str: int>):
                     Mapping of thing categories to unique powers of 2
                     Defaults to PHYSZICAL_THING_CATEGORIES constant
-
+            step_size (float): The amount of time simulated by each step, in seconds
+            activity_radius (float): The distance from the player within which things
+                                     are stepped, or None to step everything
+                                     (see set_activity_radius)
+            seed (int): The seed of the world's random number generator, or None
+                        to seed it from the operating system (see get_random)
         """
         if collision_types is None:
             collision_types = COLLISION_TYPES
@@ -101,9 +225,54 @@ class World:
 
         self._pixel_size = tuple(grid * cell_expanse for grid in grid_size)
 
+        # the block in each grid cell, indexed by row * columns + column
+        columns, rows = grid_size
+        self._grid = [None] * (int(columns) * int(rows))
+
         self._create_boundaries(boundary_thickness)
 
-        self._last_time = time.time()
+        self._step_size = step_size
+        # the number of steps simulated so far; the world's clock (see get_time)
+        self._ticks = 0
+        self._random = random.Random(seed)
+        # positions of each body before the most recent step, for interpolation
+        self._previous_positions = {}
+
+        # things whose step method does something, mapped to the order they were added in,
+        # so things are stepped deterministically
+        self._steppable = {}
+        self._steppable_added = 0
+        # whether the things of each class are stepped in batches (see _is_batched)
+        self._batched_classes = {}
+        self._batching = True
+
+        # pools of released entities, by class, & the recycled entities waiting to be added
+        self._pools = {}
+        self._recycled = set()
+        # things removed during a step, in the order they were removed, with the
+        # method that removes each; removals are applied once physics has been resolved
+        self._stepping = False
+        self._removals = {}
+
+        # collision rules for each pair of collision types, by the pair of entity ids they
+        # match, & the rule resolved for each pair of entity ids that has collided
+        self._collision_rules = {}
+        self._collision_tables = {}
+
+        self._activity_radius = None
+        # dynamic bodies which were awake & asleep after the most recent step; dicts are
+        # used as ordered sets, as the order bodies are put to sleep in affects the space
+        self._awake = {}
+        self._sleeping = {}
+        self._active_count = 0
+        self.set_activity_radius(activity_radius)
+
+        # collisions handled during the current & most recent step
+        self._collisions = 0
+        self._last_collisions = 0
+        # timers of the phases of each step & of the things of each class, while profiling
+        self._phase_timer = None
+        self._class_timer = None
 
     def get_space(self) -> pymunk.Space:
         """(pymunk.Space): Return the space used by the world."""
@@ -147,28 +316,496 @@ class World:
         """Returns the expanse (width/height) of each grid cell"""
         return self._cell_expanse
 
+    def get_step_size(self) -> float:
+        """(float) Returns the amount of time simulated by each step, in seconds"""
+        return self._step_size
+
+    def get_ticks(self) -> int:
+        """(int) Returns the number of steps simulated so far"""
+        return self._ticks
+
+    def get_time(self) -> float:
+        """(float) Returns the amount of time simulated so far, in seconds
+
+        Things should measure time with this clock rather than the wall clock, so
+        that the simulation does not depend on how quickly it is stepped.
+        """
+        return self._ticks * self._step_size
+
+    def get_random(self) -> random.Random:
+        """(random.Random) Returns the random number generator of this world
+
+        Things should draw random numbers from this generator rather than the
+        random module, so that a world with a known seed is simulated the same
+        way every time it is given the same input.
+        """
+        return self._random
+
+    def seed(self, seed: int = None):
+        """Re-seeds the random number generator of this world (see get_random)"""
+        self._random.seed(seed)
+
+    def set_activity_radius(self, radius: float = None):
+        """Sets the distance from the player within which things are active
+
+        Only things within the activity region (a square of twice the radius around
+        the player) are stepped, & dynamic bodies outside of it are put to sleep, so
+        the cost of a step depends on the size of the region rather than the world.
+
+        Parameters:
+            radius (float): The radius of the activity region, or None to step everything
+        """
+        self._activity_radius = radius
+
+        if radius is None:
+            for body in self._sleeping:
+                if body.space is self._space:
+                    body.activate()
+            self._sleeping.clear()
+            self._awake.clear()
+            self._space.sleep_time_threshold = pymunk.inf
+        else:
+            self._space.sleep_time_threshold = SLEEP_TIME_THRESHOLD
+            self._awake.update(dict.fromkeys(body for body in self._space.bodies
+                                             if body.body_type == pymunk.Body.DYNAMIC))
+
+    def get_activity_radius(self) -> float:
+        """(float) Returns the radius of the activity region, or None if everything is stepped"""
+        return self._activity_radius
+
+    def get_activity_counts(self) -> Tuple[int, int]:
+        """Returns the number of things stepped by the most recent step, & the number
+        of bodies put to sleep for being outside of the activity region
+
+        Returns:
+            (tuple<int, int>): The (active, sleeping) counts
+        """
+        return self._active_count, len(self._sleeping)
+
+    def _track_activity(self, body: pymunk.Body):
+        """Includes a newly added dynamic body when putting distant bodies to sleep"""
+        if self._activity_radius is not None and body.body_type == pymunk.Body.DYNAMIC:
+            self._awake[body] = None
+
+    def _register_steppable(self, thing: Entity):
+        """Registers a thing to be stepped if its class overrides Entity.step"""
+        if type(thing).step is not Entity.step and thing not in self._steppable:
+            self._steppable[thing] = self._steppable_added
+            self._steppable_added += 1
+
+    def _unregister_steppable(self, thing: Entity):
+        """Stops stepping a thing, if it was being stepped"""
+        self._steppable.pop(thing, None)
+
+    def set_batching(self, batching: bool):
+        """Sets whether things are stepped in batches of the same class
+
+        When batching, all the active things of a class which defines a step_batch
+        classmethod (see Mob.step_batch) are stepped with a single call, after
+        the things which are stepped one at a time.
+        """
+        self._batching = batching
+
+    def is_batching(self) -> bool:
+        """(bool) Returns True iff things are stepped in batches of the same class"""
+        return self._batching
+
+    def _is_batched(self, cls) -> bool:
+        """(bool) Returns True iff the things of class 'cls' can be stepped in a batch
+
+        They can if the class defines step_batch in the same class as step, or
+        in a subclass of it, so step_batch is never stale for an overridden step.
+        """
+        batched = self._batched_classes.get(cls)
+        if batched is None:
+            step_owner = next(owner for owner in cls.__mro__ if "step" in vars(owner))
+            batch_owner = next((owner for owner in cls.__mro__ if "step_batch" in vars(owner)), None)
+            batched = batch_owner is not None and issubclass(batch_owner, step_owner)
+            self._batched_classes[cls] = batched
+        return batched
+
+    def get_steppable_things(self) -> List[Entity]:
+        """(list<Entity>) Returns the things in this world which are updated each step"""
+        return list(self._steppable)
+
+    def _update_activity(self, player: Player) -> List[Entity]:
+        """Wakes the bodies within the activity region around the player & puts the
+        bodies that have left it to sleep
+
+        The player & the bodies touching it are always awake, whether or not the
+        space's query finds them. Bodies are visited in the order they were added
+        or found, never in an order depending on their ids, so a replayed game puts
+        the same bodies to sleep in the same order.
+
+        Returns:
+            (list<Entity>): The steppable things within the activity region, in the
+                            order they were added to the world
+        """
+        # a body which has been given an invalid position or velocity (e.g. a massless body
+        # that was hit) would corrupt the space's queries once it moves, so is removed first
+        for body in [body for body in self._awake if not _is_valid(body)]:
+            for shape in list(body.shapes):
+                if shape.object is not None and shape.object is not player:
+                    self._remove_thing(shape.object)
+
+        x, y = player.get_position()
+        radius = self._activity_radius
+        shapes = self._space.bb_query(pymunk.BB(x - radius, y - radius, x + radius, y + radius),
+                                      pymunk.ShapeFilter())
+
+        player_body = player.get_shape().body
+        touching = []
+        player_body.each_arbiter(lambda arbiter: touching.extend(shape.body for shape in arbiter.shapes))
+
+        things = {}
+        awake = {}
+        for body in chain((player_body,), touching, (shape.body for shape in shapes)):
+            if body.body_type == pymunk.Body.DYNAMIC and body not in awake:
+                awake[body] = None
+                if body in self._sleeping:
+                    del self._sleeping[body]
+                    body.activate()
+        for thing in chain((player,), (shape.object for shape in shapes)):
+            if thing in self._steppable:
+                things[thing] = None
+
+        for body in self._awake:
+            # bodies removed from the space (e.g. by a collision callback) can't sleep, and
+            # sleeping a body with an invalid position corrupts the space
+            if (body not in awake and body.space is self._space and not body.is_sleeping
+                    and _is_valid(body)):
+                body.sleep()
+                self._sleeping[body] = None
+
+        self._awake = awake
+        return sorted(things, key=self._steppable.__getitem__)
+
     def step(self, game_data):
-        """Steps the game world forward by one time step
+        """Steps the game world forward by one fixed time step
 
         1. Advances all things in the game world forward by one time step
             step method is called on each thing, with:
-                - time_delta: the time (in seconds) since the last step
+                - time_delta: the step size of the world (in seconds)
                 - game_data: the game_data parameter supplied to this method
+           Only things whose class overrides Entity.step are stepped, and if there is
+           an activity radius, only those near the player (see set_activity_radius).
+           Things of a class with a step_batch method are stepped in batches (see set_batching).
         2. Applies/resolves physics
+        3. Removes the things that were removed during the step, all at once
+
+        Things removed during a step, including within collision callbacks, stay
+        in the space until the end of the step (see remove_thing).
+
+        The step size is fixed, so the world should be stepped as many times as
+        real time requires (see game.timing.FixedTimestep).
 
         Parameters:
             game_data (tuple<World, Player>): Arbitrary data to be passed on to all things
         """
-        now = time.time()
-        time_delta = now - self._last_time
+        time_delta = self._step_size
+        profiling = self._phase_timer is not None
+        if profiling:
+            start = time.perf_counter()
+
+        self._collisions = 0
+        self._stepping = True
+        try:
+            self._step_things(time_delta, game_data)
+            if profiling:
+                entities_end = time.perf_counter()
+
+            self._previous_positions = {body: body.position for body in self._space.bodies}
+            self._space.step(time_delta)
+        finally:
+            self._stepping = False
+
+        # the removals are usually applied by a post-step callback within the space's step
+        self._apply_removals()
+        self._last_collisions = self._collisions
+        self._ticks += 1
+
+        if profiling:
+            self._phase_timer.record("entities", entities_end - start)
+            # includes collision callbacks & removals
+            self._phase_timer.record("physics", time.perf_counter() - entities_end)
+
+    def _step_things(self, time_delta: float, game_data):
+        """Calls the step method of each active thing (see step)"""
+        if self._activity_radius is None:
+            # copied, since stepping may add or remove things
+            things = list(self._steppable)
+        else:
+            things = self._update_activity(game_data[1])
+
+        self._active_count = len(things)
+
+        batches = {}
+        if self._batching:
+            singles = []
+            is_batched = self._is_batched
+            for thing in things:
+                cls = type(thing)
+                if is_batched(cls):
+                    batches.setdefault(cls, []).append(thing)
+                else:
+                    singles.append(thing)
+            things = singles
+
+        if self._class_timer is None:
+            for thing in things:
+                thing.step(time_delta, game_data)
+            for cls, batch in batches.items():
+                cls.step_batch(batch, time_delta, game_data)
+            return
+
+        durations = {}
+        for thing in things:
+            start = time.perf_counter()
+            thing.step(time_delta, game_data)
+            name = type(thing).__name__
+            durations[name] = durations.get(name, 0.) + time.perf_counter() - start
+        for cls, batch in batches.items():
+            start = time.perf_counter()
+            cls.step_batch(batch, time_delta, game_data)
+            name = cls.__name__
+            durations[name] = durations.get(name, 0.) + time.perf_counter() - start
+
+        for name, duration in durations.items():
+            self._class_timer.record(name, duration)
+
+    def set_profiling(self, profiling: bool):
+        """Starts or stops timing the phases of each step, & the step methods of
+        each class of thing
+
+        Profiling adds a small cost to every step, so is off by default.
+        """
+        if not profiling:
+            self._phase_timer = self._class_timer = None
+        elif self._phase_timer is None:
+            self._phase_timer = PhaseTimer()
+            self._class_timer = PhaseTimer()
+
+    def is_profiling(self) -> bool:
+        """(bool) Returns True iff the steps of this world are being timed"""
+        return self._phase_timer is not None
+
+    def get_phase_timer(self) -> PhaseTimer:
+        """(PhaseTimer) Returns the timer of the "entities" (step methods) & "physics"
+        (pymunk, including collision callbacks & removals) phases of each step, or
+        None if the world is not being profiled"""
+        return self._phase_timer
+
+    def get_class_timer(self) -> PhaseTimer:
+        """(PhaseTimer) Returns the total time spent stepping the things of each class per
+        step, by class name, or None if the world is not being profiled"""
+        return self._class_timer
+
+    def get_step_stats(self) -> dict:
+        """Returns counts describing the world & its most recent step
+
+        Returns:
+            (dict<str: int>): The number of "shapes" & "bodies" in the space, the number
+                              of things which are "steppable", "active" & "sleeping"
+                              (see get_activity_counts), & the number of "collisions"
+                              handled by the most recent step
+        """
+        active, sleeping = self.get_activity_counts()
+        return {
+            "shapes": len(self._space.shapes),
+            "bodies": len(self._space.bodies),
+            "steppable": len(self._steppable),
+            "active": active,
+            "sleeping": sleeping,
+            "collisions": self._last_collisions,
+        }
+
+    def _defer_removal(self, thing: Entity, remove) -> bool:
+        """Queues the removal of a thing if the world is being stepped
+
+        Each thing is only removed once, however many times it is removed during a step.
+
+        Parameters:
+            thing (Entity): The thing to remove
+            remove (Callable<Entity> -> None): The method which removes the thing
+
+        Returns:
+            (bool): True iff the removal was deferred until the end of the step
+        """
+        if not self._stepping:
+            return False
+
+        if not self._removals:
+            # post-step callbacks run once pymunk has finished resolving collisions,
+            # when the space can be modified directly
+            self._space.add_post_step_callback(lambda space, key: self._apply_removals(), self)
+
+        self._removals.setdefault(thing, remove)
+        return True
+
+    def _apply_removals(self):
+        """Removes all of the things that were removed during the step, in order"""
+        removals, self._removals = self._removals, {}
+        for thing, remove in removals.items():
+            remove(thing)
+
+    def get_pending_removals(self) -> List[Entity]:
+        """(list<Entity>) Returns the things removed during the current step, which
+        are yet to be removed from the space"""
+        return list(self._removals)
+
+    def register_pool(self, entity_class, capacity: int = 64):
+        """Recycles removed things of a class, rather than discarding them
+
+        Things of the class should be created with acquire. The class must be
+        constructible without arguments, & all of its things must have the same size
+        (see EntityPool).
+
+        Parameters:
+            entity_class (type): The class of things to pool
+            capacity (int): The maximum number of removed things to keep for reuse
+        """
+        self._pools[entity_class] = EntityPool(entity_class, capacity)
+
+    def acquire(self, entity_class) -> Entity:
+        """(Entity) Returns a new thing of a class, which is recycled if the class is
+        pooled (see register_pool) & a previously removed thing is available
+
+        The thing can then be added to the world as normal.
+        """
+        pool = self._pools.get(entity_class)
+        if pool is None:
+            return entity_class()
+
+        thing = pool.acquire()
+        if thing.get_shape() is not None:
+            self._recycled.add(thing)
+        return thing
+
+    def _release(self, thing: Entity):
+        """Returns a removed thing to the pool of its class, if its class is pooled"""
+        pool = self._pools.get(type(thing))
+        if pool is not None:
+            pool.release(thing)
+
+    def get_pool_stats(self) -> dict:
+        """Returns the statistics of each pool (see register_pool)
+
+        Returns:
+            (dict<str: dict<str: int>>): The number of "hits" (recycled things),
+                                         "misses" (constructed things) & "free"
+                                         things of each pool, by class name
+        """
+        return {entity_class.__name__: {"hits": pool.get_hits(),
+                                        "misses": pool.get_misses(),
+                                        "free": len(pool)}
+                for entity_class, pool in self._pools.items()}
+
+    def snapshot(self) -> WorldSnapshot:
+        """Records the state of every thing in this world, so the world can be restored to it
+
+        Snapshots should be taken between steps, e.g. once a level has been built.
+
+        Returns:
+            (WorldSnapshot): The snapshot, or None if this world cannot be restored
+        """
+        static_body = self._space.static_body
+        things = []
         for shape in self._space.shapes:
             thing = shape.object
+            body = shape.body
+            body_state = None
+            if body is not static_body:
+                body_state = (body.position, body.velocity, body.angle,
+                              body.angular_velocity, body.force, body.torque)
+            state = _get_state(thing) if thing is not None else None
+            things.append((shape, thing, state, body_state))
+
+        return WorldSnapshot(things, list(self._grid), dict(self._steppable))
+
+    def restore(self, snapshot: WorldSnapshot):
+        """Restores this world to the state recorded by a snapshot (see snapshot)
+
+        The space, its collision handlers & the shapes of the snapshot are kept, so
+        restoring is much cheaper than building the world again. Things added since
+        the snapshot are removed, things removed since are added back, & the attributes,
+        positions & velocities of every thing are reset. The pools are emptied & the
+        world's clock is reset. A snapshot can be restored any number of times.
+
+        Restoring is deterministic, but a restored world is not identical to a newly
+        built one, down to the last bit, as the space orders its collisions by ids
+        it gives to shapes as they are added.
+
+        Must not be called during a step.
+        """
+        space = self._space
+        static_body = space.static_body
+
+        for body in self._sleeping:
+            if body.space is space:
+                body.activate()
+        self._awake.clear()
+        self._sleeping.clear()
+
+        shapes = {shape for shape, _, _, _ in snapshot.things}
+
+        # dynamic things are all added again, so they are in the space in the same
+        # order as when the snapshot was taken
+        for shape in list(space.shapes):
+            if shape not in shapes or shape.body is not static_body:
+                space.remove(shape)
+        for body in list(space.bodies):
+            space.remove(body)
+
+        # the static shapes which were never removed
+        present = set(space.shapes)
+        for shape, thing, state, body_state in snapshot.things:
+            body = shape.body
+            if body is not static_body:
+                if body.space is None:
+                    space.add(body)
+                (body.position, body.velocity, body.angle,
+                 body.angular_velocity, body.force, body.torque) = body_state
+            if shape not in present:
+                space.add(shape)
+
+            if thing is not None:
+                _set_state(thing, state)
+                # the blocks of runs split since the snapshot were given the shapes of the parts
+                if isinstance(thing, Terrain):
+                    for block in thing.get_blocks():
+                        block.set_shape(shape)
+
+        self._grid[:] = snapshot.grid
+        self._steppable = dict(snapshot.steppable)
+        self._previous_positions = {}
+        self._removals.clear()
+        self._recycled.clear()
+        for pool in self._pools.values():
+            pool.clear()
+
+        self._ticks = 0
+        self._collisions = self._last_collisions = 0
+        self._active_count = 0
+        self.set_activity_radius(self._activity_radius)
+
+    def get_interpolated_position(self, thing: Entity, alpha: float) -> Tuple[float, float]:
+        """Returns the position of the centre of a thing, interpolated between its
+        position before & after the most recent step
 
-            if thing:
-                thing.step(time_delta, game_data)
+        Parameters:
+            thing (Entity): The thing to locate
+            alpha (float): How far between the two positions to interpolate, from
+                           0 (before the step) to 1 (after the step)
+        """
+        shape = thing.get_shape()
+        x, y = shape.bb.center()
+
+        previous = self._previous_positions.get(shape.body)
+        if previous is None:
+            return x, y
 
-        self._space.step(STEP_SIZE)
-        self._last_time = now
+        dx, dy = shape.body.position - previous
+        return x - dx * (1 - alpha), y - dy * (1 - alpha)
 
     def xy_to_grid(self, x: float, y: float) -> Tuple[int, int]:
         """Converts pixel position (xy) to grid position"""
@@ -182,15 +819,94 @@ class World:
         """Converts grid position to pixel position of its centre"""
         return int((x + .5) * self._cell_expanse), int((y + .5) * self._cell_expanse)
 
+    def _grid_index(self, column: int, row: int) -> int:
+        """(int) Returns the index of the grid cell at ('column', 'row'), or None if
+        the cell is outside the grid"""
+        columns, rows = self._grid_size
+        if 0 <= column < columns and 0 <= row < rows:
+            return int(row * columns + column)
+
+    def _set_grid_cells(self, block: Block, column: int, row: int, width: int, height: int):
+        """Sets the block within the grid cells covered by an area, ignoring cells outside the grid
+
+        Parameters:
+            block (Block): The block to set, or None to clear the cells
+            column (int): The column of the top-left cell
+            row (int): The row of the top-left cell
+            width (int): The width of the area in cells
+            height (int): The height of the area in cells
+        """
+        for y in range(row, row + height):
+            for x in range(column, column + width):
+                index = self._grid_index(x, y)
+                if index is not None:
+                    self._grid[index] = block
+
+    def _get_shape_cells(self, shape: pymunk.Shape) -> Tuple[int, int, int, int]:
+        """Returns the (column, row, width, height) area of grid cells covered by a block's shape"""
+        bb = shape.bb
+        column, row = round(bb.left / self._cell_expanse), round(bb.bottom / self._cell_expanse)
+        width = round((bb.right - bb.left) / self._cell_expanse)
+        height = round((bb.top - bb.bottom) / self._cell_expanse)
+        return column, row, width, height
+
+    def get_grid_block(self, column: int, row: int) -> Block:
+        """(Block) Returns the block in the grid cell at ('column', 'row'), or None if there is no block there"""
+        index = self._grid_index(column, row)
+        if index is not None:
+            return self._grid[index]
+
+    def get_neighbouring_blocks(self, column: int, row: int) -> Tuple[Block, Block, Block, Block]:
+        """Returns the blocks in the grid cells next to the cell at ('column', 'row')
+
+        Returns:
+            (tuple<Block, Block, Block, Block>): The blocks above, below, left of and right
+                                                 of the cell, each None if there is no block
+        """
+        return (self.get_grid_block(column, row - 1), self.get_grid_block(column, row + 1),
+                self.get_grid_block(column - 1, row), self.get_grid_block(column + 1, row))
+
     def _wrap_callback(self, callback):
         """Wraps a pymunk collision callback into a more OOP form"""
 
         def wrapped_callback(arbiter, space, data):
-            thing_a, thing_b = [s.object for s in arbiter.shapes]
+            self._collisions += 1
+            shape_a, shape_b = arbiter.shapes
+            thing_a, thing_b = shape_a.object, shape_b.object
+
+            # callbacks are interested in the block that was hit, not the run it belongs to
+            if isinstance(thing_a, Terrain):
+                thing_a = self._resolve_terrain(thing_a, arbiter, True)
+            if isinstance(thing_b, Terrain):
+                thing_b = self._resolve_terrain(thing_b, arbiter, False)
+
             return callback(thing_a, thing_b, data['data'], arbiter)
 
         return wrapped_callback
 
+    def _resolve_terrain(self, terrain: Terrain, arbiter: pymunk.Arbiter, first: bool) -> Block:
+        """Resolves the block within a run of terrain at which a collision occurred
+
+        Parameters:
+            terrain (Terrain): The run of terrain involved in the collision
+            arbiter (pymunk.Arbiter): Details on the collision
+            first (bool): True iff the terrain is the first shape of the arbiter
+        """
+        points = arbiter.contact_point_set.points
+        if points:
+            x = points[0].point_a.x if first else points[0].point_b.x
+        else:
+            # fallback to the position of the other thing
+            other = arbiter.shapes[1] if first else arbiter.shapes[0]
+            x = other.body.position.x
+
+        # contacts on the ends of the run lie on the edge of the neighbouring cell
+        first_column = terrain.get_column()
+        last_column = first_column + len(terrain.get_blocks()) - 1
+        column = min(max(self.xy_to_grid(x, 0)[0], first_column), last_column)
+
+        return terrain.get_block(column)
+
     def add_collision_handler(self, collision_type_a, collision_type_b, data=None,
                               on_begin=None, on_separate=None, on_pre_solve=None, on_post_solve=None):
         """Adds a collision handler to the game world
@@ -210,6 +926,114 @@ class World:
             if callback:
                 setattr(handler, key, self._wrap_callback(callback))
 
+    def add_collision_rule(self, collision_type_a: str, collision_type_b: str, callback,
+                           id_a: str = None, id_b: str = None, data=None) -> CollisionRule:
+        """Adds a behaviour for when things of two collision types begin to collide
+
+        Only the most specific rule matching the entity ids of the colliding things is
+        applied, in the order: both ids, only the first id, only the second id, neither.
+        If no rule matches, the collision is resolved as normal.
+
+        The rule for each pair of entity ids named by the rules is resolved up front,
+        so each collision is dispatched directly to its rule.
+
+        Note: Rules replace any on_begin callback of add_collision_handler for the same
+              pair of collision types.
+
+        Parameters:
+            collision_type_a (str): The collision type of the first thing
+            collision_type_b (str): The collision type of the second thing
+            callback (Callable<Entity, Entity, *, pymunk.Arbiter> -> bool): See CollisionRule
+            id_a (str): The entity id of the first thing, or None to match any id
+            id_b (str): The entity id of the second thing, or None to match any id
+            data (*): Arbitrary data passed to the callback
+
+        Returns:
+            (CollisionRule): The added rule
+        """
+        pair = collision_type_a, collision_type_b
+        rule = CollisionRule(callback, id_a, id_b, data)
+
+        if pair not in self._collision_rules:
+            self._collision_rules[pair] = {}
+            self._collision_tables[pair] = {}
+
+            handler = self._space.add_collision_handler(self._collision_types[collision_type_a],
+                                                        self._collision_types[collision_type_b])
+            handler.begin = self._create_rule_dispatcher(self._collision_tables[pair])
+
+        self._collision_rules[pair][id_a, id_b] = rule
+        # the new rule may be more specific than those already resolved
+        table = self._collision_tables[pair]
+        table.clear()
+        table.update(self._build_rule_table(self._collision_rules[pair]))
+
+        return rule
+
+    def get_collision_rules(self) -> List[Tuple[str, str, CollisionRule]]:
+        """(list<tuple<str, str, CollisionRule>>) Returns each collision rule, with the
+        pair of collision types it applies to"""
+        return [(type_a, type_b, rule)
+                for (type_a, type_b), rules in self._collision_rules.items()
+                for rule in rules.values()]
+
+    def _create_rule_dispatcher(self, table: dict):
+        """Creates a pymunk begin callback which dispatches collisions to the matching rule
+
+        Parameters:
+            table (dict<str: dict<str: CollisionRule>>): The rules of a pair of collision
+                    types, resolved for each pair of entity ids (see _build_rule_table)
+        """
+
+        def dispatch(arbiter, space, data):
+            self._collisions += 1
+            shape_a, shape_b = arbiter.shapes
+            thing_a, thing_b = shape_a.object, shape_b.object
+
+            # rules are interested in the block that was hit, not the run it belongs to
+            if isinstance(thing_a, Terrain):
+                thing_a = self._resolve_terrain(thing_a, arbiter, True)
+            if isinstance(thing_b, Terrain):
+                thing_b = self._resolve_terrain(thing_b, arbiter, False)
+
+            # ids not named by any rule fall back to the None entries
+            rules = table.get(thing_a.get_id()) or table[None]
+            rule = rules.get(thing_b.get_id()) or rules[None]
+
+            if rule is None:
+                return True
+            rule._hits += 1
+            return rule._callback(thing_a, thing_b, rule._data, arbiter)
+
+        return dispatch
+
+    @classmethod
+    def _build_rule_table(cls, rules: dict) -> dict:
+        """Resolves the rule for each pair of entity ids named by some rules
+
+        Parameters:
+            rules (dict<tuple<str, str>: CollisionRule>): The rules of a pair of collision
+                                                          types, by the entity ids they match
+
+        Returns:
+            (dict<str: dict<str: CollisionRule>>): The most specific rule (or None) for
+                    each first id then second id, where None stands for any id not named
+        """
+        ids_a = {None} | {id_a for id_a, _ in rules}
+        ids_b = {None} | {id_b for _, id_b in rules}
+
+        return {id_a: {id_b: cls._resolve_rule(rules, id_a, id_b) for id_b in ids_b}
+                for id_a in ids_a}
+
+    @staticmethod
+    def _resolve_rule(rules: dict, id_a: str, id_b: str) -> CollisionRule:
+        """(CollisionRule) Returns the most specific rule matching a pair of entity ids,
+        or None if no rule matches (see add_collision_rule)"""
+        for ids in ((id_a, id_b), (id_a, None), (None, id_b), (None, None)):
+            rule = rules.get(ids)
+            if rule is not None:
+                return rule
+
     def get_all_things(self) -> Iterable[Entity]:
         """Yields all physical things in this world, including boundary walls
 
@@ -222,6 +1046,26 @@ class World:
             if thing:
                 yield thing
 
+    def get_things_in_rect(self, top_left: Tuple[float, float],
+                           bottom_right: Tuple[float, float]) -> List[Entity]:
+        """(list<Entity>) Returns all physical things whose bounding box intersects the
+        rectangle between 'top_left' & 'bottom_right', including boundary walls
+
+        Unlike get_all_things, this uses the space's spatial index, so its cost
+        depends on the size of the rectangle rather than the size of the world.
+
+        Parameters:
+            top_left (tuple<float, float>): The (x, y) position of the top-left corner
+            bottom_right (tuple<float, float>): The (x, y) position of the bottom-right corner
+        """
+        left, top = top_left
+        right, bottom = bottom_right
+
+        # pymunk bounding boxes are (left, bottom, right, top), where bottom is the smallest y
+        queries = self._space.bb_query(pymunk.BB(left, top, right, bottom), pymunk.ShapeFilter())
+
+        return [shape.object for shape in queries if shape.object]
+
     def add_thing(self, thing: Entity, x: float, y: float, size: Tuple[float, float], collision_type=None,
                   categories=None, mass: float = 1, friction: float = 1):
         """Adds a thing to the game world centred at the position ('x', 'y')
@@ -237,32 +1081,66 @@ class World:
             mass (float): The mass of the thing
             friction (float): The friction of the thing
         """
-        width, height = size
-
-        left = -width // 2
-        right = left + width
-        top = -height // 2
-        bottom = top + height
-
-        body = pymunk.Body(mass, pymunk.inf)
-        body.position = x, y
-        shape = pymunk.Poly(body, [(left, top), (left, bottom), (right, bottom), (right, top)])
+        if thing in self._recycled:
+            # reuse the body & shape of a thing from a pool, which has the same size
+            self._recycled.discard(thing)
+            shape = thing.get_shape()
+            body = shape.body
+
+            body.mass = mass
+            body.position = x, y
+            body.velocity = 0, 0
+            body.force = 0, 0
+        else:
+            width, height = size
+
+            left = -width // 2
+            right = left + width
+            top = -height // 2
+            bottom = top + height
+
+            body = pymunk.Body(mass, pymunk.inf)
+            body.position = x, y
+            shape = pymunk.Poly(body, [(left, top), (left, bottom), (right, bottom), (right, top)])
 
         shape.object = thing
-        if collision_type is not None:
-            shape.collision_type = collision_type
-
-        if categories is not None:
-            shape.filter = pymunk.ShapeFilter(categories=categories)
+        shape.collision_type = collision_type if collision_type is not None else 0
+        shape.filter = (pymunk.ShapeFilter(categories=categories) if categories is not None
+                        else pymunk.ShapeFilter())
 
         shape.friction = friction
 
         thing.set_shape(shape)
         self._space.add(body, shape)
+        self._track_activity(body)
+        self._register_steppable(thing)
 
     def remove_thing(self, thing: Entity):
-        """Removes a thing from the world"""
-        self._space.remove(thing.get_shape())
+        """Removes a thing, & its body unless it is static, from the world
+
+        If the world is being stepped, the thing is removed at the end of the step.
+        Things of a pooled class are released for reuse (see register_pool).
+        """
+        if not self._defer_removal(thing, self._remove_thing):
+            self._remove_thing(thing)
+
+    def _remove_thing(self, thing: Entity):
+        """Removes a thing from the space immediately (see remove_thing)"""
+        shape = thing.get_shape()
+        if shape.space is None:
+            # already removed
+            return
+
+        if shape.body is self._space.static_body:
+            self._space.remove(shape)
+        else:
+            self._space.remove(shape.body, shape)
+        self._unregister_steppable(thing)
+        self._awake.pop(shape.body, None)
+        self._sleeping.pop(shape.body, None)
+
+        if type(thing) in self._pools:
+            self._release(thing)
 
     def add_player(self, player: Player, x: float, y: float, mass: float = 100, friction: float = .5):
         """Adds a player to game world at the position ('x', 'y')"""
@@ -280,10 +1158,12 @@ class World:
         player.set_shape(shape)
 
         self._space.add(body, shape)
+        self._register_steppable(player)
 
     def remove_player(self, player: Player):
-        """Removes the player from the game world"""
-        self._space.remove(player.get_shape())
+        """Removes the player from the game world, at the end of the step if it is being stepped"""
+        if not self._defer_removal(player, self._remove_thing):
+            self._remove_thing(player)
 
     def add_block_to_grid(self, entity, column: int, row: int,
                          width: int, height: int, friction: float = 1.):
@@ -313,6 +1193,9 @@ class World:
 
         entity.set_shape(shape)
         self._space.add(shape)
+        self._register_steppable(entity)
+
+        self._set_grid_cells(entity, column, row, width, height)
 
     def add_block(self, block: Block, x: float, y: float, *args, **kwargs):
         """Adds a block to the game world at the grid cell that contains ('x', 'y')
@@ -329,20 +1212,83 @@ class World:
         return self.add_block_to_grid(block, col, row,
                                       *block.get_cell_size(), *args, **kwargs)
 
+    def add_terrain(self, blocks: List[Block], column: int, row: int, friction: float = 1.) -> Terrain:
+        """Adds a horizontal run of plain blocks to the game world as a single static shape
+
+        Each block is given the shape of the run, & can still be found with get_block
+        and removed with remove_block, except for shared blocks (see SharedBlock).
+
+        Parameters:
+            blocks (list<Block>): The blocks in the run, from left to right
+            column (int): The grid column of the leftmost block
+            row (int): The grid row of the run
+            friction (float): The friction on the surface of the run
+
+        Returns:
+            (Terrain): The run of blocks added to the world
+        """
+        terrain = Terrain(blocks, column, row)
+        self.add_block_to_grid(terrain, column, row, len(blocks), 1, friction)
+
+        # the run has its own instances of any shared blocks
+        for i, block in enumerate(terrain.get_blocks()):
+            block.set_shape(terrain.get_shape())
+            self._set_grid_cells(block, column + i, row, 1, 1)
+
+        return terrain
+
     def get_block(self, x, y):
         """(Block) Returns a block on the point ('x', 'y'), or None if there is no block there
 
         Note: It is technically possible for multiple blocks to overlap, in which case
               this method will return one of those. This should never happen, though.
         """
+        index = self._grid_index(*self.xy_to_grid(x, y))
+        if index is not None:
+            return self._grid[index]
+
+        # blocks outside of the grid are not indexed
         blocks = self._space.point_query((x, y), 0, pymunk.ShapeFilter(mask=self._thing_categories["block"]))
 
         if blocks:
-            return blocks[0].shape.object
+            block = blocks[0].shape.object
+            if isinstance(block, Terrain):
+                return block.get_block(self.xy_to_grid(x, y)[0])
+            return block
 
     def remove_block(self, block: Block):
-        """Removes a block from the game world"""
-        self.remove_thing(block)
+        """Removes a block from the game world, at the end of the step if it is being stepped
+
+        Raises:
+            ValueError: If the block is shared by the cells of a run of terrain
+        """
+        if isinstance(block, SharedBlock):
+            raise ValueError(f"{block!r} is shared by a run of terrain, so can't be removed")
+        if not self._defer_removal(block, self._remove_block):
+            self._remove_block(block)
+
+    def _remove_block(self, block: Block):
+        """Removes a block from the space immediately (see remove_block)"""
+        shape = block.get_shape()
+        terrain = shape.object
+        if not isinstance(terrain, Terrain):
+            self._remove_thing(block)
+
+            column, row, width, height = self._get_shape_cells(shape)
+            if self.get_grid_block(column, row) is block:
+                self._set_grid_cells(None, column, row, width, height)
+            return
+
+        # the block has already been removed from the run
+        if block not in terrain.get_blocks():
+            return
+
+        column = terrain.get_column() + terrain.get_blocks().index(block)
+        self._set_grid_cells(None, column, terrain.get_row(), 1, 1)
+
+        self._remove_thing(terrain)
+        for column, blocks in terrain.split(block):
+            self.add_terrain(blocks, column, terrain.get_row(), terrain.get_shape().friction)
 
     def add_item(self, item: DroppedItem, x: float, y: float, size: Tuple[float, float] = (8, 8),
                  mass: float = 2, friction: float = 1.):
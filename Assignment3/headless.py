@@ -0,0 +1,254 @@
+"""
+Runs games of Mario without a display, driven by scripted input.
+
+Usage:
+    python headless.py level1.txt --steps 5000 --runs 10
+    python headless.py level1.txt --script inputs.txt
+    python headless.py --replay session.replay --runs 10
+
+A script file contains one "<tick> <action>" pair per line, where action is
+one of left, right, stop, jump, duck or attack. A replay file is a recording
+of a game played in the app (see replay.py), which is replayed exactly.
+"""
+
+__version__ = "1.1.0"
+
+import argparse
+import time
+from typing import Iterable, Tuple, Dict, List
+
+from mario import MarioGame, ACTIONS
+from player import Player
+from replay import LevelRecording, load_recording
+
+
+class HeadlessMario(MarioGame):
+    """A game of Mario which can be stepped as fast as possible without tkinter."""
+
+    def __init__(self, level: str, gravity: int = 300, **kwargs):
+        """Construct a new headless game and load its level.
+
+        Parameters:
+            level (str): The file name of the level to play
+            gravity (int): The vertical gravity of the world
+            **kwargs: Any additional arguments, passed to MarioGame
+        """
+        super().__init__(gravity=gravity, **kwargs)
+
+        self._player = Player(max_health=5)
+        self._completed = False
+        self._ticks = 0
+
+        self.load_level(level)
+
+    def load_level(self, level: str, seed: int = None):
+        super().load_level(level, seed=seed)
+        self._completed = False
+
+    def reset_level(self, seed: int = None):
+        super().reset_level(seed=seed)
+        self._completed = False
+
+    def new_player(self):
+        """Replace the player with a new one, as the app does when restarting a level.
+
+        The new player is placed in the world when the next level is started.
+        """
+        self._player = Player(max_health=5)
+
+    def next_level(self, goal: str = "flag_block"):
+        """Finishes the play-through when the player reaches the goal."""
+        self._completed = True
+
+    def is_completed(self) -> bool:
+        """(bool) Returns True iff the player has reached the goal of the level"""
+        return self._completed
+
+    def get_ticks(self) -> int:
+        """(int) Returns the number of steps simulated so far"""
+        return self._ticks
+
+    def run(self, script: Iterable[Tuple[int, str]], max_steps: int) -> int:
+        """Step the game until the level is completed or 'max_steps' steps have run.
+
+        Parameters:
+            script (iterable<tuple<int, str>>): (tick, action) pairs, where each
+                action is performed immediately before stepping the given tick
+                of the current level's world.
+            max_steps (int): The maximum number of steps to run.
+
+        Returns:
+            (int): The number of steps that were run.
+        """
+        actions = {}
+        for tick, action in script:
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown action: {action!r}")
+            actions.setdefault(tick, []).append(action)
+
+        start = self._ticks
+        while self._ticks - start < max_steps and not self._completed:
+            for action in actions.get(self._world.get_ticks(), ()):
+                self.queue_action(action)
+
+            self.step_world()
+            self._ticks += 1
+
+        return self._ticks - start
+
+
+def run_right(steps: int, jump_every: int = 25) -> List[Tuple[int, str]]:
+    """Generate a script which runs right, jumping regularly.
+
+    Parameters:
+        steps (int): The number of ticks to generate input for.
+        jump_every (int): The number of ticks between jumps.
+    """
+    script = []
+    for tick in range(0, steps, jump_every):
+        script.append((tick, "right"))
+        script.append((tick, "jump"))
+    return script
+
+
+def load_script(filename: str) -> List[Tuple[int, str]]:
+    """Load a script of (tick, action) pairs from a file.
+
+    Parameters:
+        filename (str): The name of the script file.
+    """
+    script = []
+    with open(filename, 'r') as file:
+        for line in file:
+            if line.strip():
+                tick, action = line.split()
+                script.append((int(tick), action))
+    return script
+
+
+def simulate(level: str, script: List[Tuple[int, str]], steps: int, runs: int = 1,
+             **kwargs) -> Dict[str, float]:
+    """Simulate several play-throughs of a level, measuring simulation speed.
+
+    Parameters:
+        level (str): The file name of the level to play.
+        script (list<tuple<int, str>>): The input to replay in each play-through.
+        steps (int): The maximum number of steps per play-through.
+        runs (int): The number of play-throughs.
+        **kwargs: Any additional arguments, passed to HeadlessMario
+
+    Returns:
+        (dict<str: float>): A report of the total steps & seconds simulated,
+                            steps per second, and number of completed runs.
+    """
+    total_steps = completed = 0
+    elapsed = 0.
+
+    for _ in range(runs):
+        game = HeadlessMario(level, **kwargs)
+
+        start = time.perf_counter()
+        total_steps += game.run(script, steps)
+        elapsed += time.perf_counter() - start
+
+        completed += game.is_completed()
+
+    return {
+        "runs": runs,
+        "completed": completed,
+        "steps": total_steps,
+        "seconds": elapsed,
+        "steps_per_second": total_steps / elapsed if elapsed else 0.,
+    }
+
+
+def replay(levels: List[LevelRecording], runs: int = 1, **kwargs) -> Dict[str, float]:
+    """Replay a recorded game several times, as fast as possible, measuring simulation speed.
+
+    Each recorded level is replayed with the recorded settings of the game (see
+    MarioGame.get_settings) & its recorded seed, for as many steps as it was
+    recorded for, so the replay simulates exactly what was played.
+
+    Parameters:
+        levels (list<LevelRecording>): The levels of the recording (see replay.load_recording)
+        runs (int): The number of replays.
+        **kwargs: Any additional arguments, passed to HeadlessMario in place of
+                  the recorded settings
+
+    Returns:
+        (dict<str: float>): A report like that of simulate.
+    """
+    total_steps = completed = 0
+    elapsed = 0.
+
+    for _ in range(runs):
+        game = None
+        for level in levels:
+            if game is None or not (level.continued or level.restored):
+                settings = {"gravity": level.gravity, **level.config, **kwargs}
+                game = HeadlessMario(level.level, seed=level.seed, **settings)
+            else:
+                if not level.continued:
+                    game.new_player()
+                if level.restored:
+                    game.reset_level(seed=level.seed)
+                else:
+                    game.load_level(level.level, seed=level.seed)
+
+            # unfinished levels are replayed until their last action
+            ticks = level.ticks
+            if ticks is None:
+                ticks = level.script[-1][0] + 1 if level.script else 0
+
+            start = time.perf_counter()
+            total_steps += game.run(level.script, ticks)
+            elapsed += time.perf_counter() - start
+
+            completed += game.is_completed()
+
+    return {
+        "runs": runs * len(levels),
+        "completed": completed,
+        "steps": total_steps,
+        "seconds": elapsed,
+        "steps_per_second": total_steps / elapsed if elapsed else 0.,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate games of Mario without a display.")
+    parser.add_argument("level", nargs="?", help="the level file to play")
+    parser.add_argument("--steps", type=int, default=5000, help="maximum steps per play-through")
+    parser.add_argument("--runs", type=int, default=1, help="number of play-throughs")
+    parser.add_argument("--gravity", type=int, default=300, help="vertical gravity of the world")
+    parser.add_argument("--chunk-size", type=int,
+                        help="stream the level in chunks of this many columns")
+    parser.add_argument("--activity-radius", type=float,
+                        help="only step things within this distance of the player (default: step everything)")
+    parser.add_argument("--script", help="file of '<tick> <action>' lines (default: run right & jump)")
+    parser.add_argument("--seed", type=int, help="seed of each level's world (default: random)")
+    parser.add_argument("--replay",
+                        help="replay a recording of the app instead of playing a level; "
+                             "things are stepped the same way as in the app unless "
+                             "--chunk-size or --activity-radius are given")
+    args = parser.parse_args()
+
+    if args.replay:
+        options = {"chunk_size": args.chunk_size, "activity_radius": args.activity_radius}
+        report = replay(load_recording(args.replay), args.runs,
+                        **{name: value for name, value in options.items() if value is not None})
+    elif args.level:
+        script = load_script(args.script) if args.script else run_right(args.steps)
+        report = simulate(args.level, script, args.steps, args.runs, gravity=args.gravity,
+                          chunk_size=args.chunk_size, activity_radius=args.activity_radius,
+                          seed=args.seed)
+    else:
+        parser.error("a level or a replay is required")
+
+    print(f"{report['steps']} steps in {report['seconds']:.3f}s "
+          f"({report['steps_per_second']:.0f} steps/s), "
+          f"{report['completed']}/{report['runs']} runs completed")
+
+
+if __name__ == '__main__':
+    main()
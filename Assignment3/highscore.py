@@ -0,0 +1,220 @@
+"""
+Keeps the high scores of games of Mario, persisting them without blocking the game.
+
+The best scores are kept in memory, sorted, so they can be read at any time
+without touching the disk. New high scores are appended to a journal file by
+a background thread, and the journal is periodically compacted into the
+score file, which is replaced atomically so it is never left half written.
+
+The score file is a JSON object
+    {"generation": 3, "scores": [[1200, "Mario"], [800, "Mario"]]}
+and the journal contains a JSON line for each high score added since,
+    {"generation": 3, "score": 950, "name": "Mario"}
+Journal lines from an older generation than the score file's were already
+compacted into it, and are ignored. A score file containing a plain JSON
+list of scores, as written by earlier versions of the game, is also read.
+"""
+
+__version__ = "1.1.0"
+
+import bisect
+import json
+import os
+import queue
+import threading
+from typing import List, Tuple
+
+# Number of high scores kept
+HIGH_SCORE_CAPACITY = 10
+# Number of high scores journaled before the journal is compacted into the score file
+COMPACT_EVERY = 20
+
+
+class HighScoreStore:
+    """The best scores achieved, highest first, persisted to a score file.
+
+    Scores are added from the game's thread & written by a background writer,
+    so adding a score never waits on the disk. Call flush to wait until every
+    score added has been written, and close to compact the journal & stop the
+    writer before exiting.
+    """
+
+    def __init__(self, filename: str, capacity: int = HIGH_SCORE_CAPACITY,
+                 compact_every: int = COMPACT_EVERY):
+        """Construct a store of the scores in a score file.
+
+        Parameters:
+            filename (str): The name of the score file. The journal is kept
+                            alongside it, with a ".journal" extension.
+            capacity (int): The number of high scores kept
+            compact_every (int): The number of high scores journaled before the
+                                 journal is compacted
+        """
+        self._filename = filename
+        self._journal_filename = filename + ".journal"
+        self._capacity = capacity
+        self._compact_every = compact_every
+
+        # sorted (-score, sequence, name) entries, so equal scores keep the order they were added
+        self._entries = []
+        self._sequence = 0
+        self._generation = 0
+        self._journaled = 0
+        # cache of the (score, name) pairs returned by get_scores
+        self._scores = []
+
+        self._load()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def get_filename(self) -> str:
+        """(str) Returns the name of the score file"""
+        return self._filename
+
+    def get_capacity(self) -> int:
+        """(int) Returns the number of high scores kept"""
+        return self._capacity
+
+    def get_scores(self) -> List[Tuple[int, str]]:
+        """(list<tuple<int, str>>) Returns the (score, name) pairs of the high scores, highest first"""
+        return list(self._scores)
+
+    def is_high_score(self, score: int) -> bool:
+        """(bool) Returns True iff the score would be kept as a high score"""
+        return len(self._entries) < self._capacity or -score < self._entries[-1][0]
+
+    def add(self, score: int, name: str = None) -> int:
+        """Add a score, journaling it in the background if it is a high score.
+
+        Parameters:
+            score (int): The score achieved
+            name (str): The name of the player who achieved it
+
+        Returns:
+            (int): The rank of the score, starting at 0 for the highest, or None
+                   if it was not a high score.
+        """
+        if not self.is_high_score(score):
+            return None
+
+        rank = self._insert(score, name)
+        self._queue.put(("add", self._generation, score, name))
+
+        self._journaled += 1
+        if self._journaled >= self._compact_every:
+            self.compact()
+
+        return rank
+
+    def compact(self):
+        """Replace the score file with the current high scores & empty the journal, in the background."""
+        self._generation += 1
+        self._journaled = 0
+        self._queue.put(("compact", self._generation, self.get_scores()))
+
+    def flush(self):
+        """Wait until every score added so far has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Compact the journal & stop the background writer, waiting for it to finish."""
+        if not self._writer.is_alive():
+            return
+        self.compact()
+        self._queue.put(None)
+        self._writer.join()
+
+    def _insert(self, score: int, name: str) -> int:
+        """Insert a score into the sorted high scores, dropping the lowest beyond capacity.
+
+        Returns:
+            (int): The rank of the inserted score.
+        """
+        entry = (-score, self._sequence, name)
+        self._sequence += 1
+
+        rank = bisect.bisect(self._entries, entry)
+        self._entries.insert(rank, entry)
+        del self._entries[self._capacity:]
+
+        self._scores = [(-score, name) for score, _, name in self._entries]
+        return rank
+
+    def _load(self):
+        """Load the high scores from the score file & replay the journal after it."""
+        if os.path.exists(self._filename):
+            with open(self._filename, 'r') as file:
+                content = file.read()
+
+            try:
+                data = json.loads(content) if content.strip() else []
+            except ValueError:
+                # earlier versions of the game could write the scores twice over
+                print(f"Ignoring unreadable high scores in {self._filename}")
+                data = []
+
+            if data:
+                if isinstance(data, list):
+                    # scores written by earlier versions of the game
+                    scores = [(score, None) for score in data]
+                else:
+                    self._generation = data["generation"]
+                    scores = data["scores"]
+
+                for score, name in scores:
+                    if self.is_high_score(score):
+                        self._insert(score, name)
+
+        if os.path.exists(self._journal_filename):
+            with open(self._journal_filename, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line is incomplete if the game exited while writing it
+                        break
+                    if record["generation"] < self._generation:
+                        continue
+                    if self.is_high_score(record["score"]):
+                        self._insert(record["score"], record["name"])
+                        self._journaled += 1
+
+    def _write_loop(self):
+        """Write the scores added & compactions requested, in order, until closed."""
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+
+                kind, generation, *args = task
+                if kind == "add":
+                    self._append(generation, *args)
+                else:
+                    self._replace(generation, *args)
+            except OSError as error:
+                # a failed write loses the score from disk, but not from the game
+                print(f"Failed to write high scores to {self._filename}: {error}")
+            finally:
+                self._queue.task_done()
+
+    def _append(self, generation: int, score: int, name: str):
+        """Append a high score to the journal."""
+        record = {"generation": generation, "score": score, "name": name}
+        with open(self._journal_filename, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+
+    def _replace(self, generation: int, scores: List[Tuple[int, str]]):
+        """Atomically replace the score file with a generation of high scores, then empty the journal."""
+        temporary = self._filename + ".tmp"
+        with open(temporary, 'w') as file:
+            json.dump({"generation": generation, "scores": scores}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._filename)
+
+        # lines journaled before this generation are now ignored, so may be dropped
+        with open(self._journal_filename, 'w'):
+            pass
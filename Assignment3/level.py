@@ -4,9 +4,34 @@ tokens of entities.
 
 __version__ = "1.1.0"
 
-from typing import Tuple, Callable, Iterable
-
-from game.world import World
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from typing import Tuple, Callable, Iterable, List
+
+from game.chunk import ChunkedWorld
+from game.world import World, STEP_SIZE
+
+# Identifies a compiled level file, followed by the version of its format
+LEVEL_MAGIC = b"MLVL"
+LEVEL_VERSION = 1
+
+# Compiled level header: magic, version, columns, rows, number of entity ids
+LEVEL_HEADER = struct.Struct(">4sBIIH")
+# Run of identical cells: number of cells, index into the entity id table (0 is empty)
+LEVEL_RUN = struct.Struct(">HB")
+
+# Everything needed to build a world, worked out ahead of time (see WorldBuilder.plan)
+#   - size: the (width, height) of the world
+#   - entities: the (entity id, x, y, args) of each entity to build one at a time
+#   - terrain: the (column, row, [(entity id, args), ...]) of each run of terrain blocks to merge
+#   - merge_static: whether terrain is merged; chunks merge their own terrain as they load
+#   - chunk_size: the number of columns per chunk, or None to build the whole world
+LevelPlan = namedtuple("LevelPlan", ["size", "entities", "terrain", "merge_static", "chunk_size"])
 
 
 class WorldBuilder:
@@ -14,7 +39,8 @@ class WorldBuilder:
     entity ids by dynamically assigning processors to ids.
     """
     def __init__(self, block_size: int, gravity: Tuple[int, int] = (0, 300),
-                 fallback: Callable = None):
+                 fallback: Callable = None, merge_static: bool = False,
+                 chunk_size: int = None, step_size: float = STEP_SIZE):
         """Construct a new world builder with a specific block size.
 
         The args passed to the fallback callback is determined by what is given
@@ -26,14 +52,26 @@ class WorldBuilder:
             gravity (tuple<int, int>): The gravity of the world.
             fallback (Callable<World, str, int, int, *> -> None): The builder
                 callback to add an entity to the world for an unknown id.
+            merge_static (bool): Whether to merge adjacent terrain blocks into
+                                 shared shapes by default (see build).
+            chunk_size (int): The number of columns per chunk when streaming
+                              worlds by default, or None (see build).
+            step_size (float): The amount of time simulated by each step of the
+                               built worlds, in seconds.
         """
         # the builders dictionary contains mappings on how to
         # process ids of entities
         self._builders = {}
+        # the terrain dictionary contains mappings from ids of plain,
+        # static blocks to the factories that create them
+        self._terrain = {}
+        self._merge_static = merge_static
+        self._chunk_size = chunk_size
         self._entities = []
         self._fallback = fallback
         self._block_size = block_size
         self._gravity = gravity
+        self._step_size = step_size
         self._width = 0
         self._height = 0
 
@@ -72,6 +110,23 @@ class WorldBuilder:
         for entity_id in entity_ids:
             self._builders[entity_id] = builder
 
+    def register_terrain(self, entity_ids: Iterable[str], factory: Callable):
+        """Registers entity ids as plain, static blocks that may be merged into terrain.
+
+        Terrain blocks must also have a builder registered, which is used when
+        the world is built without merging.
+
+        The signature of the factory method should be as follows:
+            factory(entity_id: str, *args) -> Block
+        The args passed to the factory are those given to the add_entity method.
+
+        Parameters:
+            entity_ids (<str, ...>): Iterable of string identifiers for terrain blocks.
+            factory (Callable): Creates the block for an entity id.
+        """
+        for entity_id in entity_ids:
+            self._terrain[entity_id] = factory
+
     def add_entity(self, entity_id: str, x: int, y: int, *args):
         """Add an entity to the world based on the entity id.
 
@@ -94,19 +149,137 @@ class WorldBuilder:
 
         return self
 
-    def build(self) -> World:
+    def add_entities(self, entities: Iterable[Tuple[str, int, int]], *args):
+        """Add many entities to the world, resizing the world only once.
+
+        Parameters:
+            entities (iterable<tuple<str, int, int>>): The (entity id, x, y) of each entity.
+            *args: Any additional arguments, passed to the builder for every entity.
+
+        Returns:
+            (WorldBuilder): self, allows for chained method calls.
+        """
+        start = len(self._entities)
+        self._entities.extend((entity_id, x, y, args) for entity_id, x, y in entities)
+
+        added = self._entities[start:]
+        if not added:
+            return self
+
+        # resize the world accordingly
+        max_x = max(entity[1] for entity in added)
+        max_y = max(entity[2] for entity in added)
+        if max_x >= self._width:
+            self._width = max_x + self._block_size // 2
+        if max_y >= self._height:
+            self._height = max_y + self._block_size // 2
+
+        return self
+
+    def plan(self, entities: List[Tuple[str, int, int, tuple]] = None, merge_static: bool = None,
+             chunk_size: int = None) -> LevelPlan:
+        """Work out how to build a world, without building it (see build_plan).
+
+        Planning covers the work of building which does not involve the world,
+        such as measuring it & finding the runs of terrain to merge. It does not
+        change the builder, so levels can be planned on another thread.
+
+        Parameters:
+            entities (list<tuple<str, int, int, tuple>>): The (entity id, x, y, args) of
+                each entity, as if added with add_entities. Defaults to the added entities.
+            merge_static (bool): Whether to merge terrain (see build)
+            chunk_size (int): The number of columns per chunk (see build)
+        """
+        if merge_static is None:
+            merge_static = self._merge_static
+        if chunk_size is None:
+            chunk_size = self._chunk_size
+
+        if entities is None:
+            entities = self._entities
+            size = (self._width, self._height)
+        elif entities:
+            # measured like add_entities
+            size = (max(entity[1] for entity in entities) + self._block_size // 2,
+                    max(entity[2] for entity in entities) + self._block_size // 2)
+        else:
+            size = (0, 0)
+
+        terrain = []
+        if merge_static and not chunk_size:
+            terrain, entities = self._plan_terrain(entities)
+
+        return LevelPlan(size, list(entities), terrain, merge_static, chunk_size or None)
+
+    def build_plan(self, plan: LevelPlan) -> World:
+        """Construct a new world from a plan (see plan).
+
+        Raises:
+            KeyError: If there is no associated builder for an entity id and no
+                      fallback builder has been set.
+        """
+        if not plan.chunk_size:
+            world = World(plan.size, self._block_size, gravity=self._gravity,
+                          step_size=self._step_size)
+            self._build_terrain(world, plan.terrain)
+            self._build_entities(world, plan.entities)
+            return world
+
+        chunk_size = plan.chunk_size
+        world = ChunkedWorld(plan.size, self._block_size, chunk_size=chunk_size, gravity=self._gravity,
+                             step_size=self._step_size)
+
+        chunks = {}
+        for entity in plan.entities:
+            chunks.setdefault(entity[1] // chunk_size, []).append(entity)
+        world.set_chunk_loader(chunks, self._build_chunk if plan.merge_static
+                               else self._build_entities)
+
+        return world
+
+    def build(self, merge_static: bool = None, chunk_size: int = None) -> World:
         """Construct a new world containing all the added entities.
 
         The size of the world is determined by the maximum entity space occupied.
 
-        Each entity builder is called during this construction.
+        Each entity builder is called during this construction, unless the world
+        is chunked, in which case the builders of each chunk's entities are
+        called when the chunk is first loaded.
+
+        Parameters:
+            merge_static (bool): If True, horizontally adjacent terrain blocks
+                                 (see register_terrain) are merged into a single
+                                 physical shape per run, rather than calling their
+                                 builders. Defaults to the value given to the
+                                 constructor.
+            chunk_size (int): If given, a ChunkedWorld is built which streams in
+                              chunks of this many columns around the player.
+                              Defaults to the value given to the constructor.
+
+        Raises:
+            KeyError: If there is no associated builder for an entity id and no
+                      fallback builder has been set.
+        """
+        return self.build_plan(self.plan(merge_static=merge_static, chunk_size=chunk_size))
+
+    def _build_chunk(self, world: World, entities: List[Tuple[str, int, int, tuple]]):
+        """Add the entities of a chunk to the world, merging its terrain."""
+        terrain, entities = self._plan_terrain(entities)
+        self._build_terrain(world, terrain)
+        self._build_entities(world, entities)
+
+    def _build_entities(self, world: World, entities: List[Tuple[str, int, int, tuple]]):
+        """Call the builder of each entity to add it to the world.
+
+        Parameters:
+            world (World): The world to add the entities to.
+            entities (list<tuple<str, int, int, tuple>>): The entities to build.
 
         Raises:
             KeyError: If there is no associated builder for an entity id and no
                       fallback builder has been set.
         """
-        world = World((self._width, self._height), self._block_size, gravity=self._gravity)
-        for entity in self._entities:
+        for entity in entities:
             entity_id, x, y, args = entity
 
             if entity_id not in self._builders:
@@ -119,7 +292,46 @@ class WorldBuilder:
             processor = self._builders[entity_id]
             processor(world, entity_id, x, y, *args)
 
-        return world
+    def _plan_terrain(self, entities: List[Tuple[str, int, int, tuple]]) -> Tuple[List, List]:
+        """Find the runs of horizontally adjacent terrain blocks among some entities.
+
+        Parameters:
+            entities (list<tuple<str, int, int, tuple>>): The entities to build.
+
+        Returns:
+            (tuple<list, list>): The (column, row, [(entity id, args), ...]) of each run
+                                 & the entities which are not terrain.
+        """
+        others = []
+        rows = {}
+        for entity in entities:
+            entity_id, x, y, args = entity
+            if entity_id in self._terrain:
+                rows.setdefault(y, []).append(entity)
+            else:
+                others.append(entity)
+
+        runs = []
+        for y, row in rows.items():
+            row.sort(key=lambda entity: entity[1])
+
+            run = []
+            for entity_id, x, _, args in row:
+                if run and x != run[0][0] + len(run):
+                    runs.append((run[0][0], y, [block for _, block in run]))
+                    run = []
+                run.append((x, (entity_id, args)))
+
+            if run:
+                runs.append((run[0][0], y, [block for _, block in run]))
+
+        return runs, others
+
+    def _build_terrain(self, world: World, runs: List[Tuple[int, int, List[Tuple[str, tuple]]]]):
+        """Add runs of terrain blocks to the world, each merged into a single shape (see _plan_terrain)."""
+        for column, row, blocks in runs:
+            world.add_terrain([self._terrain[entity_id](entity_id, *args) for entity_id, args in blocks],
+                              column, row)
 
     def clear(self):
         """
@@ -169,9 +381,146 @@ def load_level(filename: str) -> str:
     return "\n".join(level)
 
 
+def parse_level(filename: str) -> List[Tuple[str, int, int]]:
+    """Find the entities within a level file.
+
+    Parameters:
+        filename (str): The name of the level file to parse.
+
+    Returns:
+        (list<tuple<str, int, int>>): The (entity id, x, y) of each entity.
+    """
+    entities = []
+    with open(filename, 'r') as file:
+        for y, line in enumerate(file):
+            for x, character in enumerate(line.rstrip()):
+                if character != ' ':
+                    entities.append((character, x, y))
+
+    return entities
+
+
+def compile_level(filename: str) -> bytes:
+    """Compile a level file into the compact binary level format.
+
+    The format is a header (see LEVEL_HEADER), a table of entity ids, each
+    preceded by its length in bytes, and then the run-length encoded cells of
+    the level in row-major order (see LEVEL_RUN).
+
+    Parameters:
+        filename (str): The name of the level file to compile.
+
+    Returns:
+        (bytes): The compiled level.
+    """
+    with open(filename, 'r') as file:
+        lines = [line.rstrip() for line in file]
+
+    columns = max(map(len, lines), default=0)
+    ids = sorted(set("".join(lines)) - {' '})
+    if len(ids) > 255:
+        raise ValueError(f"Unable to compile level, {len(ids)} entity ids is more than 255")
+    indices = {entity_id: index for index, entity_id in enumerate(ids, 1)}
+
+    data = bytearray(LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, columns, len(lines), len(ids)))
+    for entity_id in ids:
+        encoded = entity_id.encode()
+        data.append(len(encoded))
+        data.extend(encoded)
+
+    index, length = 0, 0
+    for line in lines:
+        for character in line.ljust(columns):
+            cell = indices.get(character, 0)
+            if cell != index or length == 0xFFFF:
+                if length:
+                    data.extend(LEVEL_RUN.pack(length, index))
+                index, length = cell, 0
+            length += 1
+
+    if length:
+        data.extend(LEVEL_RUN.pack(length, index))
+
+    return bytes(data)
+
+
+def save_compiled_level(filename: str, compiled_filename: str):
+    """Compile a level file, saving the result to another file.
+
+    Parameters:
+        filename (str): The name of the level file to compile.
+        compiled_filename (str): The name of the file to save the compiled level to.
+    """
+    data = compile_level(filename)
+    with open(compiled_filename, 'wb') as file:
+        file.write(data)
+
+
+def is_compiled_level(filename: str) -> bool:
+    """(bool) Returns True iff the file is a compiled level"""
+    with open(filename, 'rb') as file:
+        return file.read(len(LEVEL_MAGIC)) == LEVEL_MAGIC
+
+
+def load_compiled_level(filename: str) -> List[Tuple[str, int, int]]:
+    """Find the entities within a compiled level file.
+
+    The file is memory-mapped rather than read, so only the pages that are
+    decoded are loaded.
+
+    Parameters:
+        filename (str): The name of the compiled level file.
+
+    Returns:
+        (list<tuple<str, int, int>>): The (entity id, x, y) of each entity.
+
+    Raises:
+        ValueError: If the file is not a compiled level of a supported version.
+    """
+    with open(filename, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, columns, rows, id_count = LEVEL_HEADER.unpack_from(data, 0)
+        if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+            raise ValueError(f"Unable to load level, {filename} is not a version "
+                             f"{LEVEL_VERSION} compiled level")
+
+        offset = LEVEL_HEADER.size
+        ids = [None]
+        for _ in range(id_count):
+            length = data[offset]
+            ids.append(data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+
+        entities = []
+        position = 0
+        # a view of the runs, since slicing the map itself would copy them
+        with memoryview(data) as view:
+            for length, index in LEVEL_RUN.iter_unpack(view[offset:]):
+                if index:
+                    entity_id = ids[index]
+                    entities.extend((entity_id, cell % columns, cell // columns)
+                                    for cell in range(position, position + length))
+                position += length
+
+    return entities
+
+
+def read_entities(filename: str) -> List[Tuple[str, int, int]]:
+    """Find the entities within a file, which may be either a level file or a compiled level file.
+
+    Returns:
+        (list<tuple<str, int, int>>): The (entity id, x, y) of each entity.
+    """
+    if is_compiled_level(filename):
+        return load_compiled_level(filename)
+    return parse_level(filename)
+
+
 def load_world(builder: WorldBuilder, filename: str, *args):
     """Loads entities within a file into a world builder.
 
+    The file may be either a level file or a compiled level file.
+
     Parameters:
         builder (WorldBuilder): The builder to append found entities to.
         filename (str): The game world file to load with blocks.
@@ -179,12 +528,160 @@ def load_world(builder: WorldBuilder, filename: str, *args):
     Returns:
         (World): The world produced by adding the found entities.
     """
-    level = load_level(filename)
-    for y, line in enumerate(level.split('\n')):
-        for x, character in enumerate(line):
-            if character in ('\n', ' '):
-                continue
-
-            builder.add_entity(character, x, y, *args)
+    builder.add_entities(read_entities(filename), *args)
 
     return builder.build()
+
+
+class LevelPreloader:
+    """Plans the worlds of levels on background threads, ahead of them being played.
+
+    Only reading & planning a level (see WorldBuilder.plan) happens in the background;
+    the world is built from its plan by the thread which loads it, so the physics engine
+    & the entities' builders are only ever used by that thread. Each preloaded plan is
+    only loaded once, and only if the level's file is unchanged since it was planned.
+
+    The builder's terrain settings must not change while levels are being preloaded.
+    """
+
+    def __init__(self, builder: WorldBuilder):
+        """Construct a new preloader.
+
+        Parameters:
+            builder (WorldBuilder): The builder which plans & builds the levels
+        """
+        self._builder = builder
+
+        self._lock = threading.Lock()
+        # the thread planning each level being preloaded, by absolute path
+        self._threads = {}
+        # the (modified time, size) of each preloaded level's file when it was planned,
+        # & its plan or the error raised while planning it, by absolute path
+        self._plans = {}
+        self._last_load = None
+
+    def _plan(self, filename: str) -> LevelPlan:
+        """(LevelPlan) Reads & plans the world of a level, without using the builder's entities"""
+        entities = [(entity_id, x, y, ()) for entity_id, x, y in read_entities(filename)]
+        return self._builder.plan(entities)
+
+    @staticmethod
+    def _stamp(filename: str) -> Tuple[int, int]:
+        """(tuple<int, int>) Returns the modified time & size of a level's file,
+        or None if it can't be read"""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def preload(self, filename: str):
+        """Starts reading & planning the world of a level on a background thread.
+
+        Does nothing if the level is already preloaded, or being preloaded.
+
+        Parameters:
+            filename (str): The level file or compiled level file to preload
+        """
+        path = os.path.abspath(filename)
+        with self._lock:
+            if path in self._threads:
+                return
+            preloaded = self._plans.get(path)
+            if preloaded is not None and preloaded[0] == self._stamp(path):
+                return
+
+            thread = threading.Thread(target=self._preload, args=(path,),
+                                      name=f"preload {filename}", daemon=True)
+            self._threads[path] = thread
+        thread.start()
+
+    def _preload(self, path: str):
+        # stamped before reading, so a change made while planning is noticed by load
+        stamp = self._stamp(path)
+        try:
+            plan = self._plan(path)
+        except Exception as error:
+            # raised again when the level is loaded
+            plan = error
+
+        with self._lock:
+            self._plans[path] = stamp, plan
+            del self._threads[path]
+
+    def is_preloaded(self, filename: str) -> bool:
+        """(bool) Returns True iff the world of a level has been planned & is ready to build"""
+        path = os.path.abspath(filename)
+        with self._lock:
+            preloaded = self._plans.get(path)
+        return preloaded is not None and preloaded[0] == self._stamp(path)
+
+    def load(self, filename: str) -> World:
+        """Builds the world of a level, waiting for it to finish preloading if necessary.
+
+        Levels which are not being preloaded, or whose file changed after they were
+        preloaded, are read & planned immediately.
+
+        Parameters:
+            filename (str): The level file or compiled level file to load
+
+        Returns:
+            (World): The world of the level.
+        """
+        start = time.perf_counter()
+
+        path = os.path.abspath(filename)
+        with self._lock:
+            thread = self._threads.get(path)
+        if thread is not None:
+            thread.join()
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            stamp, plan = self._plans.pop(path, (None, None))
+        if plan is not None and stamp != self._stamp(path):
+            # planned from an older version of the file
+            plan = None
+        preloaded = plan is not None
+        if isinstance(plan, Exception):
+            raise plan
+        if plan is None:
+            plan = self._plan(filename)
+        world = self._builder.build_plan(plan)
+
+        self._last_load = {
+            "level": filename,
+            "preloaded": preloaded,
+            "wait": waited,
+            "seconds": time.perf_counter() - start,
+        }
+        return world
+
+    def get_last_load(self) -> dict:
+        """Returns a report of the most recent load
+
+        Returns:
+            (dict<str: *>): The "level" loaded, whether it was "preloaded", & the
+                            seconds spent waiting for it to finish preloading
+                            ("wait") & loading it in total ("seconds"), or None
+                            if no level has been loaded.
+        """
+        return self._last_load
+
+    def clear(self):
+        """Discards the preloaded plans."""
+        with self._lock:
+            self._plans.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile level files into the binary level format.")
+    parser.add_argument("level", help="the level file to compile")
+    parser.add_argument("output", help="the file to save the compiled level to")
+    args = parser.parse_args()
+
+    save_compiled_level(args.level, args.output)
+
+
+if __name__ == '__main__':
+    main()
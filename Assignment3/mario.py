@@ -0,0 +1,706 @@
+"""
+Game logic for Mario, a 2d platformer, independent of how the game is displayed.
+"""
+
+__author__ = "ZILIANG WANG"
+__date__ = "18/10/2019"
+__version__ = "1.1.0"
+__copyright__ = "The University of Queensland, 2019"
+
+import random
+from typing import Tuple
+
+import pymunk
+
+from game.block import Block, MysteryBlock, SharedBlock
+from game.entity import Entity
+from game.mob import Mob, CloudMob, Fireball
+from game.item import DroppedItem, Coin
+from game.world import World, STEP_SIZE
+from game.util import get_collision_direction
+
+from level import LevelPreloader, WorldBuilder
+from player import Player
+from replay import Recorder
+
+BLOCK_SIZE = 2 ** 4
+
+# Merge adjacent terrain blocks into a single physical shape
+MERGE_STATIC_TERRAIN = True
+
+# Number of columns per chunk when streaming levels around the player,
+# or None to build the whole level up front
+CHUNK_SIZE = None
+
+# Distance from the player within which things are stepped, or None to step
+# everything; comfortably wider than half of the window
+ACTIVITY_RADIUS = 48 * BLOCK_SIZE
+
+# Horizontal speed of the player when moving
+PLAYER_SPEED = 80
+# Vertical speed of the player at the start of a jump
+JUMP_SPEED = 200
+# Vertical speed of the player when ducking
+DUCK_SPEED = 100
+
+GOAL_SIZES = {
+    "flag": (0.2, 9),
+    "tunnel": (2, 2)
+}
+
+BLOCKS = {
+    '#': 'brick',
+    '%': 'brick_base',
+    '?': 'mystery_empty',
+    '$': 'mystery_coin',
+    '^': 'cube',
+    'b': 'bounce',
+    'I': 'tunnel',
+    '=': 'flag_block',
+    "S": 'switch'
+}
+
+# Plain blocks without any behaviour, which can be merged into terrain
+TERRAIN_BLOCKS = ('#', '%', '^')
+# Terrain blocks which are never removed, so a run of terrain can share one instance of each
+SHARED_BLOCKS = ('%', '^')
+
+ITEMS = {
+    'C': 'coin',
+    "*": "star"
+}
+
+MOBS = {
+    '&': "cloud",
+    '@': 'mushroom'
+}
+
+# Player actions, by name; actions are queued & performed between steps (see MarioGame.queue_action)
+ACTIONS = {
+    "left": lambda game: game.move(-1),
+    "right": lambda game: game.move(1),
+    "stop": lambda game: game.move(0),
+    "jump": lambda game: game.jump(),
+    "duck": lambda game: game.duck(),
+    "attack": lambda game: game.attack(),
+}
+
+
+class myFireball(Mob):
+    """The fireball mob is a moving entity that moves straight in a direction.
+
+    When colliding with the player it will damage the player and explode.
+    """
+    _id = "myfireball"
+
+    def __init__(self):
+        super().__init__(self._id, size=(16, 16), weight=0, tempo=80)
+
+    def on_hit(self, event: pymunk.Arbiter, data):
+        world, player = data
+        world.remove_mob(self)
+
+
+class Mushroom(Mob):
+    """
+    """
+    _id = "mushroom"
+    _active = True
+
+    def __init__(self, fire_range=10):
+        super().__init__(self._id, size=(16, 16), weight=300, tempo=40)
+
+    def is_active(self):
+        return self._active
+
+    def on_hit(self, event, block):
+        direct = get_collision_direction(block, self, event)
+        if direct == "L":
+            self.set_tempo(40)
+        elif direct == "R":
+            self.set_tempo(-40)
+
+    def on_hit_player(self, event, player):
+        direct = get_collision_direction(player, self, event)
+        if direct == "L":
+            self.set_tempo(40)
+            player.damage()
+        elif direct == "R":
+            self.set_tempo(-40)
+            player.damage()
+        elif direct == "A":
+            self._active = False
+            self.set_tempo(0)
+
+    def step(self, time_delta, game_data):
+        vx, vy = self.get_velocity()
+        self.set_velocity((self.get_tempo(), vy))
+
+    @classmethod
+    def step_batch(cls, mobs, time_delta, game_data):
+        cls.walk_batch(mobs)
+
+
+class Star(DroppedItem):
+    _id = "star"
+
+    def __init__(self, duration=10):
+        super().__init__()
+        self._duration = duration
+
+    def collect(self, player):
+        player.invincible(self._duration * 1000)
+
+
+class Bounce(Block):
+    _id = "bounce"
+
+    def __init__(self, drop: str = None, drop_range=(1, 1)):
+        super().__init__()
+        self._drop = drop
+        self._drop_range = drop_range
+        self._active = False
+
+    def get_drops(self, rng: random.Random = random) -> Tuple[str, ...]:
+        """Get the drops of the mystery block
+
+        Parameters:
+            rng (random.Random): The random number generator which decides
+                                 the number of drops, e.g. the world's.
+
+        Returns:
+            tuple<str, ...>: The item identifiers of the dropped items.
+        """
+        return (self._drop,) * rng.randint(*self._drop_range)
+
+    def _drop_items(self, world, drops: Tuple[str]):
+        """Drop each of the dropped items into the world.
+
+        Parameters:
+            world (World): The world to place dropped items within.
+            drops (tuple<str>): A tuple of item identifiers to place.
+        """
+        x, y = self.get_position()
+        for drop in drops:
+            if drop is not None:
+                # world.add_item(create_item(drop), TODO: Make this non-hardcoded
+                world.add_item(world.acquire(Coin), x + world.get_random().randint(-10, 10), y - 25)
+
+    def on_hit(self, event, data):
+        """Callback collision with player event handler."""
+        world, player = data
+        # Ensure the bottom of the block is being hit
+        if get_collision_direction(player, self, event) == "A":
+            pos_x = player.get_velocity()[0]
+            player.set_velocity((pos_x, -280))
+
+    def is_active(self) -> bool:
+        """(bool): Returns true if the block has not yet dropped items."""
+        return self._active
+
+
+class Tunnel(Block):
+    _id = "tunnel"
+
+    def __init__(self, drop: str = None, drop_range=(1, 1)):
+        super().__init__()
+        self._drop = drop
+        self._drop_range = drop_range
+        self._active = False
+
+
+class Flagblock(Block):
+    _id = "flag_block"
+
+    def __init__(self, drop: str = None, drop_range=(1, 1)):
+        super().__init__()
+        self._drop = drop
+        self._drop_range = drop_range
+        self._active = False
+
+
+class Switch(Block):
+    _id = "switch"
+
+    _press_stamp = 0
+
+    def __init__(self):
+        super().__init__()
+
+    def press(self, n):
+        self._press_stamp = 1000 * n
+
+    def step(self, time_delta, game_data):
+        self._press_stamp -= 1
+
+    def isPressed(self):
+        return self._press_stamp > 0
+
+
+# Short-lived things which are recycled rather than discarded when removed
+POOLED_ENTITIES = (Fireball, myFireball, Coin)
+
+
+def create_block(world: World, block_id: str, x: int, y: int, *args):
+    """Create a new block instance and add it to the world based on the block_id.
+
+    Parameters:
+        world (World): The world where the block should be added to.
+        block_id (str): The block identifier of the block to create.
+        x (int): The x coordinate of the block.
+        y (int): The y coordinate of the block.
+    """
+    block_id = BLOCKS[block_id]
+    if block_id == "mystery_empty":
+        block = MysteryBlock()
+    elif block_id == "mystery_coin":
+        block = MysteryBlock(drop="coin", drop_range=(3, 6))
+    elif block_id == "bounce":
+        block = Bounce()
+    elif block_id == "tunnel":
+        block = Tunnel()
+    elif block_id == "flag_block":
+        block = Flagblock()
+    elif block_id == "switch":
+        block = Switch()
+    else:
+        block = Block(block_id)
+
+    world.add_block(block, x * BLOCK_SIZE, y * BLOCK_SIZE)
+
+
+def create_terrain_block(block_id: str, *args) -> Block:
+    """Create a new plain block instance to be merged into terrain.
+
+    Parameters:
+        block_id (str): The block identifier of the block to create.
+    """
+    if block_id in SHARED_BLOCKS:
+        return SharedBlock.get_shared(BLOCKS[block_id])
+    return Block(BLOCKS[block_id])
+
+
+def create_item(world: World, item_id: str, x: int, y: int, *args):
+    """Create a new item instance and add it to the world based on the item_id.
+
+    Parameters:
+        world (World): The world where the item should be added to.
+        item_id (str): The item identifier of the item to create.
+        x (int): The x coordinate of the item.
+        y (int): The y coordinate of the item.
+    """
+    item_id = ITEMS[item_id]
+    if item_id == "coin":
+        item = Coin()
+    elif item_id == "star":
+        item = Star(10)
+    else:
+        item = DroppedItem(item_id)
+
+    world.add_item(item, x * BLOCK_SIZE, y * BLOCK_SIZE)
+
+
+def create_mob(world: World, mob_id: str, x: int, y: int, *args):
+    """Create a new mob instance and add it to the world based on the mob_id.
+
+    Parameters:
+        world (World): The world where the mob should be added to.
+        mob_id (str): The mob identifier of the mob to create.
+        x (int): The x coordinate of the mob.
+        y (int): The y coordinate of the mob.
+    """
+    mob_id = MOBS[mob_id]
+    if mob_id == "cloud":
+        mob = CloudMob()
+    elif mob_id == "fireball":
+        mob = Fireball()
+    elif mob_id == "mushroom":
+        mob = Mushroom()
+    elif mob_id == "myfireball":
+        mob = myFireball()
+    else:
+        mob = Mob(mob_id, size=(1, 1))
+
+    world.add_mob(mob, x * BLOCK_SIZE, y * BLOCK_SIZE)
+
+
+def create_unknown(world: World, entity_id: str, x: int, y: int, *args):
+    """Create an unknown entity."""
+    world.add_thing(Entity(), x * BLOCK_SIZE, y * BLOCK_SIZE,
+                    size=(BLOCK_SIZE, BLOCK_SIZE))
+
+
+def create_builder(gravity: int = 300, merge_static: bool = MERGE_STATIC_TERRAIN,
+                   chunk_size: int = CHUNK_SIZE, step_size: float = STEP_SIZE) -> WorldBuilder:
+    """Create a world builder which can build any Mario level.
+
+    Parameters:
+        gravity (int): The vertical gravity of the built worlds
+        merge_static (bool): Whether to merge adjacent terrain blocks
+        chunk_size (int): The number of columns per chunk to stream, or None
+        step_size (float): The amount of time simulated by each step, in seconds
+    """
+    world_builder = WorldBuilder(BLOCK_SIZE, gravity=(0, gravity), fallback=create_unknown,
+                                 merge_static=merge_static, chunk_size=chunk_size,
+                                 step_size=step_size)
+    world_builder.register_builders(BLOCKS.keys(), create_block)
+    world_builder.register_terrain(TERRAIN_BLOCKS, create_terrain_block)
+    world_builder.register_builders(ITEMS.keys(), create_item)
+    world_builder.register_builders(MOBS.keys(), create_mob)
+    return world_builder
+
+
+class MarioGame:
+    """Game logic for Mario, a 2d platformer.
+
+    Builds levels, owns the world & player, and handles collisions & player
+    actions, without depending on tkinter. Subclasses decide how the game is
+    displayed and what happens when a level is completed.
+    """
+
+    _world: World
+    _player: Player
+
+    def __init__(self, gravity: int = 300, merge_static: bool = MERGE_STATIC_TERRAIN,
+                 chunk_size: int = CHUNK_SIZE, activity_radius: float = ACTIVITY_RADIUS,
+                 seed: int = None, step_size: float = STEP_SIZE,
+                 start_position: Tuple[float, float] = (BLOCK_SIZE, BLOCK_SIZE),
+                 speeds: Tuple[float, float, float] = (PLAYER_SPEED, JUMP_SPEED, DUCK_SPEED)):
+        """Construct a new game of Mario.
+
+        Parameters:
+            gravity (int): The vertical gravity of each level's world
+            merge_static (bool): Whether to merge adjacent terrain blocks
+            chunk_size (int): The number of columns per chunk when streaming
+                              levels around the player, or None to build whole levels
+            activity_radius (float): The distance from the player within which
+                                     things are stepped, or None to step everything
+            seed (int): The seed of each level's world, or None to pick a random seed
+                        for each level (see get_seed)
+            step_size (float): The amount of time simulated by each step, in seconds
+            start_position (tuple<float, float>): Where the player starts each level
+            speeds (tuple<float, float, float>): The speeds the player moves, jumps & ducks at
+        """
+        self._settings = {"gravity": gravity, "merge_static": merge_static,
+                          "chunk_size": chunk_size, "activity_radius": activity_radius,
+                          "step_size": step_size, "start_position": tuple(start_position),
+                          "speeds": tuple(speeds)}
+        self._builder = create_builder(gravity, merge_static, chunk_size, step_size)
+        self._preloader = LevelPreloader(self._builder)
+        self._gravity = gravity
+        self._activity_radius = activity_radius
+        self._seed = seed
+        self._start_position = start_position
+        self._speed, self._jump_speed, self._duck_speed = speeds
+        self._level = None
+        self._level_seed = None
+        # the state of the current level's world before the player was added
+        self._snapshot = None
+
+        # names of the actions to perform before the next step
+        self._actions = []
+        # id of the goal reached during the current step, if any
+        self._reached_goal = None
+        self._recorder = None
+        # the player of the most recently recorded level
+        self._recorded_player = None
+
+    def get_world(self) -> World:
+        """(World) Returns the world of the current level"""
+        return self._world
+
+    def get_player(self) -> Player:
+        """(Player) Returns the player"""
+        return self._player
+
+    def get_settings(self) -> dict:
+        """(dict<str: *>) Returns the arguments the game was constructed with, other than
+        its seed, so that another game can be constructed to play identically"""
+        return dict(self._settings)
+
+    def get_seed(self) -> int:
+        """(int) Returns the seed of the current level's world"""
+        return self._level_seed
+
+    def get_level(self) -> str:
+        """(str) Returns the file name of the current level"""
+        return self._level
+
+    def load_level(self, level: str, seed: int = None):
+        """Build the world for a level and place the player in it.
+
+        Parameters:
+            level (str): The file name of the level to load
+            seed (int): The seed of the level's world, or None to use the game's seed
+        """
+        self._end_recorded_level()
+
+        self._world = self._preloader.load(level)
+        self._level = level
+        self._world.set_activity_radius(self._activity_radius)
+        for entity_class in POOLED_ENTITIES:
+            self._world.register_pool(entity_class)
+        self._setup_collision_handlers()
+        self._snapshot = self._world.snapshot()
+
+        self._start_level(seed, restored=False)
+
+    def preload_level(self, level: str):
+        """Start planning the world of a level in the background, so that it loads
+        quickly when it is played next (see level.LevelPreloader).
+
+        Parameters:
+            level (str): The file name of the level to preload
+        """
+        self._preloader.preload(level)
+
+    def get_last_load(self) -> dict:
+        """Returns a report of how long the most recently loaded level took to load
+        (see level.LevelPreloader.get_last_load)"""
+        return self._preloader.get_last_load()
+
+    def reset_level(self, seed: int = None):
+        """Restart the current level with the player, restoring the level's world
+        to how it was when it was built rather than building it again.
+
+        Worlds which cannot be restored (see World.snapshot) are built again.
+
+        Parameters:
+            seed (int): The seed of the level's world, or None to use the game's seed
+        """
+        if self._snapshot is None:
+            self.load_level(self._level, seed=seed)
+            return
+
+        self._end_recorded_level()
+        self._world.restore(self._snapshot)
+        self._start_level(seed, restored=True)
+
+    def _start_level(self, seed: int, restored: bool):
+        """Seed the current level's world & place the player in it."""
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.randrange(2 ** 32)
+
+        self._world.seed(seed)
+        self._level_seed = seed
+        self._world.add_player(self._player, *self._start_position)
+
+        self._actions.clear()
+        self._reached_goal = None
+        if self._recorder is not None:
+            self._recorder.start_level(self._level, seed, self._gravity,
+                                       self._player is self._recorded_player, restored)
+            self._recorded_player = self._player
+
+    def step_world(self):
+        """Perform the queued actions, then step the world forward by one time step.
+
+        If the player reached a goal during the step, the next level is started
+        once the step is over (see next_level).
+        """
+        if self._actions:
+            tick = self._world.get_ticks()
+            actions, self._actions = self._actions, []
+            for action in actions:
+                if self._recorder is not None:
+                    self._recorder.record(tick, action)
+                ACTIONS[action](self)
+
+        self._world.step((self._world, self._player))
+
+        if self._reached_goal is not None:
+            goal, self._reached_goal = self._reached_goal, None
+            self.next_level(goal)
+
+    def queue_action(self, action: str):
+        """Queue a player action, to be performed before the next step of the world
+
+        Performing actions between steps, rather than as soon as input arrives,
+        makes the game depend only on which step each action was performed before,
+        so games can be recorded & replayed exactly.
+
+        Parameters:
+            action (str): The name of the action, one of the keys of ACTIONS
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action!r}")
+        self._actions.append(action)
+
+    def start_recording(self, filename: str):
+        """Record the input of the levels loaded from now on to a file (see replay.py)
+
+        Parameters:
+            filename (str): The name of the file to record to
+        """
+        self.stop_recording()
+        self._recorder = Recorder(filename, self.get_settings())
+        self._recorded_player = None
+        # the recording can't restore a world it didn't record, so the next
+        # restart builds the level again
+        self._snapshot = None
+
+    def stop_recording(self):
+        """Stop recording, ending the recording of the current level."""
+        if self._recorder is None:
+            return
+
+        self._end_recorded_level()
+        self._recorder.close()
+        self._recorder = None
+
+    def _end_recorded_level(self):
+        """Record the end of the current level, if it is being recorded."""
+        if self._recorder is not None and hasattr(self, '_world'):
+            self._recorder.end_level(self._world.get_ticks())
+
+    def is_recording(self) -> bool:
+        """(bool) Returns True iff the input of the game is being recorded"""
+        return self._recorder is not None
+
+    def next_level(self, goal: str = "flag_block"):
+        """Called when the player reaches the goal of the current level.
+
+        Parameters:
+            goal (str): The id of the block reached, "flag_block" or "tunnel"
+        """
+        raise NotImplementedError("Should be overridden in a subclass")
+
+    def move(self, direction: int):
+        """Move the player horizontally.
+
+        Parameters:
+            direction (int): 1 to move right, -1 to move left
+        """
+        pos_y = self._player.get_velocity()[1]
+        self._player.set_velocity((direction * self._speed, pos_y))
+
+    def jump(self):
+        """Make the player jump, unless they are already jumping."""
+        pos_x = self._player.get_velocity()[0]
+        if not self._player.is_jumping():
+            self._player.set_velocity((pos_x, -self._jump_speed))
+            self._player.set_jumping(True)
+
+    def duck(self):
+        """Make the player duck, unless they are jumping."""
+        if not self._player.is_jumping():
+            pos_x = self._player.get_velocity()[0]
+            self._player.set_velocity((pos_x, self._duck_speed))
+
+    def attack(self):
+        """Make the player shoot a fireball."""
+        self._player.attack(self._world, self._world.acquire(myFireball))
+
+    def _setup_collision_handlers(self):
+        rule = self._world.add_collision_rule
+
+        rule("player", "item", self._handle_player_collect_coin, id_b="coin")
+        rule("player", "item", self._handle_player_collect_star, id_b="star")
+        rule("player", "item", self._handle_player_collide_item)
+
+        rule("player", "block", self._handle_player_reach_goal, id_b="flag_block")
+        rule("player", "block", self._handle_player_reach_goal, id_b="tunnel")
+        rule("player", "block", self._handle_player_press_switch, id_b="switch")
+        rule("player", "block", self._handle_player_collide_block)
+
+        rule("player", "mob", self._handle_player_collide_fireball, id_b="fireball")
+        rule("player", "mob", self._handle_player_collide_mushroom, id_b="mushroom")
+
+        for fireball_id in ("fireball", "myfireball"):
+            rule("mob", "block", self._handle_fireball_collide_brick, id_a=fireball_id, id_b="brick")
+            rule("mob", "block", self._handle_fireball_collide_block, id_a=fireball_id)
+            rule("mob", "mob", self._handle_fireball_collide_mob, id_a=fireball_id)
+            rule("mob", "mob", self._handle_fireball_collide_mob, id_b=fireball_id)
+        rule("mob", "block", self._handle_mushroom_collide_block, id_a="mushroom")
+
+        rule("mob", "mob", self._ignore_collision)
+        rule("mob", "item", self._ignore_collision)
+
+    def _ignore_collision(self, thing_a: Entity, thing_b: Entity, data,
+                          arbiter: pymunk.Arbiter) -> bool:
+        return False
+
+    def _handle_fireball_collide_brick(self, mob: Mob, block: Block, data,
+                                       arbiter: pymunk.Arbiter) -> bool:
+        self._world.remove_block(block)
+        self._world.remove_mob(mob)
+        return True
+
+    def _handle_fireball_collide_block(self, mob: Mob, block: Block, data,
+                                       arbiter: pymunk.Arbiter) -> bool:
+        self._world.remove_mob(mob)
+        return True
+
+    def _handle_mushroom_collide_block(self, mob: Mob, block: Block, data,
+                                       arbiter: pymunk.Arbiter) -> bool:
+        mob.on_hit(arbiter, block)
+        return True
+
+    def _handle_fireball_collide_mob(self, mob1: Mob, mob2: Mob, data,
+                                     arbiter: pymunk.Arbiter) -> bool:
+        self._world.remove_mob(mob1)
+        self._world.remove_mob(mob2)
+        return False
+
+    def _handle_player_collide_item(self, player: Player, dropped_item: DroppedItem,
+                                    data, arbiter: pymunk.Arbiter) -> bool:
+        """Callback to handle collision between the player and a (dropped) item. If the player has sufficient space in
+        their to pick up the item, the item will be removed from the game world.
+
+        Parameters:
+            player (Player): The player that was involved in the collision
+            dropped_item (DroppedItem): The (dropped) item that the player collided with
+            data (dict): data that was added with this collision rule (see data parameter in
+                         World.add_collision_rule)
+            arbiter (pymunk.Arbiter): Data about a collision
+                                      (see http://www.pymunk.org/en/latest/pymunk.html#pymunk.Arbiter)
+                                      NOTE: you probably won't need this
+        Return:
+             bool: True (always resolve this type of collision)
+                   (more generally, collision callbacks return True iff the collision should be considered valid; i.e.
+                   returning False makes the world ignore the collision)
+        """
+        self._world.remove_item(dropped_item)
+        return True
+
+    def _handle_player_collect_coin(self, player: Player, coin: Coin, data,
+                                    arbiter: pymunk.Arbiter) -> bool:
+        self._player.change_realscore(1)
+        return self._handle_player_collide_item(player, coin, data, arbiter)
+
+    def _handle_player_collect_star(self, player: Player, star: DroppedItem, data,
+                                    arbiter: pymunk.Arbiter) -> bool:
+        star.collect(player)
+        return self._handle_player_collide_item(player, star, data, arbiter)
+
+    def _handle_player_collide_block(self, player: Player, block: Block, data,
+                                     arbiter: pymunk.Arbiter) -> bool:
+        block.on_hit(arbiter, (self._world, player))
+        player.set_jumping(False)
+        return True
+
+    def _handle_player_reach_goal(self, player: Player, block: Block, data,
+                                  arbiter: pymunk.Arbiter) -> bool:
+        # the world can't be replaced mid-step, and the player may touch several
+        # goals in one step, so only the first is kept until the step is over
+        if self._reached_goal is None:
+            self._reached_goal = block.get_id()
+        player.set_jumping(False)
+        return True
+
+    def _handle_player_press_switch(self, player: Player, switch: Block, data,
+                                    arbiter: pymunk.Arbiter) -> bool:
+        switch.press(0.3)
+        player.set_jumping(False)
+        return True
+
+    def _handle_player_collide_fireball(self, player: Player, mob: Mob, data,
+                                        arbiter: pymunk.Arbiter) -> bool:
+        mob.on_hit(arbiter, (self._world, player))
+        player.damage()
+        return True
+
+    def _handle_player_collide_mushroom(self, player: Player, mob: Mob, data,
+                                        arbiter: pymunk.Arbiter) -> bool:
+        mob.on_hit_player(arbiter, player)
+        return True
@@ -22,6 +22,7 @@ class Player(DynamicEntity):
         self._name = name
         self._score = 5
         self._realScore = 0
+        self._ui = None
 
     def get_name(self) -> str:
         """(str): Returns the name of the player.
@@ -66,6 +67,10 @@ class Player(DynamicEntity):
         self._invincible_step = step
 
     def renderUI(self):
+        # the player can be simulated without a connected UI
+        if self._ui is None:
+            return
+
         self._ui.setScore(self._score)
         self._ui.setPercent(self._score / self._max_health)
         self._ui.setRealScore(self.get_realscore())
@@ -0,0 +1,118 @@
+"""
+Records the input of games of Mario against simulation ticks, so that they can
+be replayed exactly, e.g. headlessly for profiling (see headless.py).
+
+A recording is a file of JSON lines. It starts with the settings of the game,
+    {"config": {"gravity": 300, "step_size": 0.02, "activity_radius": 768, ...}}
+so it is replayed with the same physics & player (see MarioGame.get_settings).
+Each level played then starts with a line
+    {"level": "level1.txt", "seed": 1234, "gravity": 300, "continue": false, "restore": false}
+followed by a line for each action performed while playing the level,
+    {"tick": 52, "action": "jump"}
+and ends with the number of steps the level was played for,
+    {"ticks": 1500}
+
+Ticks count the steps simulated by the level's world before the action was
+performed. A level "continues" when the player carried over from the
+previously recorded level, rather than the game being restarted. A level is
+"restored" when it was restarted by restoring the previous level's world,
+rather than building the level again (see MarioGame.reset_level).
+"""
+
+__version__ = "1.1.0"
+
+import json
+from collections import namedtuple
+from typing import List
+
+# The input recorded while playing a single level
+LevelRecording = namedtuple("LevelRecording",
+                            ["level", "seed", "gravity", "continued", "restored", "script", "ticks",
+                             "config"])
+
+
+class Recorder:
+    """Writes the levels played & the actions performed in them to a recording file."""
+
+    def __init__(self, filename: str, config: dict):
+        """Construct a new recorder, replacing any existing recording.
+
+        Parameters:
+            filename (str): The name of the file to record to
+            config (dict<str: *>): The settings of the game being recorded,
+                                   which must be JSON serialisable
+        """
+        self._filename = filename
+        self._file = open(filename, 'w')
+        self._recording_level = False
+        self._write({"config": config})
+
+    def get_filename(self) -> str:
+        """(str) Returns the name of the file being recorded to"""
+        return self._filename
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record) + "\n")
+
+    def start_level(self, level: str, seed: int, gravity: int, continued: bool, restored: bool):
+        """Record the start of a level.
+
+        Parameters:
+            level (str): The file name of the level
+            seed (int): The seed of the level's world
+            gravity (int): The vertical gravity of the level's world
+            continued (bool): Whether the player carried over from the previous level
+            restored (bool): Whether the previous level's world was restored, rather than built
+        """
+        self._write({"level": level, "seed": seed, "gravity": gravity,
+                     "continue": continued, "restore": restored})
+        self._recording_level = True
+
+    def record(self, tick: int, action: str):
+        """Record an action performed before stepping the given tick of the current level"""
+        self._write({"tick": tick, "action": action})
+
+    def end_level(self, ticks: int):
+        """Record the end of the current level, after 'ticks' steps were simulated"""
+        if self._recording_level:
+            self._write({"ticks": ticks})
+            self._file.flush()
+            self._recording_level = False
+
+    def close(self):
+        """Stop recording, closing the recording file."""
+        self._file.close()
+
+
+def load_recording(filename: str) -> List[LevelRecording]:
+    """Load the levels played in a recording.
+
+    Parameters:
+        filename (str): The name of the recording file
+
+    Returns:
+        (list<LevelRecording>): The input of each level, in the order they were played.
+                                A level which was not ended has None for its ticks, and
+                                levels of recordings without settings have an empty config.
+    """
+    levels = []
+    config = {}
+    with open(filename, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            if "config" in record:
+                # JSON has no tuples, so pairs & triples of settings are read as lists
+                config = {key: tuple(value) if isinstance(value, list) else value
+                          for key, value in record["config"].items()}
+            elif "level" in record:
+                levels.append(LevelRecording(record["level"], record["seed"], record["gravity"],
+                                             record["continue"], record.get("restore", False),
+                                             [], None, config))
+            elif "action" in record:
+                levels[-1].script.append((record["tick"], record["action"]))
+            else:
+                levels[-1] = levels[-1]._replace(ticks=record["ticks"])
+    return levels
@@ -0,0 +1,20 @@
+"""
+Shared setup for the tests of the game, run with pytest from any directory.
+
+The game's modules & levels are found relative to the Assignment3 directory,
+so it is put on the import path and made the working directory of each test.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def game_directory(monkeypatch):
+    """Runs each test from the directory containing the levels & images"""
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,62 @@
+"""
+Tests of the game logic of the app, without opening a window.
+"""
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+from app import DEFAULT_CONFIG, MarioApp
+from mario import MarioGame
+
+
+def _create_app(**kwargs) -> MarioApp:
+    """Returns an app with only its game & configuration set up, so it needs no display"""
+    app = MarioApp.__new__(MarioApp)
+    app._config_filename = None
+    app._config = DEFAULT_CONFIG
+    app._config_error = None
+    app._show_overlay = False
+    MarioGame.__init__(app, **kwargs)
+    app._player = app._create_player()
+    return app
+
+
+def test_reset_level_builds_the_level_again_without_a_snapshot():
+    app = _create_app(seed=1)
+    app.load_level("level1.txt")
+
+    # as when a recording is started
+    app._snapshot = None
+    app.reset_level(seed=2)
+
+    assert app.get_level() == "level1.txt"
+    assert app.get_seed() == 2
+    assert app.get_world().get_ticks() == 0
+
+
+def test_reset_level_of_a_chunked_level():
+    app = _create_app(seed=1, chunk_size=16)
+    app.load_level("level1.txt")
+    world = app.get_world()
+
+    app.reset_level(seed=2)
+
+    assert app.get_world() is not world
+    assert app.get_seed() == 2
+
+
+def test_config_is_reloaded_when_a_level_is_loaded(tmp_path):
+    config = tmp_path / "mario.cfg"
+    config.write_text("==Render==\nframe_delay : 20\n")
+    app = _create_app(seed=1)
+    app._config_filename = str(config)
+    app.load_level("level1.txt")
+    assert app.get_config().render.frame_delay == 20
+
+    # changes aren't read mid-level, only by the next load
+    config.write_text("==Render==\nframe_delay : 300\n")
+    assert app.get_config().render.frame_delay == 20
+
+    app.load_level("level2.txt")
+    assert app.get_config().render.frame_delay == 300
@@ -0,0 +1,37 @@
+"""
+Tests of dispatching collisions to the most specific collision rule.
+"""
+
+from game.world import CollisionRule, World
+
+
+def _rules(*ids):
+    return {pair: CollisionRule(lambda thing_a, thing_b, data, arbiter: True, *pair) for pair in ids}
+
+
+def test_rule_table_resolves_the_most_specific_rule():
+    rules = _rules(("fireball", "brick"), ("fireball", None), (None, "brick"), (None, None))
+    table = World._build_rule_table(rules)
+
+    assert table["fireball"]["brick"] is rules["fireball", "brick"]
+    assert table["fireball"][None] is rules["fireball", None]
+    assert table[None]["brick"] is rules[None, "brick"]
+    assert table[None][None] is rules[None, None]
+
+
+def test_rule_table_without_a_fallback_resolves_unmatched_ids_to_none():
+    rules = _rules(("player", "coin"))
+    table = World._build_rule_table(rules)
+
+    assert table["player"]["coin"] is rules["player", "coin"]
+    assert table["player"][None] is None
+    assert table[None] == {None: None, "coin": None}
+
+
+def test_rules_added_later_take_precedence_when_more_specific():
+    world = World((10, 10), 16, collision_types={"mob": 1, "block": 2})
+    world.add_collision_rule("mob", "block", lambda thing_a, thing_b, data, arbiter: True)
+    specific = world.add_collision_rule("mob", "block", lambda thing_a, thing_b, data, arbiter: False,
+                                        id_a="fireball")
+
+    assert world._collision_tables["mob", "block"]["fireball"][None] is specific
@@ -0,0 +1,50 @@
+"""
+Tests of parsing & loading configuration files.
+"""
+
+import pytest
+
+from config import DEFAULT_CONFIG, ConfigError, load_config, parse_config
+
+STANDARD_CONFIG = """
+==World==
+gravity : 400
+start : level2.txt
+==Player==
+character : Mario
+x : 30
+y : 30
+mass : 100
+health : 4
+max_velocity : 100
+==level2.txt==
+goal : END
+"""
+
+
+def test_standard_keys_are_ignored_with_a_warning():
+    with pytest.warns(UserWarning, match="mass"):
+        config = parse_config(STANDARD_CONFIG)
+
+    assert config.world.gravity == 400
+    assert config.world.start == "level2.txt"
+    assert config.player.health == 4
+    assert config.levels == {"level2.txt": (None, None)}
+    assert config.render == DEFAULT_CONFIG.render
+
+
+def test_invalid_values_are_rejected():
+    with pytest.raises(ConfigError):
+        parse_config("==Player==\nhealth : -1")
+
+
+def test_load_config_reuses_unchanged_files(tmp_path):
+    filename = tmp_path / "config.txt"
+    filename.write_text("==Render==\nframe_delay : 20\n")
+
+    config = load_config(str(filename))
+    assert config.render.frame_delay == 20
+    assert load_config(str(filename)) is config
+
+    filename.write_text("==Render==\nframe_delay : 300\n")
+    assert load_config(str(filename)).render.frame_delay == 300
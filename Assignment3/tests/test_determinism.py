@@ -0,0 +1,71 @@
+"""
+Tests that games replayed from the same seed & input are identical, which
+recordings (see replay.py) rely on to be replayed exactly.
+"""
+
+from headless import HeadlessMario, run_right
+
+STEPS = 600
+
+
+def _script():
+    """Runs right, jumping, & attacking every 40 ticks"""
+    return run_right(STEPS) + [(tick, "attack") for tick in range(0, STEPS, 40)]
+
+
+def _state(game):
+    """Returns the class, position & velocity of everything in the game's world.
+
+    Positions are compared by repr, so a NaN position (e.g. of a massless fireball)
+    matches itself.
+    """
+    return [repr((type(shape.object).__name__, shape.body.position, shape.body.velocity))
+            for shape in game.get_world().get_space().shapes]
+
+
+def _play(**kwargs):
+    game = HeadlessMario("level1.txt", seed=7, **kwargs)
+    game.run(_script(), STEPS)
+    return game
+
+
+def test_same_seed_and_input_replay_identically():
+    first, second = _play(), _play()
+
+    assert first.get_world().get_ticks() == second.get_world().get_ticks()
+    assert first.get_player().get_position() == second.get_player().get_position()
+    assert _state(first) == _state(second)
+
+
+def test_activity_radius_is_deterministic():
+    first, second = _play(activity_radius=768), _play(activity_radius=768)
+
+    assert _state(first) == _state(second)
+
+
+def test_player_stays_active_outside_of_activity_radius():
+    game = _play(activity_radius=768)
+
+    x, y = game.get_player().get_position()
+    assert y < game.get_world().get_pixel_size()[1]
+
+
+def test_distant_bodies_sleep_but_the_player_never_does():
+    game = _play(activity_radius=128)
+    world = game.get_world()
+
+    active, sleeping = world.get_activity_counts()
+    assert sleeping > 0
+    assert not game.get_player().get_shape().body.is_sleeping
+
+
+def test_restored_worlds_with_sleeping_bodies_replay_identically():
+    game = _play()
+    states = []
+    for _ in range(2):
+        game.new_player()
+        game.reset_level(seed=7)
+        game.run(_script(), STEPS)
+        states.append(_state(game))
+
+    assert states[0] == states[1]
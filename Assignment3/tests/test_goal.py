@@ -0,0 +1,28 @@
+"""
+Tests of reaching the goal of a level.
+"""
+
+from headless import HeadlessMario
+
+
+class CountingMario(HeadlessMario):
+    """A headless game which records each goal reached, & the tick it was reached on"""
+
+    def __init__(self, *args, **kwargs):
+        self.goals = []
+        super().__init__(*args, **kwargs)
+
+    def next_level(self, goal: str = "flag_block"):
+        self.goals.append((goal, self._world.get_ticks()))
+        super().next_level(goal)
+
+
+def test_next_level_is_started_once_per_step(tmp_path):
+    # the player lands on a row of goals, touching two at once
+    level = tmp_path / "goals.txt"
+    level.write_text("\n".join([" " * 6] * 4 + ["IIIIII"]))
+    game = CountingMario(str(level), seed=0)
+    game.run([], 200)
+
+    assert game.is_completed()
+    assert len(game.goals) == 1
@@ -0,0 +1,70 @@
+"""
+Tests of loading levels, from both level files & compiled level files.
+"""
+
+import time
+
+import pytest
+
+from game.world import STEP_SIZE
+from level import (LevelPreloader, compile_level, is_compiled_level, load_compiled_level,
+                   load_world, parse_level, read_entities)
+from mario import CHUNK_SIZE, MERGE_STATIC_TERRAIN, create_builder
+
+
+@pytest.fixture
+def compiled_level(tmp_path):
+    """Returns the name of a compiled copy of level1.txt"""
+    filename = tmp_path / "level1.lvl"
+    filename.write_bytes(compile_level("level1.txt"))
+    return str(filename)
+
+
+def test_compiled_level_round_trip(compiled_level):
+    assert is_compiled_level(compiled_level)
+    assert sorted(load_compiled_level(compiled_level)) == sorted(parse_level("level1.txt"))
+
+
+def test_read_entities_detects_compiled_levels(compiled_level):
+    assert not is_compiled_level("level1.txt")
+    assert sorted(read_entities(compiled_level)) == sorted(read_entities("level1.txt"))
+
+
+def test_load_compiled_level_rejects_level_files():
+    with pytest.raises(ValueError):
+        load_compiled_level("level1.txt")
+
+
+def test_preloaded_level_matches_level_built_directly():
+    builder = create_builder(300, MERGE_STATIC_TERRAIN, CHUNK_SIZE, STEP_SIZE)
+    preloader = LevelPreloader(builder)
+
+    preloader.preload("level1.txt")
+    world = preloader.load("level1.txt")
+    assert preloader.get_last_load()["preloaded"]
+
+    builder.clear()
+    expected = load_world(builder, "level1.txt")
+
+    def things(world):
+        return sorted((type(thing).__name__, thing.get_position()) for thing in world.get_all_things())
+
+    assert things(world) == things(expected)
+    assert not preloader.is_preloaded("level1.txt")
+
+
+def test_preloaded_level_is_planned_again_once_its_file_changes(tmp_path):
+    level = tmp_path / "level.txt"
+    level.write_text("\n".join([" " * 4] * 3 + ["####"]))
+    preloader = LevelPreloader(create_builder(300, False, None, STEP_SIZE))
+
+    preloader.preload(str(level))
+    while not preloader.is_preloaded(str(level)):
+        time.sleep(0.01)
+    level.write_text("\n".join([" " * 4] * 3 + ["##"]))
+    assert not preloader.is_preloaded(str(level))
+
+    world = preloader.load(str(level))
+    assert not preloader.get_last_load()["preloaded"]
+    blocks = [thing for thing in world.get_all_things() if thing.get_id() == "brick"]
+    assert len(blocks) == 2
@@ -0,0 +1,61 @@
+"""
+Tests of stepping mobs in batches, which must behave exactly like stepping
+them one at a time.
+"""
+
+import pytest
+
+from game import mob
+from game.mob import CloudMob
+from headless import HeadlessMario
+
+STEPS = 400
+
+
+@pytest.fixture
+def cloudy_level(tmp_path):
+    """Returns the name of a level with enough clouds to be stepped with numpy"""
+    rows = [" " * 80 for _ in range(14)] + ["#" * 80, "%" * 80]
+    rows[1] = " " * 8 + "&" * 2 * mob.NUMPY_BATCH_SIZE + " " * (72 - 2 * mob.NUMPY_BATCH_SIZE)
+    filename = tmp_path / "cloudy.txt"
+    filename.write_text("\n".join(rows))
+    return str(filename)
+
+
+def _play(level, batching):
+    game = HeadlessMario(level, seed=5, activity_radius=None)
+    game.get_world().set_batching(batching)
+    # the player stands still, so the clouds gather above them & fire
+    game.run([], STEPS)
+    return game
+
+
+def _state(game):
+    return [repr((type(shape.object).__name__, shape.body.position, shape.body.velocity))
+            for shape in game.get_world().get_space().shapes]
+
+
+def _drops(game):
+    """Returns the number of fireballs & coins the clouds have dropped"""
+    stats = game.get_world().get_pool_stats()
+    return sum(stats[name]["hits"] + stats[name]["misses"] for name in ("Fireball", "Coin"))
+
+
+def test_batched_clouds_step_like_clouds_stepped_one_at_a_time(cloudy_level):
+    assert mob.np is not None, "numpy is needed to test the vectorised path"
+
+    batched, single = _play(cloudy_level, True), _play(cloudy_level, False)
+
+    clouds = [thing for thing in batched.get_world().get_all_things() if isinstance(thing, CloudMob)]
+    assert len(clouds) >= mob.NUMPY_BATCH_SIZE
+    assert _drops(batched) == _drops(single) > 0
+    assert _state(batched) == _state(single)
+
+
+def test_batched_clouds_step_without_numpy(cloudy_level, monkeypatch):
+    single = _play(cloudy_level, False)
+
+    monkeypatch.setattr(mob, "np", None)
+    batched = _play(cloudy_level, True)
+    assert _drops(batched) == _drops(single) > 0
+    assert _state(batched) == _state(single)
@@ -0,0 +1,46 @@
+"""
+Tests of recycling removed entities through pools.
+"""
+
+from game.item import Coin
+from game.pool import EntityPool
+from headless import HeadlessMario
+
+
+def test_released_entities_are_reset_and_reused():
+    pool = EntityPool(Coin, capacity=1)
+
+    coin = pool.acquire()
+    coin._value = 5
+    pool.release(coin)
+    pool.release(coin)
+    assert len(pool) == 1
+
+    assert pool.acquire() is coin
+    assert coin._value == 1
+    assert (pool.get_hits(), pool.get_misses()) == (1, 1)
+
+
+def test_pool_drops_entities_beyond_capacity():
+    pool = EntityPool(Coin, capacity=1)
+
+    pool.release(Coin())
+    pool.release(Coin())
+    assert len(pool) == 1
+
+
+def test_world_recycles_removed_things_with_their_shapes():
+    world = HeadlessMario("level1.txt", seed=0).get_world()
+
+    coin = world.acquire(Coin)
+    world.add_item(coin, 100, 100)
+    shape = coin.get_shape()
+    world.remove_item(coin)
+
+    recycled = world.acquire(Coin)
+    assert recycled is coin
+    world.add_item(recycled, 200, 100)
+    assert recycled.get_shape() is shape
+    assert recycled.get_position() == (200, 100)
+    assert recycled in world.get_all_things()
+    assert world.get_pool_stats()["Coin"]["hits"] == 1
@@ -0,0 +1,32 @@
+"""
+Tests of recording games, and replaying them with the settings they were played with.
+"""
+
+from headless import HeadlessMario, run_right
+from replay import load_recording
+
+STEPS = 300
+SETTINGS = {"step_size": 0.01, "speeds": (120, 160, 60), "start_position": (48, 16),
+            "activity_radius": 256, "merge_static": False}
+
+
+def _state(game):
+    return [repr((type(shape.object).__name__, shape.body.position, shape.body.velocity))
+            for shape in game.get_world().get_space().shapes]
+
+
+def test_recordings_replay_with_the_recorded_settings(tmp_path):
+    recording = str(tmp_path / "session.replay")
+    played = HeadlessMario("level1.txt", seed=3, **SETTINGS)
+    # as the app does, the level is restarted once recording starts
+    played.start_recording(recording)
+    played.reset_level(seed=3)
+    played.run(run_right(STEPS), STEPS)
+    played.stop_recording()
+
+    level, = load_recording(recording)
+    assert level.config == played.get_settings()
+
+    replayed = HeadlessMario(level.level, seed=level.seed, **level.config)
+    replayed.run(level.script, level.ticks)
+    assert _state(replayed) == _state(played)
@@ -0,0 +1,45 @@
+"""
+Tests of restarting levels by restoring a snapshot of their built world.
+"""
+
+from headless import HeadlessMario, run_right
+
+STEPS = 300
+SCRIPT = run_right(STEPS) + [(tick, "attack") for tick in range(0, STEPS, 30)]
+
+
+def _things(world):
+    """Returns the class & position of each thing in the world, in the order of the space"""
+    return [repr((type(thing).__name__, thing.get_position())) for thing in world.get_all_things()]
+
+
+def _restart(game):
+    game.new_player()
+    game.reset_level(seed=3)
+
+
+def test_restore_returns_the_world_to_how_it_was_built():
+    game = HeadlessMario("level1.txt", seed=3)
+    world = game.get_world()
+    built = sorted(_things(world))
+
+    game.run(SCRIPT, STEPS)
+    assert sorted(_things(world)) != built
+
+    _restart(game)
+    assert game.get_world() is world
+    assert world.get_ticks() == 0
+    assert sorted(_things(world)) == built
+
+
+def test_restored_worlds_replay_identically():
+    game = HeadlessMario("level1.txt", seed=3)
+    game.run(SCRIPT, STEPS)
+
+    _restart(game)
+    game.run(SCRIPT, STEPS)
+    first = _things(game.get_world())
+
+    _restart(game)
+    game.run(SCRIPT, STEPS)
+    assert _things(game.get_world()) == first